@@ -1,13 +1,17 @@
 -- ===============================
 -- Create staging schema
 -- ===============================
+-- Column names follow the generated CSV headers; ingestion COPYs each
+-- file into these typed tables by column name. Keys are deliberately not
+-- enforced here: staging is the raw landing zone and duplicates are caught
+-- by the quality checks, not by a failed load.
 CREATE SCHEMA IF NOT EXISTS staging;
 
 -- ===============================
 -- Customers
 -- ===============================
 CREATE TABLE IF NOT EXISTS staging.customers (
-    customer_id VARCHAR(20) PRIMARY KEY,
+    customer_id VARCHAR(20),
     first_name VARCHAR(100),
     last_name VARCHAR(100),
     email VARCHAR(150),
@@ -24,7 +28,7 @@ CREATE TABLE IF NOT EXISTS staging.customers (
 -- Products
 -- ===============================
 CREATE TABLE IF NOT EXISTS staging.products (
-    product_id VARCHAR(20) PRIMARY KEY,
+    product_id VARCHAR(20),
     product_name VARCHAR(150),
     category VARCHAR(100),
     sub_category VARCHAR(100),
@@ -37,10 +41,10 @@ CREATE TABLE IF NOT EXISTS staging.products (
 );
 
 -- ===============================
--- Transactions (FIXED)
+-- Transactions
 -- ===============================
 CREATE TABLE IF NOT EXISTS staging.transactions (
-    transaction_id VARCHAR(20) PRIMARY KEY,
+    transaction_id VARCHAR(20),
     customer_id VARCHAR(20),
     transaction_date DATE,
     transaction_time TIME,
@@ -51,10 +55,10 @@ CREATE TABLE IF NOT EXISTS staging.transactions (
 );
 
 -- ===============================
--- Transaction Items (FIXED)
+-- Transaction Items
 -- ===============================
 CREATE TABLE IF NOT EXISTS staging.transaction_items (
-    item_id VARCHAR(30) PRIMARY KEY,
+    item_id VARCHAR(30),
     transaction_id VARCHAR(20),
     product_id VARCHAR(20),
     quantity INT,
@@ -63,3 +67,11 @@ CREATE TABLE IF NOT EXISTS staging.transaction_items (
     line_total NUMERIC(10,2),
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+-- ===============================
+-- Incremental reads filter on loaded_at; BRIN is nearly free on append
+-- ===============================
+CREATE INDEX IF NOT EXISTS customers_loaded_at_brin ON staging.customers USING brin (loaded_at);
+CREATE INDEX IF NOT EXISTS products_loaded_at_brin ON staging.products USING brin (loaded_at);
+CREATE INDEX IF NOT EXISTS transactions_loaded_at_brin ON staging.transactions USING brin (loaded_at);
+CREATE INDEX IF NOT EXISTS transaction_items_loaded_at_brin ON staging.transaction_items USING brin (loaded_at);
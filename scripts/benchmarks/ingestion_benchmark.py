@@ -0,0 +1,85 @@
+import argparse
+import json
+import statistics
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+from scripts import db
+from scripts.ingestion import ingest_to_staging
+
+REPORT_PATH = Path("data/processed/ingestion_benchmark.json")
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def reset_staging():
+    """Drop the staging tables so each engine starts from the same state."""
+    conn = db.connect("benchmark")
+    try:
+        with conn, conn.cursor() as cur:
+            for table in ingest_to_staging.TABLES:
+                cur.execute(f"DROP TABLE IF EXISTS staging.{table} CASCADE;")
+    finally:
+        db.release(conn)
+
+def benchmark_engine(engine_name, repeat):
+    runs = []
+    for _ in range(repeat):
+        reset_staging()
+        results, total_seconds = ingest_to_staging.run(engine_name)
+        runs.append({"total_seconds": total_seconds, "tables": results})
+
+    median_total = statistics.median(r["total_seconds"] for r in runs)
+    total_rows = sum(t["rows_loaded"] for t in runs[0]["tables"].values())
+
+    return {
+        "runs": repeat,
+        "median_total_seconds": round(median_total, 3),
+        "rows_per_second": round(total_rows / median_total, 1),
+        "tables": {
+            table: {
+                "rows": runs[0]["tables"][table]["rows_loaded"],
+                "median_rows_per_second": round(statistics.median(
+                    r["tables"][table]["rows_per_second"] or 0 for r in runs
+                ), 1)
+            }
+            for table in ingest_to_staging.TABLES
+        }
+    }
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Compare staging ingestion engines.")
+    parser.add_argument("--engines", nargs="+", default=["to_sql", "copy"],
+                        choices=sorted(ingest_to_staging.ENGINES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {
+        "benchmark_timestamp": datetime.now().isoformat(),
+        "engines": {}
+    }
+
+    for engine_name in args.engines:
+        report["engines"][engine_name] = benchmark_engine(engine_name, args.repeat)
+        print(f"{engine_name:>8}: {report['engines'][engine_name]['rows_per_second']:,.0f} rows/s")
+
+    # Leave staging loaded by the configured engine (typed tables for copy)
+    reset_staging()
+    ingest_to_staging.main()
+
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"✅ Ingestion benchmark saved to {REPORT_PATH}")
+
+if __name__ == "__main__":
+    main()
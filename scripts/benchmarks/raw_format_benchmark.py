@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+import pandas as pd
+from scripts import raw_storage
+from scripts.data_generation import generate_data
+
+REPORT_PATH = Path("data/processed/raw_format_benchmark.json")
+
+# Columns read by the column-selective pass (what a typical consumer needs)
+SELECTED_COLUMNS = {
+    "customers": ["customer_id", "email"],
+    "products": ["product_id", "price"],
+    "transactions": ["transaction_id", "transaction_date"],
+    "transaction_items": ["transaction_id", "line_total"]
+}
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def disk_size(path):
+    if os.path.isdir(path):
+        return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+    return os.path.getsize(path)
+
+def read_table(path, raw_format, table, columns=None):
+    if raw_format == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    # CSV readers have to parse dates themselves on every read
+    dates = ["transaction_date"] if table == "transactions" and (
+        columns is None or "transaction_date" in columns
+    ) else False
+    return pd.read_csv(path, usecols=columns, parse_dates=dates)
+
+def time_read(path, raw_format, table, repeat, columns=None):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_table(path, raw_format, table, columns)
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings), 4)
+
+def benchmark_format(gen_config, seed, chunk_size, raw_format, repeat):
+    with tempfile.TemporaryDirectory() as out_dir:
+        generate_data.generate_streaming(gen_config, seed, chunk_size, out_dir, raw_format)
+
+        tables = {}
+        for table in generate_data.RAW_TABLES:
+            path = os.path.join(out_dir, raw_storage.table_path(table, raw_format))
+            tables[table] = {
+                "bytes": disk_size(path),
+                "read_seconds": time_read(path, raw_format, table, repeat),
+                "selective_read_seconds": time_read(
+                    path, raw_format, table, repeat, SELECTED_COLUMNS[table]
+                )
+            }
+
+    return {
+        "total_bytes": sum(t["bytes"] for t in tables.values()),
+        "total_read_seconds": round(sum(t["read_seconds"] for t in tables.values()), 4),
+        "total_selective_read_seconds": round(
+            sum(t["selective_read_seconds"] for t in tables.values()), 4
+        ),
+        "tables": tables
+    }
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Compare raw-zone CSV and Parquet files.")
+    parser.add_argument("--transactions", type=int,
+                        help="Override data_generation.transactions for the benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    config = generate_data.load_config()
+    gen_config = dict(config["data_generation"])
+    if args.transactions:
+        gen_config["transactions"] = args.transactions
+    chunk_size = gen_config.get("chunk_size", config["pipeline"]["batch_size"])
+    seed = gen_config.get("seed")
+
+    report = {
+        "benchmark_timestamp": datetime.now().isoformat(),
+        "transactions": gen_config["transactions"],
+        "formats": {}
+    }
+
+    for raw_format in raw_storage.RAW_FORMATS:
+        result = benchmark_format(gen_config, seed, chunk_size, raw_format, args.repeat)
+        report["formats"][raw_format] = result
+        print(
+            f"{raw_format:>8}: {result['total_bytes'] / 1e6:,.1f} MB, "
+            f"read {result['total_read_seconds']:.3f}s, "
+            f"selective {result['total_selective_read_seconds']:.3f}s"
+        )
+
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"✅ Raw format benchmark saved to {REPORT_PATH}")
+
+if __name__ == "__main__":
+    main()
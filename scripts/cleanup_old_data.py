@@ -1,9 +1,17 @@
+import argparse
 import os
+import sys
 import time
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+from scripts import db, partitions, watermarks
+
 # -----------------------------
 # Config
 # -----------------------------
@@ -17,11 +25,23 @@ TARGET_DIRS = [
 
 PRESERVE_KEYWORDS = ["summary", "report"]
 PRESERVE_FILES = [
-    "pipeline_execution_report.json"
+    "pipeline_execution_report.json",
+    # flock()ed lock files must keep their inode while anyone may hold them
+    "pipeline.lock",
+    "scheduler.lock"
 ]
 
 LOG_FILE = Path("logs/scheduler_activity.log")
 
+# Monthly partitions older than this are dropped whole (no row deletes)
+PARTITION_RETENTION_MONTHS = 24
+# Referencing tables before the tables they reference
+PARTITIONED_TABLES = [
+    ("production", "transaction_items"),
+    ("production", "transactions"),
+    ("warehouse", "fact_sales")
+]
+
 # -----------------------------
 # Logging
 # -----------------------------
@@ -81,5 +101,50 @@ def cleanup():
     logging.info("Cleanup job completed")
 
 
+def partition_cutoff(today=None, months=PARTITION_RETENTION_MONTHS):
+    """First day of the oldest month that is kept."""
+    today = today or datetime.today().date()
+    index = today.year * 12 + today.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1).date()
+
+
+def drop_old_partitions():
+    cutoff = partition_cutoff()
+    logging.info(f"Dropping partitions older than {cutoff}")
+
+    conn = db.connect("cleanup")
+    try:
+        with conn, conn.cursor() as cur:
+            watermarks.ensure_table(cur)
+            for schema, table in PARTITIONED_TABLES:
+                dropped = partitions.drop_partitions_before(cur, schema, table, cutoff)
+                for name, _ in dropped:
+                    logging.info(f"Dropped partition: {schema}.{name}")
+                if dropped:
+                    # Cached query results still count the dropped months
+                    watermarks.bump_table_versions(cur, [f"{schema}.{table}"])
+                if dropped and (schema, table) == ("warehouse", "fact_sales"):
+                    # The analytics refresh only recomputes the months logged here
+                    cur.execute(
+                        "INSERT INTO warehouse.fact_sales_changes (month_key) SELECT UNNEST(%s::INTEGER[]);",
+                        ([int(month.strftime("%Y%m")) for _, month in dropped],)
+                    )
+    except Exception as e:
+        # Nothing was dropped (one transaction); the scheduler must see the failure
+        logging.error(f"Failed to drop old partitions: {e}")
+        raise
+    finally:
+        db.release(conn)
+
+
+def main(partitions_only=False):
+    if not partitions_only:
+        cleanup()
+    drop_old_partitions()
+
+
 if __name__ == "__main__":
-    cleanup()
+    parser = argparse.ArgumentParser(description="Delete expired files and drop expired partitions.")
+    parser.add_argument("--partitions-only", action="store_true",
+                        help="Only drop monthly partitions past the retention window")
+    db.run(main, parser.parse_args().partitions_only)
@@ -1,28 +1,55 @@
 import os
+import sys
 import json
 import random
-from datetime import datetime
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+import numpy as np
 import pandas as pd
 from faker import Faker
 import yaml
 
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# Ensure project root is on PYTHONPATH
+sys.path.append(BASE_DIR)
+
+from scripts import raw_storage
+
 fake = Faker()
 
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 RAW_DATA_DIR = os.path.join(BASE_DIR, "data", "raw")
 CONFIG_PATH = os.path.join(BASE_DIR, "config", "config.yaml")
 
+# Vectorized mode draws names/cities from a small Faker-built pool
+# instead of calling Faker once per row.
+NAME_POOL_SIZE = 1000
+MAX_ITEMS_PER_TRANSACTION = 3
+MAX_QUANTITY = 3
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "UPI", "Net Banking", "Wallet", "Cash on Delivery"]
+
+RAW_TABLES = ["customers", "products", "transactions", "transaction_items"]
+
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 
+def id_width(count, minimum):
+    """Zero-padded width for ids up to count, so ids keep sorting lexically."""
+    return max(minimum, len(str(count)))
+
 def load_config():
     with open(CONFIG_PATH, "r") as f:
         return yaml.safe_load(f)
 
+# -----------------------------
+# Row-by-row generators (mode: row)
+# -----------------------------
 def generate_customers(n):
     data = []
+    width = id_width(n, 4)
     for i in range(1, n + 1):
         data.append({
-            "customer_id": f"CUST{i:04d}",
+            "customer_id": f"CUST{i:0{width}d}",
             "first_name": fake.first_name(),
             "last_name": fake.last_name(),
             "email": fake.unique.email(),
@@ -32,10 +59,11 @@ def generate_customers(n):
 
 def generate_products(n):
     data = []
+    width = id_width(n, 4)
     for i in range(1, n + 1):
         price = round(random.uniform(10, 500), 2)
         data.append({
-            "product_id": f"PROD{i:04d}",
+            "product_id": f"PROD{i:0{width}d}",
             "product_name": fake.word(),
             "category": "General",
             "price": price
@@ -44,11 +72,13 @@ def generate_products(n):
 
 def generate_transactions(customers, n):
     data = []
+    width = id_width(n, 5)
     for i in range(1, n + 1):
         data.append({
-            "transaction_id": f"TXN{i:05d}",
+            "transaction_id": f"TXN{i:0{width}d}",
             "customer_id": random.choice(customers["customer_id"]),
             "transaction_date": fake.date_this_year(),
+            "transaction_time": fake.time(),
             "total_amount": 0.0
         })
     return pd.DataFrame(data)
@@ -56,6 +86,7 @@ def generate_transactions(customers, n):
 def generate_transaction_items(transactions, products):
     items = []
     counter = 1
+    width = id_width(len(transactions) * MAX_ITEMS_PER_TRANSACTION, 5)
 
     for idx, txn in transactions.iterrows():
         chosen = products.sample(random.randint(1, 3))
@@ -69,7 +100,7 @@ def generate_transaction_items(transactions, products):
             total += line_total
 
             items.append({
-                "item_id": f"ITEM{counter:05d}",
+                "item_id": f"ITEM{counter:0{width}d}",
                 "transaction_id": txn["transaction_id"],
                 "product_id": prod["product_id"],
                 "quantity": qty,
@@ -83,25 +114,441 @@ def generate_transaction_items(transactions, products):
 
     return pd.DataFrame(items), transactions
 
+# -----------------------------
+# Vectorized generators (mode: vectorized)
+# -----------------------------
+def format_ids(prefix, numbers, width):
+    """
+    Array equivalent of f"{prefix}{n:0{width}d}": the digits are computed as
+    one byte matrix (prefix columns, then one column per digit) and viewed as
+    fixed-width strings, with no per-row Python formatting.
+    """
+    numbers = np.asarray(numbers, dtype=np.int64)
+    width = max(width, len(str(numbers.max(initial=0))))
+    digits = numbers[:, None] // 10 ** np.arange(width - 1, -1, -1) % 10 + ord("0")
+    chars = np.empty((len(numbers), len(prefix) + width), dtype=np.uint8)
+    chars[:, :len(prefix)] = np.frombuffer(prefix.encode(), dtype=np.uint8)
+    chars[:, len(prefix):] = digits
+    return chars.view(f"S{chars.shape[1]}").ravel().astype(str).astype(object)
+
+def format_emails(first, last, ids):
+    """first.last.id@example.com per row, joined by Arrow string kernels."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    local = pc.binary_join_element_wise(
+        pc.utf8_lower(pa.array(first)), pc.utf8_lower(pa.array(last)),
+        pc.cast(pa.array(ids), pa.string()), "."
+    )
+    return pc.binary_join_element_wise(local, "example.com", "@").to_numpy(zero_copy_only=False)
+
+def get_date_window(gen_config):
+    """Return (start_date, span_days); defaults to this year up to today."""
+    today = date.today()
+    start = gen_config.get("start_date") or date(today.year, 1, 1)
+    end = gen_config.get("end_date") or today
+    start = pd.Timestamp(start).date()
+    end = pd.Timestamp(end).date()
+    return np.datetime64(start, "D"), (end - start).days + 1
+
+def generate_customers_vectorized(n, rng):
+    first_names = np.array([fake.first_name() for _ in range(NAME_POOL_SIZE)])
+    last_names = np.array([fake.last_name() for _ in range(NAME_POOL_SIZE)])
+    cities = np.array([fake.city() for _ in range(NAME_POOL_SIZE)])
+    states = np.array([fake.state() for _ in range(NAME_POOL_SIZE)])
+
+    ids = np.arange(1, n + 1)
+    first = first_names[rng.integers(0, NAME_POOL_SIZE, size=n)]
+    last = last_names[rng.integers(0, NAME_POOL_SIZE, size=n)]
+
+    # The numeric suffix keeps emails unique without fake.unique
+    emails = format_emails(first, last, ids)
+
+    return pd.DataFrame({
+        "customer_id": format_ids("CUST", ids, id_width(n, 4)),
+        "first_name": first,
+        "last_name": last,
+        "email": emails,
+        "city": cities[rng.integers(0, NAME_POOL_SIZE, size=n)],
+        "state": states[rng.integers(0, NAME_POOL_SIZE, size=n)]
+    })
+
+def generate_products_vectorized(n, rng):
+    words = np.array([fake.word() for _ in range(NAME_POOL_SIZE)])
+    names = words[rng.integers(0, NAME_POOL_SIZE, size=n)]
+    price = np.round(rng.uniform(10, 500, size=n), 2)
+    return pd.DataFrame({
+        "product_id": format_ids("PROD", np.arange(1, n + 1), id_width(n, 4)),
+        "product_name": names,
+        "category": "General",
+        "price": price,
+        "cost": np.round(price * rng.uniform(0.5, 0.9, size=n), 2)
+    })
+
+def pick_distinct_products(rng, n_products, n_transactions, k):
+    """
+    Draw k distinct product indices per transaction without a Python loop
+    over transactions: each pick is drawn from the remaining n - j slots and
+    shifted past the indices already taken (in ascending order).
+    """
+    picks = np.empty((n_transactions, k), dtype=np.int64)
+    for j in range(k):
+        p = rng.integers(0, n_products - j, size=n_transactions)
+        taken = np.sort(picks[:, :j], axis=1)
+        for c in range(j):
+            p += p >= taken[:, c]
+        picks[:, j] = p
+    return picks
+
+def generate_transaction_batch(rng, start_id, n, customer_ids, product_ids, product_prices,
+                               start_item_id, date_start, date_span_days, last_txn_id=None):
+    """
+    Generate n transactions (TXN<start_id>...) and their line items as arrays.
+
+    Ids are padded for last_txn_id (default: this batch's last), the highest
+    id of the whole run, so every chunk of a run shares one width.
+
+    Customer/product picks index straight into the existing id arrays, so
+    only the new transaction and item ids have to be formatted.
+
+    Prices are handled in integer cents so line totals and the grouped
+    transaction totals are exact, matching the NUMERIC checks downstream.
+    """
+    k = min(MAX_ITEMS_PER_TRANSACTION, len(product_prices))
+    txn_numbers = np.arange(start_id, start_id + n)
+
+    customer_idx = rng.integers(0, len(customer_ids), size=n)
+    dates = date_start + rng.integers(0, date_span_days, size=n).astype("timedelta64[D]")
+    items_per_txn = rng.integers(1, k + 1, size=n)
+
+    picks = pick_distinct_products(rng, len(product_prices), n, k)
+    mask = np.arange(k) < items_per_txn[:, None]
+    product_idx = picks[mask]
+    txn_idx = np.repeat(np.arange(n), items_per_txn)
+    n_items = len(product_idx)
+
+    price_cents = np.rint(np.asarray(product_prices) * 100).astype(np.int64)
+    quantity = rng.integers(1, MAX_QUANTITY + 1, size=n_items)
+    unit_cents = price_cents[product_idx]
+    line_cents = quantity * unit_cents
+
+    # Grouped sum of line totals per transaction (replaces per-row .at writes)
+    total_cents = np.bincount(txn_idx, weights=line_cents, minlength=n).astype(np.int64)
+    payment_idx = rng.integers(0, len(PAYMENT_METHODS), size=n)
+    # Time of day of each sale, uniform over the day
+    times = pd.to_datetime(rng.integers(0, 86400, size=n), unit="s").strftime("%H:%M:%S")
+
+    last_txn_id = last_txn_id or start_id + n - 1
+    txn_ids = format_ids("TXN", txn_numbers, id_width(last_txn_id, 5))
+    transactions = pd.DataFrame({
+        "transaction_id": txn_ids,
+        "customer_id": np.asarray(customer_ids)[customer_idx],
+        "transaction_date": dates.astype(str),
+        "transaction_time": np.asarray(times),
+        "payment_method": np.asarray(PAYMENT_METHODS, dtype=object)[payment_idx],
+        "total_amount": total_cents / 100
+    })
+
+    items = pd.DataFrame({
+        "item_id": format_ids(
+            "ITEM", np.arange(start_item_id, start_item_id + n_items),
+            id_width(last_txn_id * MAX_ITEMS_PER_TRANSACTION, 5)
+        ),
+        "transaction_id": txn_ids[txn_idx],
+        "product_id": np.asarray(product_ids)[product_idx],
+        "quantity": quantity,
+        "unit_price": unit_cents / 100,
+        "discount_percentage": 0,
+        "line_total": line_cents / 100
+    })
+
+    return transactions, items
+
+def generate_all_vectorized(gen_config, seed):
+    rng = np.random.default_rng(seed)
+    date_start, date_span = get_date_window(gen_config)
+
+    customers = generate_customers_vectorized(gen_config["customers"], rng)
+    products = generate_products_vectorized(gen_config["products"], rng)
+    transactions, items = generate_transaction_batch(
+        rng, 1, gen_config["transactions"], customers["customer_id"].to_numpy(),
+        products["product_id"].to_numpy(), products["price"].to_numpy(),
+        1, date_start, date_span
+    )
+    return customers, products, transactions, items
+
+# -----------------------------
+# Streaming generator (mode: streaming)
+# -----------------------------
+def chunk_rng(seed_seq, chunk_index):
+    """
+    Independent RNG per chunk, derived from the run seed and the chunk index
+    only, so a chunk's rows do not depend on how many chunks came before it.
+    """
+    return np.random.default_rng(
+        np.random.SeedSequence(seed_seq.entropy, spawn_key=(chunk_index,))
+    )
+
+def append_csv(df, path, write_header):
+    df.to_csv(path, mode="w" if write_header else "a", header=write_header, index=False)
+
+def write_table(df, table, out_dir, raw_format):
+    path = os.path.join(out_dir, raw_storage.table_path(table, raw_format))
+    if raw_format == "parquet":
+        raw_storage.write_parquet(df, table, path)
+    else:
+        df.to_csv(path, index=False)
+
+def write_transaction_chunk(transactions, items, txn_path, items_path, raw_format, part, write_header):
+    """
+    Persist one chunk: appended to the CSV files, or written as new files in
+    the month-partitioned Parquet datasets (items take their parent
+    transaction's month).
+    """
+    if raw_format == "parquet":
+        months = transactions["transaction_date"].str[:7]
+        item_months = items["transaction_id"].map(
+            pd.Series(months.to_numpy(), index=transactions["transaction_id"])
+        )
+        raw_storage.write_parquet(transactions, "transactions", txn_path, part, months.to_numpy())
+        raw_storage.write_parquet(items, "transaction_items", items_path, part, item_months.to_numpy())
+    else:
+        append_csv(transactions, txn_path, write_header)
+        append_csv(items, items_path, write_header)
+
+def stream_transactions(seed_seq, n_transactions, chunk_size, customers, products,
+                        date_start, date_span, txn_path, items_path,
+                        first_txn_id=1, first_item_id=1, first_chunk=0, raw_format="csv",
+                        last_txn_id=None):
+    """
+    Generate transactions and their items chunk by chunk, appending each
+    chunk to disk before the next one is built. Items are always written in
+    the same chunk as their parent transaction, so every item references an
+    existing transaction and totals match line totals at any prefix of the
+    files.
+    """
+    customer_ids = customers["customer_id"].to_numpy()
+    product_ids = products["product_id"].to_numpy()
+    prices = products["price"].to_numpy()
+
+    txn_count = 0
+    item_count = 0
+    chunk_index = 0
+
+    while txn_count < n_transactions:
+        n = min(chunk_size, n_transactions - txn_count)
+        transactions, items = generate_transaction_batch(
+            chunk_rng(seed_seq, first_chunk + chunk_index), first_txn_id + txn_count, n,
+            customer_ids, product_ids, prices,
+            first_item_id + item_count, date_start, date_span,
+            last_txn_id or first_txn_id + n_transactions - 1
+        )
+
+        write_transaction_chunk(
+            transactions, items, txn_path, items_path, raw_format,
+            part=first_chunk + chunk_index, write_header=chunk_index == 0
+        )
+
+        txn_count += len(transactions)
+        item_count += len(items)
+        chunk_index += 1
+
+    return {"transactions": txn_count, "transaction_items": item_count}
+
+def generate_streaming(gen_config, seed, chunk_size, out_dir, raw_format="csv"):
+    seed_seq = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_seq)
+    date_start, date_span = get_date_window(gen_config)
+
+    customers = generate_customers_vectorized(gen_config["customers"], rng)
+    products = generate_products_vectorized(gen_config["products"], rng)
+    write_table(customers, "customers", out_dir, raw_format)
+    write_table(products, "products", out_dir, raw_format)
+
+    counts = stream_transactions(
+        seed_seq, gen_config["transactions"], chunk_size, customers, products,
+        date_start, date_span,
+        os.path.join(out_dir, raw_storage.table_path("transactions", raw_format)),
+        os.path.join(out_dir, raw_storage.table_path("transaction_items", raw_format)),
+        raw_format=raw_format
+    )
+    return {"customers": len(customers), "products": len(products), **counts}
+
+# -----------------------------
+# Sharded generator (mode: sharded)
+# -----------------------------
+def shard_file_name(table, shard, raw_format="csv"):
+    # Parquet shards share the table's partitioned dataset directory
+    if raw_format == "parquet":
+        return raw_storage.table_path(table, raw_format)
+    return f"{table}.part-{shard:04d}.csv"
+
+def plan_shards(n_transactions, chunk_size, n_shards):
+    """
+    Split the transaction id space into contiguous shards made of whole
+    chunks, so shard k draws exactly the chunks streaming mode would.
+    """
+    n_chunks = -(-n_transactions // chunk_size)
+    chunks_per_shard = max(1, -(-n_chunks // n_shards))
+
+    shards = []
+    for shard, first_chunk in enumerate(range(0, n_chunks, chunks_per_shard)):
+        first_txn = first_chunk * chunk_size + 1
+        last_txn = min((first_chunk + chunks_per_shard) * chunk_size, n_transactions)
+        shards.append({
+            "shard": shard,
+            "first_chunk": first_chunk,
+            "first_transaction": first_txn,
+            "last_transaction": last_txn
+        })
+    return shards
+
+def generate_shard(shard, seed_entropy, chunk_size, customers, products,
+                   date_start, date_span, out_dir, raw_format="csv", last_txn_id=None):
+    """Process-pool worker: stream one shard of transactions to its part files."""
+    txn_file = shard_file_name("transactions", shard["shard"], raw_format)
+    items_file = shard_file_name("transaction_items", shard["shard"], raw_format)
+
+    counts = stream_transactions(
+        np.random.SeedSequence(seed_entropy),
+        shard["last_transaction"] - shard["first_transaction"] + 1,
+        chunk_size, customers, products, date_start, date_span,
+        os.path.join(out_dir, txn_file), os.path.join(out_dir, items_file),
+        first_txn_id=shard["first_transaction"],
+        # Every transaction has at most MAX_ITEMS_PER_TRANSACTION items, so
+        # this offset keeps item ids unique across shards without coordination.
+        first_item_id=(shard["first_transaction"] - 1) * MAX_ITEMS_PER_TRANSACTION + 1,
+        first_chunk=shard["first_chunk"],
+        raw_format=raw_format,
+        # Padded for the whole run, not this shard
+        last_txn_id=last_txn_id
+    )
+
+    return {
+        **shard,
+        "files": {
+            "transactions": {"file": txn_file, "rows": counts["transactions"]},
+            "transaction_items": {"file": items_file, "rows": counts["transaction_items"]}
+        }
+    }
+
+def generate_sharded(gen_config, seed, chunk_size, out_dir, workers, n_shards, raw_format="csv"):
+    seed_seq = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_seq)
+    date_start, date_span = get_date_window(gen_config)
+
+    customers = generate_customers_vectorized(gen_config["customers"], rng)
+    products = generate_products_vectorized(gen_config["products"], rng)
+    write_table(customers, "customers", out_dir, raw_format)
+    write_table(products, "products", out_dir, raw_format)
+
+    plan = plan_shards(gen_config["transactions"], chunk_size, n_shards)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(generate_shard, shard, seed_seq.entropy, chunk_size,
+                        customers, products, date_start, date_span, out_dir, raw_format,
+                        gen_config["transactions"])
+            for shard in plan
+        ]
+        shards = [f.result() for f in futures]
+
+    return {
+        "record_counts": {
+            "customers": len(customers),
+            "products": len(products),
+            "transactions": sum(s["files"]["transactions"]["rows"] for s in shards),
+            "transaction_items": sum(s["files"]["transaction_items"]["rows"] for s in shards)
+        },
+        "shards": shards,
+        "files": {
+            table: list(dict.fromkeys(
+                [raw_storage.table_path(table, raw_format)] if table in ("customers", "products")
+                else [s["files"][table]["file"] for s in shards]
+            ))
+            for table in RAW_TABLES
+        }
+    }
+
 def main():
     # 🔥 REMOVE OLD FILES (CRITICAL)
     for f in os.listdir(RAW_DATA_DIR):
-        os.remove(os.path.join(RAW_DATA_DIR, f))
+        path = os.path.join(RAW_DATA_DIR, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    # Streamed batches continue the old data set's ids; a new one starts clean
+    shutil.rmtree(raw_storage.LANDING_DIR, ignore_errors=True)
 
     config = load_config()
+    gen_config = config["data_generation"]
+    mode = gen_config.get("mode", "row")
+    seed = gen_config.get("seed")
+    chunk_size = gen_config.get("chunk_size", config["pipeline"]["batch_size"])
+    raw_format = raw_storage.get_raw_format(config)
+
+    if seed is not None:
+        random.seed(seed)
+        fake.seed_instance(seed)
+
+    # Manifest of the files written per table; ingestion reads this.
+    files = {table: [raw_storage.table_path(table, raw_format)] for table in RAW_TABLES}
+    shards = None
+
+    if mode == "sharded":
+        workers = gen_config.get("workers") or os.cpu_count()
+        result = generate_sharded(
+            gen_config, seed, chunk_size, RAW_DATA_DIR,
+            workers, gen_config.get("shards") or workers, raw_format
+        )
+        record_counts, shards, files = result["record_counts"], result["shards"], result["files"]
+    elif mode == "streaming":
+        record_counts = generate_streaming(gen_config, seed, chunk_size, RAW_DATA_DIR, raw_format)
+    else:
+        if mode == "vectorized":
+            customers, products, transactions, items = generate_all_vectorized(gen_config, seed)
+        else:
+            customers = generate_customers(gen_config["customers"])
+            products = generate_products(gen_config["products"])
+            transactions = generate_transactions(customers, gen_config["transactions"])
+            items, transactions = generate_transaction_items(transactions, products)
+            transactions["transaction_date"] = transactions["transaction_date"].astype(str)
+
+        write_table(customers, "customers", RAW_DATA_DIR, raw_format)
+        write_table(products, "products", RAW_DATA_DIR, raw_format)
+        write_transaction_chunk(
+            transactions, items,
+            os.path.join(RAW_DATA_DIR, raw_storage.table_path("transactions", raw_format)),
+            os.path.join(RAW_DATA_DIR, raw_storage.table_path("transaction_items", raw_format)),
+            raw_format, part=0, write_header=True
+        )
 
-    customers = generate_customers(config["data_generation"]["customers"])
-    products = generate_products(config["data_generation"]["products"])
-    transactions = generate_transactions(customers, config["data_generation"]["transactions"])
-    items, transactions = generate_transaction_items(transactions, products)
+        record_counts = {
+            "customers": len(customers),
+            "products": len(products),
+            "transactions": len(transactions),
+            "transaction_items": len(items)
+        }
 
-    customers.to_csv(f"{RAW_DATA_DIR}/customers.csv", index=False)
-    products.to_csv(f"{RAW_DATA_DIR}/products.csv", index=False)
-    transactions.to_csv(f"{RAW_DATA_DIR}/transactions.csv", index=False)
-    items.to_csv(f"{RAW_DATA_DIR}/transaction_items.csv", index=False)
+    if raw_format == "parquet":
+        for table in RAW_TABLES:
+            raw_storage.write_schema(table, RAW_DATA_DIR)
 
     with open(f"{RAW_DATA_DIR}/generation_metadata.json", "w") as f:
-        json.dump({"status": "ok"}, f)
+        json.dump({
+            "status": "ok",
+            "generated_at": datetime.now().isoformat(),
+            "mode": mode,
+            "format": raw_format,
+            "seed": seed,
+            "chunk_size": chunk_size if mode in ("streaming", "sharded") else None,
+            "record_counts": record_counts,
+            "shards": shards,
+            "files": files,
+            "schemas": {
+                table: f"{table}.schema.json" for table in RAW_TABLES
+            } if raw_format == "parquet" else None
+        }, f, indent=4)
 
     print("✅ Data generation completed successfully")
 
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+# Ensure project root is on PYTHONPATH
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(BASE_DIR)
+
+import numpy as np
+import pandas as pd
+
+from scripts import raw_storage
+from scripts.data_generation.generate_data import (
+    MAX_ITEMS_PER_TRANSACTION, RAW_DATA_DIR, generate_transaction_batch, load_config
+)
+
+LANDING_DIR = raw_storage.LANDING_DIR
+BATCH_LOG = os.path.join(LANDING_DIR, raw_storage.STREAM_BATCH_LOG)
+MANIFEST_PATH = os.path.join(RAW_DATA_DIR, "generation_metadata.json")
+
+DEFAULT_SETTINGS = {
+    "batch_transactions": 200,
+    "interval_seconds": 5
+}
+
+def load_settings():
+    config = load_config()
+    return {**DEFAULT_SETTINGS, **(config.get("streaming") or {})}, config
+
+# -----------------------------
+# Producer state
+# -----------------------------
+def last_batch():
+    """The most recent complete line of the batch log, or None."""
+    if not os.path.exists(BATCH_LOG):
+        return None
+    last = None
+    with open(BATCH_LOG) as f:
+        for line in f:
+            if line.endswith("\n"):
+                last = line
+    return json.loads(last) if last else None
+
+def next_ids():
+    """
+    (batch, transaction id, item id) to continue from: after the last logged
+    batch, else after the generated data set. Sharded generation spaces item
+    ids MAX_ITEMS_PER_TRANSACTION per transaction, so ids past that bound
+    never collide.
+    """
+    record = last_batch()
+    if record:
+        return record["batch"] + 1, record["next_transaction_id"], record["next_item_id"]
+    with open(MANIFEST_PATH) as f:
+        transactions = json.load(f)["record_counts"]["transactions"]
+    return 1, transactions + 1, transactions * MAX_ITEMS_PER_TRANSACTION + 1
+
+def load_dimension(table, raw_format):
+    path = os.path.join(RAW_DATA_DIR, raw_storage.table_path(table, raw_format))
+    return pd.read_parquet(path) if raw_format == "parquet" else pd.read_csv(path)
+
+# -----------------------------
+# Batches
+# -----------------------------
+def append_batch(frames):
+    """
+    Append each table's rows to its stream file and return the end offsets.
+    Files are flushed to disk before the batch is logged, so a logged offset
+    always ends on a complete line.
+    """
+    offsets = {}
+    for table, df in frames.items():
+        path = raw_storage.stream_path(table)
+        with open(path, "a", newline="") as f:
+            df.to_csv(f, header=f.tell() == 0, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+            offsets[table] = f.tell()
+    return offsets
+
+def log_batch(record):
+    with open(BATCH_LOG, "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def produce_batch(batch, first_txn_id, first_item_id, n, customers, products, seed=None):
+    # Streamed transactions happen now: every row is dated today
+    rng = np.random.default_rng(None if seed is None else [seed, batch])
+    transactions, items = generate_transaction_batch(
+        rng, first_txn_id, n,
+        customers["customer_id"].to_numpy(),
+        products["product_id"].to_numpy(), products["price"].to_numpy(),
+        first_item_id, np.datetime64(date.today(), "D"), 1
+    )
+    offsets = append_batch({"transactions": transactions, "transaction_items": items})
+
+    record = {
+        "batch": batch,
+        "produced_at": datetime.now().isoformat(),
+        "rows": {"transactions": len(transactions), "transaction_items": len(items)},
+        "offsets": offsets,
+        "next_transaction_id": first_txn_id + len(transactions),
+        "next_item_id": first_item_id + len(items)
+    }
+    log_batch(record)
+    return record
+
+def main(batches=None, interval=None, size=None):
+    settings, config = load_settings()
+    interval = settings["interval_seconds"] if interval is None else interval
+    size = size or settings["batch_transactions"]
+    raw_format = raw_storage.get_raw_format(config)
+    seed = config["data_generation"].get("seed")
+
+    os.makedirs(LANDING_DIR, exist_ok=True)
+    customers = load_dimension("customers", raw_format)
+    products = load_dimension("products", raw_format)
+    batch, txn_id, item_id = next_ids()
+
+    print(f"🔄 Streaming {size} transactions every {interval}s into {LANDING_DIR}")
+    produced = 0
+    while batches is None or produced < batches:
+        record = produce_batch(batch, txn_id, item_id, size, customers, products, seed)
+        print(f"   Batch {batch}: {record['rows']['transactions']} transactions, "
+              f"{record['rows']['transaction_items']} items")
+        batch, txn_id, item_id = batch + 1, record["next_transaction_id"], record["next_item_id"]
+        produced += 1
+        if batches is None or produced < batches:
+            time.sleep(interval)
+
+    print(f"✅ Produced {produced} batch(es)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append micro-batches of transactions to the landing stream files.")
+    parser.add_argument("--batches", type=int, help="Stop after this many batches (default: run until stopped)")
+    parser.add_argument("--interval", type=float, help="Seconds between batches (streaming.interval_seconds)")
+    parser.add_argument("--size", type=int, help="Transactions per batch (streaming.batch_transactions)")
+    args = parser.parse_args()
+    main(args.batches, args.interval, args.size)
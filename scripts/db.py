@@ -1,10 +1,203 @@
+import atexit
+import functools
 import os
+import sys
+import threading
+import traceback
+from pathlib import Path
 
-def get_db_config():
-    return {
-        "host": os.getenv("DB_HOST", "localhost"),
-        "port": int(os.getenv("DB_PORT", 5432)),
-        "dbname": os.getenv("DB_NAME", "ecommerce_db"),
-        "user": os.getenv("DB_USER", "admin"),
-        "password": os.getenv("DB_PASSWORD", "password"),
+import psycopg2
+import yaml
+from psycopg2.pool import ThreadedConnectionPool
+
+# Exit code of a step that failed on a transient error (EX_TEMPFAIL); the
+# orchestrator retries only these
+RETRYABLE_EXIT_CODE = 75
+
+# serialization_failure, deadlock_detected, admin_shutdown, crash_shutdown,
+# cannot_connect_now; plus every connection_exception (class 08)
+RETRYABLE_SQLSTATES = {"40001", "40P01", "57P01", "57P02", "57P03"}
+
+CONFIG_PATH = Path(__file__).resolve().parents[1] / "config" / "config.yaml"
+
+# Environment variables overriding the database section of config.yaml
+ENV_OVERRIDES = {
+    "host": "DB_HOST",
+    "port": "DB_PORT",
+    "name": "DB_NAME",
+    "user": "DB_USER",
+    "password": "DB_PASSWORD",
+    "pool_size": "DB_POOL_SIZE",
+    "statement_timeout_seconds": "DB_STATEMENT_TIMEOUT_SECONDS",
+    "application_name": "DB_APPLICATION_NAME"
+}
+
+DEFAULT_SETTINGS = {
+    "host": "localhost",
+    "port": 5432,
+    "name": "ecommerce_db",
+    "user": "admin",
+    "password": "password",
+    "pool_size": 4,
+    "statement_timeout_seconds": 0,
+    "application_name": "ecommerce_pipeline"
+}
+
+# Tuning a step may override (database.steps.<step>)
+STEP_SETTINGS = ["pool_size", "statement_timeout_seconds", "application_name"]
+
+# The process-wide pool behind connect(): opened by the orchestrator when
+# steps run in-process, else on first use by a step's own process
+_shared_pool = None
+_pool_lock = threading.Lock()
+
+# -----------------------------
+# Settings
+# -----------------------------
+@functools.lru_cache(maxsize=None)
+def _database_section():
+    with open(CONFIG_PATH, "r") as f:
+        return yaml.safe_load(f).get("database") or {}
+
+def load_settings(step=None):
+    """
+    The database section of config.yaml over the defaults, with the DB_*
+    environment variables on top. For a step, application_name gets the
+    step's name appended and database.steps.<step> overrides apply last.
+    """
+    section = _database_section()
+    settings = {**DEFAULT_SETTINGS, **{k: v for k, v in section.items() if k != "steps"}}
+    for key, env in ENV_OVERRIDES.items():
+        if os.getenv(env) is not None:
+            settings[key] = os.getenv(env)
+    if step:
+        settings["application_name"] = f"{settings['application_name']}.{step}"
+        overrides = (section.get("steps") or {}).get(step) or {}
+        settings.update({k: v for k, v in overrides.items() if k in STEP_SETTINGS})
+    return settings
+
+def statement_timeout_ms(settings):
+    return int(float(settings["statement_timeout_seconds"]) * 1000)
+
+def get_db_config(step=None):
+    """psycopg2.connect() keyword arguments, tagged and tuned for a step."""
+    settings = load_settings(step)
+    config = {
+        "host": settings["host"],
+        "port": int(settings["port"]),
+        "dbname": settings["name"],
+        "user": settings["user"],
+        "password": settings["password"],
+        "application_name": settings["application_name"]
     }
+    if statement_timeout_ms(settings):
+        config["options"] = f"-c statement_timeout={statement_timeout_ms(settings)}"
+    return config
+
+def get_db_url():
+    """SQLAlchemy URL of the database (for pandas to_sql)."""
+    from sqlalchemy.engine import URL
+
+    settings = load_settings()
+    return URL.create(
+        "postgresql+psycopg2", username=settings["user"], password=settings["password"],
+        host=settings["host"], port=int(settings["port"]), database=settings["name"]
+    )
+
+# -----------------------------
+# Connections
+# -----------------------------
+@functools.lru_cache(maxsize=None)
+def get_engine(step=None):
+    """The process-wide SQLAlchemy engine of a step (for pandas to_sql)."""
+    from sqlalchemy import create_engine
+
+    config = get_db_config(step)
+    connect_args = {k: config[k] for k in ["application_name", "options"] if k in config}
+    return create_engine(get_db_url(), pool_size=int(load_settings(step)["pool_size"]),
+                         connect_args=connect_args)
+
+def open_pool(maxconn=None, step=None):
+    """
+    A pool for a step running its queries concurrently; the caller closes
+    it. Such steps do not borrow from the shared pool, which is sized for
+    one connection per parallel step.
+    """
+    return ThreadedConnectionPool(1, maxconn or int(load_settings(step)["pool_size"]), **get_db_config(step))
+
+def open_shared_pool(maxconn=None, step=None):
+    global _shared_pool
+    with _pool_lock:
+        if _shared_pool is None:
+            # Shared by every step: connect() applies each step's timeout, so
+            # the opening step's is not made the session default
+            config = get_db_config(step)
+            config.pop("options", None)
+            _shared_pool = ThreadedConnectionPool(
+                1, maxconn or int(load_settings(step)["pool_size"]), **config
+            )
+    return _shared_pool
+
+def close_shared_pool():
+    global _shared_pool
+    with _pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.closeall()
+            _shared_pool = None
+
+def apply_step_settings(conn, step):
+    """
+    Tag a pooled connection with a step's application_name and statement
+    timeout. A step without a timeout gets the session default back, so a
+    limit set through PGOPTIONS (the orchestrator's in-process step timeout)
+    still applies.
+    """
+    settings = load_settings(step)
+    with conn.cursor() as cur:
+        cur.execute("SELECT set_config('application_name', %s, false);", (settings["application_name"],))
+        if statement_timeout_ms(settings):
+            cur.execute("SELECT set_config('statement_timeout', %s, false);",
+                        (str(statement_timeout_ms(settings)),))
+        else:
+            cur.execute("RESET statement_timeout;")
+    conn.commit()
+
+def connect(step=None):
+    """
+    A connection from the process-wide pool, opened on first use, with the
+    step's application_name and statement timeout. Give it back with release().
+    """
+    pool = _shared_pool or open_shared_pool(step=step)
+    conn = pool.getconn()
+    apply_step_settings(conn, step)
+    return conn
+
+def release(conn):
+    """Give back a connection obtained from connect()."""
+    if _shared_pool is not None:
+        # putconn rolls back anything left uncommitted
+        _shared_pool.putconn(conn)
+    else:
+        conn.close()
+
+atexit.register(close_shared_pool)
+
+def is_retryable(exc):
+    """True for lost connections, serialization failures and deadlocks."""
+    exc = getattr(exc, "orig", exc)  # SQLAlchemy wraps the driver error
+    if not isinstance(exc, psycopg2.Error):
+        return False
+    if exc.pgcode is None:
+        # No SQLSTATE: the server never answered (could not connect, connection dropped)
+        return isinstance(exc, psycopg2.OperationalError)
+    return exc.pgcode in RETRYABLE_SQLSTATES or exc.pgcode.startswith("08")
+
+def run(main, *args):
+    """Run a step script's entry point, exiting with RETRYABLE_EXIT_CODE on transient errors."""
+    try:
+        main(*args)
+    except Exception as e:
+        if not is_retryable(e):
+            raise
+        traceback.print_exc()
+        sys.exit(RETRYABLE_EXIT_CODE)
@@ -1,28 +1,546 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
+import argparse
+import csv
+import hashlib
+import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+import pandas as pd
+import psycopg2
+import yaml
+from psycopg2 import sql
+from sqlalchemy import text
+from scripts import db, raw_storage, schema_swap, watermarks
+
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+STAGING_DDL = ROOT_DIR / "sql" / "ddl" / "create_staging_schema.sql"
+
+RAW_DATA_DIR = "data/raw"
+MANIFEST_PATH = os.path.join(RAW_DATA_DIR, "generation_metadata.json")
+SUMMARY_PATH = Path("data/staging/ingestion_summary.json")
+
+TABLES = ["customers", "products", "transactions", "transaction_items"]
+
+# Loads go into staging.<table>__load and are renamed over the live tables
+# in one transaction once every table has loaded.
+SHADOW_SUFFIX = "__load"
+# Indexes of the staging tables by name suffix (as in the staging DDL),
+# created on each shadow and renamed with it
+INDEXES = {table: {"loaded_at_brin": "USING brin (loaded_at)"} for table in TABLES}
+# The production transform looks up the items of reloaded transactions
+INDEXES["transaction_items"]["transaction_id_idx"] = "(TRIM(transaction_id))"
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Each COPY chunk is checkpointed when it commits into its shadow table; a
+# failed load keeps the shadows so that a rerun of the same plan only copies
+# the chunks that are missing.
+CHECKPOINT_STEP = "ingestion"
+
+# Incremental loads resume a file at its recorded byte offset if the bytes
+# just before that offset are unchanged (i.e. the file was only appended to).
+TAIL_CHECKSUM_BYTES = 64 * 1024
+
+def load_config():
+    with open(CONFIG_PATH, "r") as f:
+        return yaml.safe_load(f)
+
+def resolve_raw_files(table):
+    """
+    Files holding a raw table, taken from the generator's manifest when it
+    lists them (sharded or Parquet output), otherwise the single <table>.csv,
+    followed by the table's stream file when streaming mode has written one.
+    Parquet dataset directories are expanded into their files.
+    """
+    paths = [os.path.join(RAW_DATA_DIR, f"{table}.csv")]
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            files = (json.load(f).get("files") or {}).get(table)
+        if files:
+            paths = raw_storage.expand_paths([os.path.join(RAW_DATA_DIR, name) for name in files])
+
+    stream = raw_storage.stream_path(table)
+    if table in raw_storage.STREAM_TABLES and os.path.exists(stream):
+        paths.append(stream)
+    return paths
+
+def is_parquet(path):
+    return path.endswith(".parquet")
+
+def is_stream(path):
+    return os.path.dirname(os.path.normpath(path)) == os.path.normpath(raw_storage.LANDING_DIR)
+
+def stream_end(path):
+    """
+    End of the last complete batch in a stream file. The producer may be
+    appending past it; those bytes are loaded once their batch is logged.
+    """
+    table = os.path.splitext(os.path.basename(path))[0]
+    log = os.path.join(os.path.dirname(path), raw_storage.STREAM_BATCH_LOG)
+    last = None
+    if os.path.exists(log):
+        with open(log) as f:
+            for line in f:
+                if line.endswith("\n"):
+                    last = line
+    return json.loads(last)["offsets"][table] if last else read_header(path)[1]
+
+def loaded_end(path):
+    """Byte offset a load of this file reads up to."""
+    return stream_end(path) if is_stream(path) else os.path.getsize(path)
 
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_URL = f"postgresql://admin:password@{DB_HOST}:5432/ecommerce_db"
+def source_key(path):
+    """
+    Watermark source of a raw file: its path relative to the raw zone
+    (../landing/<table>.csv for stream files).
+    """
+    return os.path.relpath(path, RAW_DATA_DIR)
 
-def main():
-    engine = create_engine(DB_URL)
+def read_raw_table(table):
+    return pd.concat([
+        pd.read_parquet(path) if is_parquet(path) else pd.read_csv(path)
+        for path in resolve_raw_files(table)
+    ], ignore_index=True)
+
+def table_result(rows, duration):
+    return {
+        "rows_loaded": rows,
+        "status": "success",
+        "error_message": None,
+        "duration_seconds": round(duration, 3),
+        "rows_per_second": round(rows / duration, 1) if duration > 0 else None
+    }
+
+# -----------------------------
+# Engine: to_sql (pandas, batched INSERTs)
+# -----------------------------
+def load_with_to_sql(full_refresh=True):
+    # Always a full replace; incremental loading needs the copy engine.
+    if not full_refresh:
+        raise ValueError("The to_sql engine only does full refreshes; use ingestion.engine: copy to load incrementally")
+    engine = db.get_engine("ingestion")
+    results = {}
 
     with engine.begin() as conn:
         # ✅ SQLAlchemy 2.x FIX
         conn.execute(text("CREATE SCHEMA IF NOT EXISTS staging"))
 
-        customers = pd.read_csv("data/raw/customers.csv")
-        products = pd.read_csv("data/raw/products.csv")
-        transactions = pd.read_csv("data/raw/transactions.csv")
-        items = pd.read_csv("data/raw/transaction_items.csv")
+        for table in TABLES:
+            start = time.perf_counter()
+            df = read_raw_table(table)
+            df["loaded_at"] = datetime.now()
+            df.to_sql(table, conn, schema="staging", if_exists="replace", index=False)
+            results[table] = table_result(len(df), time.perf_counter() - start)
+
+    return results
+
+# -----------------------------
+# Engine: copy (parallel COPY FROM STDIN into shadow tables)
+# -----------------------------
+class ByteRangeReader:
+    """Read-only file view over bytes [start, end), fed to COPY FROM STDIN."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_header(path):
+    """Return the CSV header columns and the byte offset where data starts."""
+    with open(path, "rb") as f:
+        columns = next(csv.reader([f.readline().decode()]))
+        return columns, f.tell()
+
+def split_byte_ranges(path, chunk_bytes, start=None, end=None):
+    """
+    Return the CSV header columns and line-aligned (start, end) byte ranges
+    of roughly chunk_bytes each, covering every data row from start (default:
+    just after the header) up to end (default: end of file) once. Assumes no
+    quoted field contains a newline, which holds for the generated files.
+    """
+    columns, data_start = read_header(path)
+    size = os.path.getsize(path) if end is None else end
+    start = data_start if start is None else start
+    ranges = []
+
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+
+    return columns, ranges
+
+def tail_checksum(path, offset):
+    """sha256 of the TAIL_CHECKSUM_BYTES bytes that end at offset."""
+    begin = max(0, offset - TAIL_CHECKSUM_BYTES)
+    with open(path, "rb") as f:
+        f.seek(begin)
+        return hashlib.sha256(f.read(offset - begin)).hexdigest()
+
+def resume_offset(path, state):
+    """
+    Byte offset to resume an appended file from, or None when the file is new
+    or was rewritten since it was last loaded and must be read from the start.
+    """
+    if not state or state["byte_offset"] is None:
+        return None
+    offset = state["byte_offset"]
+    size = os.path.getsize(path)
+    if offset > size or tail_checksum(path, offset) != state["checksum"]:
+        return None
+    # Parquet files are immutable: anything but an unchanged file is a rewrite
+    if is_parquet(path) and offset != size:
+        return None
+    return offset
+
+def staging_columns(cur, table):
+    cur.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'staging' AND table_name = %s ORDER BY ordinal_position",
+        (table,)
+    )
+    return [row[0] for row in cur.fetchall()]
+
+def parquet_units(cur, table, path, resume):
+    """
+    A Parquet file is one COPY unit (its row groups are streamed as CSV), or
+    none when it was already loaded. Only columns the staging table has are
+    read from the file.
+    """
+    if resume is not None:
+        return []
+    import pyarrow.parquet as pq
+
+    names = set(pq.read_schema(path).names)
+    columns = [c for c in staging_columns(cur, table) if c in names]
+    return [(table, path, columns, 0, os.path.getsize(path))]
+
+def plan_table(cur, table, chunk_bytes, full_refresh):
+    """
+    Decide how a table is loaded this run. "append" loads only the bytes added
+    to each CSV file since its watermark, plus any file not loaded before;
+    "replace" reloads every file, which happens on a full refresh, on the
+    first load, or when any loaded file was rewritten or removed. Returns
+    (mode, {path: end offset loaded}, units).
+    """
+    paths = {path: loaded_end(path) for path in resolve_raw_files(table)}
+    state = {} if full_refresh else watermarks.get_watermarks(cur, "staging", table)
+    sources = {path: source_key(path) for path in paths}
+    offsets = {path: resume_offset(path, state.get(sources[path])) for path in paths}
+
+    rewritten = any(sources[p] in state and offsets[p] is None for p in paths)
+    removed = set(state) - set(sources.values())
+    mode = "append" if state and not rewritten and not removed else "replace"
+
+    units = []
+    for path in paths:
+        resume = offsets[path] if mode == "append" else None
+        if is_parquet(path):
+            units.extend(parquet_units(cur, table, path, resume))
+            continue
+        columns, ranges = split_byte_ranges(path, chunk_bytes, resume, paths[path])
+        units.extend((table, path, columns, start, end) for start, end in ranges)
+
+    return mode, paths, units
+
+def shadow_name(table):
+    return f"{table}{SHADOW_SUFFIX}"
+
+def copy_statement(table, columns):
+    return sql.SQL("COPY {}.{} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier("staging"),
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+
+def prepare_shadow_tables(cur):
+    for table in TABLES:
+        shadow = shadow_name(table)
+        cur.execute(f"DROP TABLE IF EXISTS staging.{shadow};")
+        # Indexes are created by name (not copied) so the DDL's
+        # CREATE INDEX IF NOT EXISTS still matches after a swap.
+        cur.execute(
+            f"CREATE TABLE staging.{shadow} "
+            f"(LIKE staging.{table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);"
+        )
+        for suffix, definition in INDEXES[table].items():
+            cur.execute(f"CREATE INDEX {shadow}_{suffix} ON staging.{shadow} {definition};")
+
+def publish_shadow_tables(cur, table_modes, table_paths, rows_by_file):
+    """
+    Publish every table's shadow in the caller's transaction: "replace"
+    tables are renamed over the live table, "append" tables are inserted into
+    it. The per-file watermarks are advanced in the same transaction.
+    """
+    for table, mode in table_modes.items():
+        shadow = shadow_name(table)
+        if mode == "replace":
+            cur.execute(f"DROP TABLE staging.{table};")
+            cur.execute(f"ALTER TABLE staging.{shadow} RENAME TO {table};")
+            for suffix in INDEXES[table]:
+                cur.execute(f"ALTER INDEX staging.{shadow}_{suffix} RENAME TO {table}_{suffix};")
+            watermarks.clear_watermarks(cur, "staging", table)
+        else:
+            cur.execute(f"INSERT INTO staging.{table} SELECT * FROM staging.{shadow};")
+            cur.execute(f"DROP TABLE staging.{shadow};")
+
+        for path, end in table_paths[table].items():
+            watermarks.set_watermark(
+                cur, "staging", table, source=source_key(path),
+                byte_offset=end, checksum=tail_checksum(path, end),
+                rows_loaded=rows_by_file.get(path, 0)
+            )
+
+    watermarks.clear_checkpoints(cur, CHECKPOINT_STEP)
+
+def legacy_staging_tables(cur):
+    """
+    Staging tables whose columns (names and types) differ from the staging
+    DDL, such as those of the to_sql engine or of earlier versions (pandas
+    types, no loaded_at). COPY and the loaded_at index fail on them.
+    """
+    # The DDL as it would create the tables now, in a scratch schema
+    cur.execute("DROP SCHEMA IF EXISTS staging_expected CASCADE;")
+    cur.execute(schema_swap.retarget_ddl(STAGING_DDL, "staging", "staging_expected"))
+    cur.execute("""
+        WITH columns AS (
+            SELECT n.nspname, c.relname,
+                   ARRAY_AGG((a.attname, format_type(a.atttypid, a.atttypmod))::TEXT ORDER BY a.attname) AS columns
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            WHERE n.nspname IN ('staging', 'staging_expected') AND c.relname = ANY(%s)
+            GROUP BY n.nspname, c.relname
+        )
+        SELECT live.relname
+        FROM columns live
+        JOIN columns expected ON expected.relname = live.relname AND expected.nspname = 'staging_expected'
+        WHERE live.nspname = 'staging' AND live.columns <> expected.columns
+        ORDER BY live.relname;
+    """, (TABLES,))
+    legacy = [table for table, in cur.fetchall()]
+    cur.execute("DROP SCHEMA staging_expected CASCADE;")
+    return legacy
+
+def shadow_tables_exist(cur):
+    cur.execute(
+        "SELECT COUNT(to_regclass(name)) FROM unnest(%s::TEXT[]) AS name;",
+        ([f"staging.{shadow_name(t)}" for t in TABLES],)
+    )
+    return cur.fetchone()[0] == len(TABLES)
+
+def plan_key(plan):
+    """Identity of a load plan: the files (as they are now), modes and ranges."""
+    key = {
+        table: [
+            mode,
+            [file_identity(p, end) for p, end in paths.items()],
+            [unit_key(unit) for unit in units]
+        ]
+        for table, (mode, paths, units) in plan.items()
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def file_identity(path, end):
+    # Stream files are append-only below their end, whatever their mtime
+    if is_stream(path):
+        return [source_key(path), end]
+    return [source_key(path), end, os.stat(path).st_mtime_ns]
+
+def unit_key(unit):
+    table, path, _, start, end = unit
+    return f"{table}:{source_key(path)}:{start}-{end}"
+
+def open_unit(path, columns, start, end):
+    if is_parquet(path):
+        return raw_storage.ParquetCsvReader(path, columns)
+    return ByteRangeReader(path, start, end)
+
+def copy_range(pool, table, path, columns, start, end, key=None):
+    """
+    COPY one byte range of a raw file (or a whole Parquet file) into the
+    table's shadow, checkpointing it under plan key in the same transaction.
+    """
+    conn = pool.getconn()
+    try:
+        began = time.perf_counter()
+        with conn.cursor() as cur, open_unit(path, columns, start, end) as reader:
+            cur.copy_expert(copy_statement(shadow_name(table), columns), reader)
+            rows = cur.rowcount
+            if key:
+                unit = (table, path, columns, start, end)
+                watermarks.set_checkpoint(cur, CHECKPOINT_STEP, unit_key(unit), key, rows)
+        conn.commit()
+        return rows, began, time.perf_counter()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+def run_in_transaction(pool, fn, *args):
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            result = fn(cur, *args)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+def plan_load(cur, chunk_bytes, full_refresh):
+    """
+    Plan every table and return (plan, key, done): done maps the units an
+    interrupted load of the same plan already committed to their row counts.
+    Otherwise the shadow tables are created afresh.
+    """
+    watermarks.ensure_table(cur)
+    # Recreated from the DDL and reloaded in full, like the legacy layouts of
+    # production and the warehouse
+    legacy = legacy_staging_tables(cur)
+    for table in legacy:
+        print(f"   staging.{table} has a legacy layout; recreating it")
+        cur.execute(f"DROP TABLE staging.{table};")
+        watermarks.clear_watermarks(cur, "staging", table)
+    cur.execute(STAGING_DDL.read_text())
+    plan = {table: plan_table(cur, table, chunk_bytes, full_refresh) for table in TABLES}
+    key = plan_key(plan)
+
+    done = watermarks.get_checkpoints(cur, CHECKPOINT_STEP, key)
+    if legacy or not (done and shadow_tables_exist(cur)):
+        watermarks.clear_checkpoints(cur, CHECKPOINT_STEP)
+        prepare_shadow_tables(cur)
+        done = {}
+    return plan, key, done
+
+def load_with_copy(full_refresh=False):
+    settings = load_config().get("ingestion", {})
+    workers = settings.get("workers") or DEFAULT_WORKERS
+    chunk_bytes = settings.get("chunk_bytes") or DEFAULT_CHUNK_BYTES
+
+    # One connection per worker; the executor never runs more tasks than that
+    pool = db.open_pool(workers, "ingestion")
+    timings = {table: [] for table in TABLES}
+    resumed = {table: 0 for table in TABLES}
+    rows_by_file = {}
+
+    try:
+        plan, key, done = run_in_transaction(pool, plan_load, chunk_bytes, full_refresh)
+        units = []
+        for _, _, table_units in plan.values():
+            for unit in table_units:
+                if unit_key(unit) in done:
+                    table, path = unit[:2]
+                    resumed[table] += 1
+                    rows_by_file[path] = rows_by_file.get(path, 0) + done[unit_key(unit)]
+                else:
+                    units.append(unit)
+        if done:
+            print(f"   Resuming interrupted load: {len(done)} chunk(s) already copied")
+        # Biggest ranges first so the pool is not left waiting on a late large chunk
+        units.sort(key=lambda u: u[4] - u[3], reverse=True)
+
+        # On failure the shadows and checkpoints are kept for the next attempt
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(copy_range, pool, *unit, key): unit for unit in units}
+            for future in as_completed(futures):
+                table, path = futures[future][:2]
+                result = future.result()
+                timings[table].append(result)
+                rows_by_file[path] = rows_by_file.get(path, 0) + result[0]
+
+        run_in_transaction(
+            pool, publish_shadow_tables,
+            {table: p[0] for table, p in plan.items()},
+            {table: p[1] for table, p in plan.items()},
+            rows_by_file
+        )
+    finally:
+        pool.closeall()
+
+    results = {}
+    for table, chunks in timings.items():
+        rows = sum(c[0] for c in chunks)
+        # Tables load concurrently, so a table's duration is its own wall-clock span
+        duration = max(c[2] for c in chunks) - min(c[1] for c in chunks) if chunks else 0
+        results[table] = {
+            **table_result(rows, duration),
+            "chunks": len(chunks),
+            "chunks_resumed": resumed[table],
+            "mode": plan[table][0]
+        }
+
+    return results
+
+ENGINES = {
+    "to_sql": load_with_to_sql,
+    "copy": load_with_copy
+}
+
+def write_summary(engine_name, full_refresh, results, total_seconds):
+    SUMMARY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    total_rows = sum(r["rows_loaded"] for r in results.values())
+
+    with open(SUMMARY_PATH, "w") as f:
+        json.dump({
+            "ingestion_timestamp": datetime.now().isoformat(),
+            "engine": engine_name,
+            "load_mode": "full" if full_refresh else "incremental",
+            "tables_loaded": results,
+            "total_rows_loaded": total_rows,
+            "total_execution_time_seconds": round(total_seconds, 2),
+            "rows_per_second": round(total_rows / total_seconds, 1) if total_seconds > 0 else None
+        }, f, indent=2)
 
-        customers.to_sql("customers", conn, schema="staging", if_exists="replace", index=False)
-        products.to_sql("products", conn, schema="staging", if_exists="replace", index=False)
-        transactions.to_sql("transactions", conn, schema="staging", if_exists="replace", index=False)
-        items.to_sql("transaction_items", conn, schema="staging", if_exists="replace", index=False)
+def run(engine_name, full_refresh=True):
+    start = time.perf_counter()
+    results = ENGINES[engine_name](full_refresh)
+    total_seconds = time.perf_counter() - start
+    write_summary(engine_name, full_refresh, results, total_seconds)
+    return results, total_seconds
 
-    print("✅ Data successfully loaded into staging")
+def main(full_refresh=None):
+    engine_name = load_config().get("ingestion", {}).get("engine", "to_sql")
+    full_refresh = watermarks.is_full_refresh(full_refresh) or engine_name == "to_sql"
+    run(engine_name, full_refresh)
+    mode = "full" if full_refresh else "incremental"
+    print(f"✅ Data successfully loaded into staging ({engine_name}, {mode})")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Load raw files into the staging schema.")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Reload every file instead of only newly appended rows")
+    db.run(main, parser.parse_args().full_refresh)
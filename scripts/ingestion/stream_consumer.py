@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import fcntl
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+import yaml
+from scripts import db, raw_storage, watermarks
+from scripts.ingestion.ingest_to_staging import (
+    ByteRangeReader, copy_statement, read_header,
+    resume_offset, source_key, tail_checksum
+)
+from scripts.transformation import generate_analytics, load_warehouse, staging_to_production
+
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+BATCH_LOG = os.path.join(raw_storage.LANDING_DIR, raw_storage.STREAM_BATCH_LOG)
+# Latency percentiles over the last latency_window batches, read by the monitor
+METRICS_PATH = Path("data/processed/streaming_metrics.json")
+# Same lock as the orchestrator's: a micro-batch never interleaves with a run
+PIPELINE_LOCK = Path("logs/pipeline.lock")
+PIPELINE_LOCK.parent.mkdir(exist_ok=True)
+
+DEFAULT_SETTINGS = {
+    "poll_seconds": 1,
+    "max_batches_per_merge": 20,
+    "latency_window": 1000
+}
+
+PERCENTILES = [50, 95, 99]
+
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("streaming") or {})}
+
+# -----------------------------
+# Loading
+# -----------------------------
+def copy_stream_table(cur, table, end):
+    """
+    COPY a stream file from its staging watermark up to end straight into
+    the live staging table, advancing the watermark in the same transaction
+    so every batch is loaded exactly once (by this or by a batch ingestion).
+    """
+    path = raw_storage.stream_path(table)
+    state = watermarks.get_watermarks(cur, "staging", table).get(source_key(path))
+    columns, data_start = read_header(path)
+    start = resume_offset(path, state)
+    if start is None:
+        if state:
+            raise RuntimeError(f"{path} was rewritten since it was loaded; run the batch ingestion first")
+        start = data_start
+    if end <= start:
+        return 0
+
+    with ByteRangeReader(path, start, end) as reader:
+        cur.copy_expert(copy_statement(table, columns), reader)
+    rows = cur.rowcount
+    watermarks.set_watermark(
+        cur, "staging", table, source=source_key(path), byte_offset=end,
+        checksum=tail_checksum(path, end), rows_loaded=(state or {}).get("rows_loaded", 0) + rows
+    )
+    return rows
+
+def load_batches(batches):
+    conn = db.connect("streaming")
+    try:
+        with conn.cursor() as cur:
+            watermarks.ensure_table(cur)
+            rows = {
+                table: copy_stream_table(cur, table, max(b["offsets"][table] for b in batches))
+                for table in raw_storage.STREAM_TABLES
+            }
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db.release(conn)
+
+def loaded_offsets():
+    """Staging watermark of each stream file: batches below it are already loaded."""
+    conn = db.connect("streaming")
+    try:
+        with conn.cursor() as cur:
+            watermarks.ensure_table(cur)
+            offsets = {}
+            for table in raw_storage.STREAM_TABLES:
+                state = watermarks.get_watermarks(cur, "staging", table).get(source_key(raw_storage.stream_path(table)))
+                offsets[table] = (state or {}).get("byte_offset") or 0
+        conn.commit()
+        return offsets
+    finally:
+        db.release(conn)
+
+def refresh_analytics():
+    # Only the months the merge touched; the CSV exports are left to batch runs
+    conn = db.connect("streaming")
+    try:
+        with conn, conn.cursor() as cur:
+            generate_analytics.refresh(cur, False)
+    finally:
+        db.release(conn)
+
+def process_batches(batches):
+    """
+    Load the batches into staging, then merge them on into production, the
+    warehouse and the analytics aggregates with the incremental steps, all
+    under the pipeline lock.
+    """
+    with open(PIPELINE_LOCK, "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        started = time.perf_counter()
+        rows = load_batches(batches)
+        loaded = time.perf_counter()
+        staging_to_production.transform(False)
+        load_warehouse.load(False)
+        refresh_analytics()
+    return rows, loaded - started, time.perf_counter() - loaded
+
+# -----------------------------
+# Latency metrics
+# -----------------------------
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * pct / 100)) - 1]
+
+def write_metrics(latencies, totals, last):
+    METRICS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(METRICS_PATH, "w") as f:
+        json.dump({
+            "updated_at": datetime.now().isoformat(),
+            **totals,
+            "latency_seconds": {
+                **{f"p{p}": round(percentile(latencies, p), 3) for p in PERCENTILES},
+                "max": round(max(latencies), 3),
+                "samples": len(latencies)
+            },
+            "last_merge": last
+        }, f, indent=4)
+
+# -----------------------------
+# Consumer
+# -----------------------------
+async def watch_batch_log(queue, poll_seconds, loaded):
+    """
+    Tail the producer's batch log and queue every complete batch record,
+    skipping those that were loaded before the consumer started.
+    """
+    position = 0
+    while True:
+        if os.path.exists(BATCH_LOG):
+            if os.path.getsize(BATCH_LOG) < position:
+                position = 0  # the raw zone was regenerated
+            with open(BATCH_LOG) as f:
+                f.seek(position)
+                for line in iter(f.readline, ""):
+                    if not line.endswith("\n"):
+                        break  # still being written
+                    position = f.tell()
+                    record = json.loads(line)
+                    if any(record["offsets"][t] > loaded[t] for t in loaded):
+                        await queue.put(record)
+        await asyncio.sleep(poll_seconds)
+
+async def consume(queue, settings, max_batches=None):
+    latencies = deque(maxlen=settings["latency_window"])
+    totals = {"batches_processed": 0, "rows_loaded": 0, "merges": 0}
+
+    while max_batches is None or totals["batches_processed"] < max_batches:
+        # Whatever queued up while the last merge ran is merged together
+        batches = [await queue.get()]
+        while not queue.empty() and len(batches) < settings["max_batches_per_merge"]:
+            batches.append(queue.get_nowait())
+
+        rows, load_seconds, merge_seconds = await asyncio.to_thread(process_batches, batches)
+        merged_at = datetime.now()
+
+        # Batches a batch ingestion already loaded still count: their rows
+        # reached the warehouse with this merge at the latest
+        batch_latencies = [
+            (merged_at - datetime.fromisoformat(b["produced_at"])).total_seconds()
+            for b in batches
+        ]
+        latencies.extend(batch_latencies)
+        totals["batches_processed"] += len(batches)
+        totals["rows_loaded"] += sum(rows.values())
+        totals["merges"] += 1
+
+        last = {
+            "batches": [b["batch"] for b in batches],
+            "rows": rows,
+            "load_seconds": round(load_seconds, 3),
+            "merge_seconds": round(merge_seconds, 3),
+            "max_latency_seconds": round(max(batch_latencies), 3),
+            "merged_at": merged_at.isoformat()
+        }
+        write_metrics(latencies, totals, last)
+        print(f"✅ Merged {len(batches)} batch(es), {sum(rows.values())} rows "
+              f"(p95 latency {percentile(latencies, 95):.2f}s)")
+
+async def run(max_batches=None):
+    settings = load_settings()
+    queue = asyncio.Queue()
+    loaded = await asyncio.to_thread(loaded_offsets)
+    watcher = asyncio.create_task(watch_batch_log(queue, settings["poll_seconds"], loaded))
+    try:
+        await consume(queue, settings, max_batches)
+    finally:
+        watcher.cancel()
+
+def main(max_batches=None):
+    if watermarks.is_full_refresh():
+        print("❌ Streaming needs pipeline.load_mode: incremental")
+        sys.exit(1)
+    print(f"🔄 Consuming micro-batches from {raw_storage.LANDING_DIR}")
+    # Merges reuse pooled connections instead of reconnecting per batch
+    db.open_shared_pool(2, "streaming")
+    try:
+        asyncio.run(run(max_batches))
+    finally:
+        db.close_shared_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load streamed micro-batches and merge them through to the warehouse.")
+    parser.add_argument("--max-batches", type=int, help="Stop after this many batches (default: run until stopped)")
+    db.run(main, parser.parse_args().max_batches)
@@ -0,0 +1,218 @@
+import json
+from pathlib import Path
+
+from psycopg2.extras import Json, execute_values
+
+from scripts import db
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+METRICS_DDL = ROOT_DIR / "sql" / "ddl" / "create_pipeline_metrics.sql"
+
+# Reports written by the steps; a step's report is only read when the step
+# ran (not cached) in the execution being recorded, so it is never stale
+STEP_REPORTS = {
+    "Data Ingestion": Path("data/staging/ingestion_summary.json"),
+    "Staging to Production": Path("data/processed/production_summary.json"),
+    "Data Quality Checks": Path("data/processed/data_quality_report.json"),
+    "Analytics Generation": Path("data/processed_analytics/analytics_summary.json")
+}
+
+# name: (Prometheus type, help text)
+METRICS = {
+    "pipeline_run_duration_seconds": ("gauge", "Wall-clock duration of the last pipeline execution"),
+    "pipeline_run_success": ("gauge", "1 if the last pipeline execution succeeded"),
+    "pipeline_step_duration_seconds": ("gauge", "Duration of the step in the last execution that ran it"),
+    "pipeline_step_retries": ("gauge", "Retries the step needed"),
+    "pipeline_step_success": ("gauge", "1 if the step succeeded or was skipped as unchanged"),
+    "pipeline_step_cache_hit": ("gauge", "1 if the step was skipped because its inputs were unchanged"),
+    "pipeline_step_peak_rss_bytes": ("gauge", "Peak resident memory of the step"),
+    "pipeline_step_cpu_seconds": ("gauge", "CPU time of the step by mode"),
+    "pipeline_ingestion_rows": ("gauge", "Rows loaded into staging per table"),
+    "pipeline_ingestion_rows_per_second": ("gauge", "Staging load throughput per table"),
+    "pipeline_ingestion_duration_seconds": ("gauge", "Staging load duration per table"),
+    "pipeline_production_rows": ("gauge", "Rows read, written and rejected per production table"),
+    "pipeline_production_duration_seconds": ("gauge", "Production transform duration per table"),
+    "pipeline_quality_score": ("gauge", "Data quality score of staging (percent)"),
+    "pipeline_quality_violations": ("gauge", "Quality check violations per table"),
+    "pipeline_analytics_refresh_seconds": ("gauge", "Duration of the analytics aggregate refresh"),
+    "pipeline_analytics_query_rows": ("gauge", "Rows exported per analytical query"),
+    "pipeline_analytics_query_seconds": ("gauge", "Export duration per analytical query"),
+    "pipeline_analytics_query_bytes": ("gauge", "Size of the export file per analytical query"),
+    "pipeline_runs_total": ("counter", "Pipeline executions recorded, by status"),
+    "pipeline_last_success_timestamp_seconds": ("gauge", "End time of the last successful execution")
+}
+
+def ensure_tables(cur):
+    cur.execute(METRICS_DDL.read_text())
+
+# -----------------------------
+# Collection
+# -----------------------------
+def step_metrics(name, result):
+    step = {"step": name}
+    samples = [
+        ("pipeline_step_duration_seconds", step, result.get("duration_seconds")),
+        ("pipeline_step_retries", step, result.get("retry_attempts", 0)),
+        ("pipeline_step_success", step, int(result["status"] in ("success", "cached"))),
+        ("pipeline_step_cache_hit", step, int(result.get("cache") == "hit"))
+    ]
+    resources = result.get("resources")
+    if resources:
+        samples += [
+            ("pipeline_step_peak_rss_bytes", step, resources["peak_rss_mb"] * 1024 * 1024),
+            ("pipeline_step_cpu_seconds", {**step, "mode": "user"}, resources["cpu_user_seconds"]),
+            ("pipeline_step_cpu_seconds", {**step, "mode": "system"}, resources["cpu_system_seconds"])
+        ]
+    return samples
+
+def ingestion_metrics(summary):
+    samples = []
+    for table, result in summary["tables_loaded"].items():
+        labels = {"table": table}
+        samples += [
+            ("pipeline_ingestion_rows", labels, result["rows_loaded"]),
+            ("pipeline_ingestion_rows_per_second", labels, result.get("rows_per_second") or 0),
+            ("pipeline_ingestion_duration_seconds", labels, result["duration_seconds"])
+        ]
+    return samples
+
+def production_metrics(summary):
+    samples = []
+    for table, result in summary["tables"].items():
+        samples += [
+            ("pipeline_production_rows", {"table": table, "outcome": outcome}, result[f"rows_{outcome}"])
+            for outcome in ("in", "out", "rejected")
+        ]
+        samples.append(("pipeline_production_duration_seconds", {"table": table}, result["duration_seconds"]))
+    return samples
+
+def quality_metrics(report):
+    samples = [("pipeline_quality_score", {}, report["quality_score"])]
+    for table, result in report["tables"].items():
+        violations = sum(c["violations"] for c in result["checks"].values())
+        samples.append(("pipeline_quality_violations", {"table": table}, violations))
+    return samples
+
+def analytics_metrics(summary):
+    samples = [("pipeline_analytics_refresh_seconds", {}, summary["refresh"]["duration_seconds"])]
+    for query, result in summary["query_results"].items():
+        labels = {"query": query}
+        samples += [
+            ("pipeline_analytics_query_rows", labels, result["rows"]),
+            ("pipeline_analytics_query_seconds", labels, round(result["execution_time_ms"] / 1000, 6))
+        ]
+        if "bytes" in result:
+            samples.append(("pipeline_analytics_query_bytes", labels, result["bytes"]))
+    return samples
+
+REPORT_METRICS = {
+    "Data Ingestion": ingestion_metrics,
+    "Staging to Production": production_metrics,
+    "Data Quality Checks": quality_metrics,
+    "Analytics Generation": analytics_metrics
+}
+
+def collect_run_metrics(report):
+    """(metric, labels, value) samples of one execution report."""
+    samples = [
+        ("pipeline_run_duration_seconds", {}, report["total_duration_seconds"]),
+        ("pipeline_run_success", {}, int(report["status"] == "success"))
+    ]
+    for name, result in report["steps_executed"].items():
+        if result.get("resumed"):
+            continue  # recorded by the attempt that ran it
+        samples += step_metrics(name, result)
+        path = STEP_REPORTS.get(name)
+        if result["status"] == "success" and path is not None and path.exists():
+            with open(path) as f:
+                samples += REPORT_METRICS[name](json.load(f))
+    return samples
+
+def record_run(report):
+    """Append an execution's log row and metric samples to the metrics tables."""
+    steps = report["steps_executed"].values()
+    samples = collect_run_metrics(report)
+
+    conn = db.connect("metrics")
+    try:
+        with conn, conn.cursor() as cur:
+            ensure_tables(cur)
+            cur.execute("""
+                INSERT INTO public.pipeline_execution_log (
+                    execution_id, start_time, end_time, status, total_duration_seconds,
+                    full_refresh, execution_mode, steps_run, steps_cached, steps_failed
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (execution_id) DO UPDATE SET
+                    end_time = EXCLUDED.end_time,
+                    status = EXCLUDED.status,
+                    total_duration_seconds = EXCLUDED.total_duration_seconds,
+                    steps_run = EXCLUDED.steps_run,
+                    steps_cached = EXCLUDED.steps_cached,
+                    steps_failed = EXCLUDED.steps_failed,
+                    recorded_at = CURRENT_TIMESTAMP;
+            """, (
+                report["pipeline_execution_id"], report["start_time"], report["end_time"],
+                report["status"], report["total_duration_seconds"], report["full_refresh"],
+                report["execution_mode"],
+                sum(s["status"] == "success" for s in steps),
+                sum(s["status"] == "cached" for s in steps),
+                sum(s["status"] in ("failed", "blocked", "timeout") for s in steps)
+            ))
+            execute_values(
+                cur,
+                "INSERT INTO public.pipeline_metrics (execution_id, metric, labels, value) VALUES %s;",
+                [(report["pipeline_execution_id"], metric, Json(labels), value)
+                 for metric, labels, value in samples if value is not None]
+            )
+    finally:
+        db.release(conn)
+    return len(samples)
+
+# -----------------------------
+# Exposition
+# -----------------------------
+def latest_samples(cur):
+    """Latest value of every metric and label set, plus run counters."""
+    cur.execute("SELECT to_regclass('public.pipeline_execution_log') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+        return []  # no execution recorded yet
+    cur.execute("""
+        SELECT DISTINCT ON (metric, labels) metric, labels, value
+        FROM public.pipeline_metrics
+        ORDER BY metric, labels, recorded_at DESC;
+    """)
+    samples = cur.fetchall()
+
+    cur.execute("SELECT status, COUNT(*) FROM public.pipeline_execution_log GROUP BY status;")
+    samples += [("pipeline_runs_total", {"status": status}, count) for status, count in cur.fetchall()]
+
+    cur.execute("""
+        SELECT EXTRACT(EPOCH FROM MAX(end_time))
+        FROM public.pipeline_execution_log
+        WHERE status = 'success';
+    """)
+    last_success = cur.fetchone()[0]
+    if last_success is not None:
+        samples.append(("pipeline_last_success_timestamp_seconds", {}, last_success))
+    return samples
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(samples):
+    """Prometheus text exposition format (0.0.4), grouped by metric."""
+    by_metric = {}
+    for metric, labels, value in samples:
+        by_metric.setdefault(metric, []).append((labels, value))
+
+    lines = []
+    for metric in sorted(by_metric):
+        kind, help_text = METRICS.get(metric, ("untyped", metric))
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, value in sorted(by_metric[metric], key=lambda s: sorted(s[0].items())):
+            label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in sorted(labels.items()))
+            series = f"{metric}{{{label_text}}}" if label_text else metric
+            lines.append(f"{series} {float(value)!r}")
+    return "\n".join(lines) + "\n"
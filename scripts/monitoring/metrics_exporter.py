@@ -0,0 +1,72 @@
+import argparse
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+import yaml
+from scripts import db, metrics
+
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_SETTINGS = {
+    "host": "0.0.0.0",
+    "port": 9108
+}
+
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("metrics") or {})}
+
+def render_metrics():
+    conn = db.connect("metrics")
+    try:
+        with conn, conn.cursor() as cur:
+            return metrics.render_prometheus(metrics.latest_samples(cur))
+    finally:
+        db.release(conn)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render_metrics().encode()
+        except Exception as e:
+            self.send_error(503, f"Metrics store unavailable: {e}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape is noise
+
+def main(host=None, port=None):
+    settings = load_settings()
+    host = host or settings["host"]
+    port = port or settings["port"]
+    # Scrapes are served concurrently, one pooled connection each
+    db.open_shared_pool(4, "metrics")
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    print(f"📈 Serving pipeline metrics on http://{host}:{port}/metrics")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        db.close_shared_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve pipeline metrics in Prometheus text format.")
+    parser.add_argument("--host", help="Address to bind (metrics.host)")
+    parser.add_argument("--port", type=int, help="Port to listen on (metrics.port)")
+    args = parser.parse_args()
+    main(args.host, args.port)
@@ -1,28 +1,49 @@
 import json
 import logging
+import sys
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
 import psycopg2
-import statistics
+import yaml
+from scripts import db
+from scripts.transformation import query_cache
 
 # =============================
 # Configuration
 # =============================
-DB_CONFIG = {
-    "host": "postgres",          # Docker service name
-    "database": "ecommerce_db",
-    "user": "admin",
-    "password": "password",
-    "port": 5432
-}
-
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
 EXECUTION_REPORT = Path("data/processed/pipeline_execution_report.json")
+# Written by scripts/ingestion/stream_consumer.py while streaming mode runs
+STREAMING_METRICS = Path("data/processed/streaming_metrics.json")
+DEFAULT_LATENCY_SLO_SECONDS = 60
 MONITORING_REPORT = Path("data/processed/monitoring_report.json")
 LOG_FILE = Path("logs/monitoring.log")
 
 MONITORING_REPORT.parent.mkdir(parents=True, exist_ok=True)
 LOG_FILE.parent.mkdir(exist_ok=True)
 
+DEFAULT_SETTINGS = {
+    "workers": 4,
+    "statement_timeout_seconds": 30,
+    "time_budget_seconds": 60,
+    "anomaly_baseline_weeks": 8,
+    "anomaly_threshold": 3.5,
+    "anomaly_min_baseline_points": 3
+}
+
+# Scales a MAD to a standard deviation for normally distributed data
+MAD_TO_STDDEV = 1.4826
+# Floor of the spread as a fraction of the median, so a perfectly regular
+# baseline (MAD 0) does not flag every small change
+MIN_RELATIVE_SPREAD = 0.05
+
 # =============================
 # Logging
 # =============================
@@ -32,11 +53,144 @@ logging.basicConfig(
     format="%(asctime)s | %(levelname)s | %(message)s"
 )
 
+# =============================
+# Queries
+# =============================
+# Same-period baseline of a volume series: the target period and the same
+# period in each of the previous anomaly_baseline_weeks weeks (periods before
+# the first aggregated data are left out, missing ones count as zero). The
+# median and MAD of the baseline are computed in the database; {points}
+# yields (series, period, value) for every period.
+BASELINE_SQL = """
+    WITH periods AS (
+        SELECT p AS period
+        FROM generate_series(
+            {target} - INTERVAL '7 days' * %(anomaly_baseline_weeks)s, {target}, INTERVAL '7 days'
+        ) p
+        WHERE p >= ({first_period})
+    ),
+    points AS ({points}),
+    medians AS (
+        SELECT series, PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY value) AS median,
+               COUNT(*) AS baseline_points
+        FROM points
+        WHERE period < {target}
+        GROUP BY series
+    ),
+    spreads AS (
+        SELECT series, PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY ABS(value - median)) AS mad
+        FROM points
+        JOIN medians USING (series)
+        WHERE period < {target}
+        GROUP BY series
+    )
+    SELECT
+        {target},
+        COALESCE(JSON_AGG(JSON_BUILD_OBJECT(
+            'series', series, 'actual', value, 'median', median, 'mad', mad,
+            'baseline_points', baseline_points
+        ) ORDER BY series), '[]')
+    FROM points
+    JOIN medians USING (series)
+    JOIN spreads USING (series)
+    WHERE period = {target};
+"""
+
+# Line items, transactions and revenue per day, and line items per product
+# category, from the analytics aggregates the pipeline refreshes on every load
+DAILY_POINTS = """
+    SELECT v.series, d.period, v.value
+    FROM (
+        SELECT
+            p.period,
+            COALESCE(SUM(s.line_count), 0) AS line_count,
+            COALESCE(SUM(s.transaction_count), 0) AS transaction_count,
+            COALESCE(SUM(s.revenue), 0) AS revenue
+        FROM periods p
+        LEFT JOIN analytics.daily_sales s ON s.date_key = TO_CHAR(p.period, 'YYYYMMDD')::INT
+        GROUP BY p.period
+    ) d
+    CROSS JOIN LATERAL (VALUES
+        ('rows', d.line_count::NUMERIC),
+        ('transactions', d.transaction_count),
+        ('revenue', d.revenue)
+    ) v(series, value)
+    UNION ALL
+    SELECT 'rows[' || c.category || ']', p.period, COALESCE(SUM(s.line_count), 0)
+    FROM periods p
+    CROSS JOIN (SELECT DISTINCT COALESCE(category, 'unknown') AS category FROM analytics.daily_category_sales) c
+    LEFT JOIN analytics.daily_category_sales s
+        ON s.date_key = TO_CHAR(p.period, 'YYYYMMDD')::INT
+       AND COALESCE(s.category, 'unknown') = c.category
+    GROUP BY c.category, p.period
+"""
+
+# Line items and revenue per hour of sale
+HOURLY_POINTS = """
+    SELECT v.series, h.period, v.value
+    FROM (
+        SELECT p.period, COALESCE(SUM(s.line_count), 0) AS line_count, COALESCE(SUM(s.revenue), 0) AS revenue
+        FROM periods p
+        LEFT JOIN analytics.sales_by_hour s ON s.sale_hour = p.period
+        GROUP BY p.period
+    ) h
+    CROSS JOIN LATERAL (VALUES ('rows', h.line_count::NUMERIC), ('revenue', h.revenue)) v(series, value)
+"""
+
+# Checks that read the same table share one query: production.transactions
+# is scanned once, grouped by day, and freshness and quality are both
+# derived from the per-day aggregates. Volume is judged from the
+# incrementally maintained analytics aggregates instead of rescanning it.
+MONITOR_QUERIES = {
+    "production_transactions": {
+        "checks": ["data_freshness", "data_quality"],
+        "sql": """
+            SELECT
+                MAX(latest_created_at),
+                COALESCE(SUM(null_customers), 0)::BIGINT,
+                COALESCE(SUM(invalid_amounts), 0)::BIGINT
+            FROM (
+                SELECT
+                    transaction_date,
+                    MAX(created_at) AS latest_created_at,
+                    COUNT(*) FILTER (WHERE customer_id IS NULL) AS null_customers,
+                    COUNT(*) FILTER (WHERE total_amount <= 0) AS invalid_amounts
+                FROM production.transactions
+                GROUP BY transaction_date
+            ) daily;
+        """
+    },
+    # The last complete day against the same weekday of previous weeks
+    "daily_volume": {
+        "checks": ["volume_anomalies"],
+        "sql": BASELINE_SQL.format(
+            target="CURRENT_DATE - 1",
+            first_period="SELECT TO_DATE(MIN(date_key)::TEXT, 'YYYYMMDD') FROM analytics.daily_sales",
+            points=DAILY_POINTS
+        )
+    },
+    # The last complete hour against the same hour of the week in previous weeks
+    "hourly_volume": {
+        "checks": ["hourly_volume_anomalies"],
+        "sql": BASELINE_SQL.format(
+            target="DATE_TRUNC('hour', LOCALTIMESTAMP) - INTERVAL '1 hour'",
+            first_period="SELECT MIN(sale_hour) FROM analytics.sales_by_hour",
+            points=HOURLY_POINTS
+        )
+    },
+    "database": {
+        "checks": ["database_health"],
+        "sql": "SELECT 1;"
+    }
+}
+
 # =============================
 # Helpers
 # =============================
-def connect_db():
-    return psycopg2.connect(**DB_CONFIG)
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("monitoring") or {})}
 
 def load_pipeline_execution():
     if not EXECUTION_REPORT.exists():
@@ -44,6 +198,65 @@ def load_pipeline_execution():
     with open(EXECUTION_REPORT) as f:
         return json.load(f)
 
+def run_query(pool, name, sql, params, timeout_seconds, running):
+    """Run one monitor query under a statement timeout; returns (row, seconds)."""
+    conn = pool.getconn()
+    running[name] = conn
+    try:
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = %s;", (int(timeout_seconds * 1000),))
+            cur.execute(sql, params)
+            row = cur.fetchone()
+        return row, time.perf_counter() - start
+    finally:
+        running.pop(name, None)
+        # putconn rolls back the read-only transaction
+        pool.putconn(conn)
+
+def run_queries(settings):
+    """
+    Run every monitor query concurrently. Queries still running when the
+    time budget is spent are cancelled; each query's outcome is returned as
+    {"row": ..., "latency_ms": ...} or {"error": ..., "latency_ms": ...}.
+    """
+    workers = settings["workers"]
+    pool = db.open_pool(workers, "monitoring")
+    running = {}
+    results = {}
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    run_query, pool, name, spec["sql"], settings,
+                    spec.get("statement_timeout_seconds", settings["statement_timeout_seconds"]),
+                    running
+                ): name
+                for name, spec in MONITOR_QUERIES.items()
+            }
+            _, pending = wait(futures, timeout=settings["time_budget_seconds"])
+            for future in pending:
+                # Queued queries are dropped, running ones cancelled server-side
+                conn = running.get(futures[future])
+                if not future.cancel() and conn is not None:
+                    conn.cancel()
+
+            for future, name in futures.items():
+                try:
+                    row, seconds = future.result()
+                    results[name] = {"row": row, "latency_ms": round(seconds * 1000, 2)}
+                except (psycopg2.Error, CancelledError) as e:
+                    results[name] = {
+                        "error": "time budget exceeded" if future in pending else str(e).strip(),
+                        "latency_ms": round((time.perf_counter() - start) * 1000, 2)
+                    }
+    finally:
+        pool.closeall()
+
+    return results
+
 # =============================
 # Monitoring Checks
 # =============================
@@ -66,13 +279,8 @@ def check_last_execution(execution_report):
         "threshold_hours": 24
     }
 
-def check_data_freshness(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT MAX(created_at)
-        FROM production.transactions;
-    """)
-    latest = cur.fetchone()[0]
+def check_data_freshness(row, settings):
+    latest = row[0]
 
     if latest is None:
         return {"status": "critical", "message": "No production data found"}
@@ -88,43 +296,48 @@ def check_data_freshness(conn):
         "lag_hours": round(lag_hours, 2)
     }
 
-def check_volume_anomalies(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT transaction_date, COUNT(*)
-        FROM production.transactions
-        WHERE transaction_date >= CURRENT_DATE - INTERVAL '30 days'
-        GROUP BY transaction_date
-        ORDER BY transaction_date;
-    """)
-    rows = cur.fetchall()
+def score_series(series, settings):
+    """Robust z-score of a series' target value against its baseline median/MAD."""
+    threshold = settings["anomaly_threshold"]
+    median = series["median"]
+    spread = max(MAD_TO_STDDEV * series["mad"], MIN_RELATIVE_SPREAD * abs(median), 1)
+    z_score = (series["actual"] - median) / spread
+    scored = series["baseline_points"] >= settings["anomaly_min_baseline_points"]
 
-    if len(rows) < 2:
-        return {"status": "ok", "message": "Not enough data for anomaly detection"}
+    return {
+        "actual": series["actual"],
+        "median": round(median, 2),
+        "expected_range": [round(max(0, median - threshold * spread), 2), round(median + threshold * spread, 2)],
+        "z_score": round(z_score, 2),
+        "baseline_points": series["baseline_points"],
+        "anomaly": scored and abs(z_score) > threshold
+    }
 
-    counts = [r[1] for r in rows]
-    mean = statistics.mean(counts)
-    std = statistics.stdev(counts)
+def check_volume_anomalies(row, settings):
+    period, baselines = row
+    series = {s["series"]: score_series(s, settings) for s in baselines}
+    anomalies = sorted(name for name, result in series.items() if result["anomaly"])
 
-    today_count = counts[-1]
-    anomaly = today_count > mean + 3*std or today_count < mean - 3*std
+    if not any(s["baseline_points"] >= settings["anomaly_min_baseline_points"] for s in series.values()):
+        return {
+            "status": "ok",
+            "period": period.isoformat(),
+            "message": "Not enough data for anomaly detection"
+        }
 
     return {
-        "status": "anomaly_detected" if anomaly else "ok",
-        "expected_range": f"{int(mean - 3*std)} - {int(mean + 3*std)}",
-        "actual_count": today_count,
-        "anomaly": anomaly
+        "status": "anomaly_detected" if anomalies else "ok",
+        "period": period.isoformat(),
+        "model": "same-period median/MAD",
+        "baseline_weeks": settings["anomaly_baseline_weeks"],
+        "threshold": settings["anomaly_threshold"],
+        "anomaly": bool(anomalies),
+        "anomalies": anomalies,
+        "series": series
     }
 
-def check_data_quality(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT
-            COUNT(*) FILTER (WHERE customer_id IS NULL),
-            COUNT(*) FILTER (WHERE total_amount <= 0)
-        FROM production.transactions;
-    """)
-    null_customers, invalid_amounts = cur.fetchone()
+def check_data_quality(row, settings):
+    null_customers, invalid_amounts = row[1], row[2]
 
     violations = null_customers + invalid_amounts
     score = max(0, 100 - violations)
@@ -137,22 +350,79 @@ def check_data_quality(conn):
         "total_violations": violations
     }
 
-def check_database_health(conn):
-    cur = conn.cursor()
-    cur.execute("SELECT 1;")
+def check_streaming_latency():
+    if not STREAMING_METRICS.exists():
+        return {"status": "ok", "message": "Streaming mode has not run"}
+
+    with open(STREAMING_METRICS) as f:
+        metrics = json.load(f)
+    with open(CONFIG_PATH) as f:
+        streaming = yaml.safe_load(f).get("streaming") or {}
+    slo = streaming.get("latency_slo_seconds", DEFAULT_LATENCY_SLO_SECONDS)
+    latency = metrics["latency_seconds"]
+
+    return {
+        "status": "ok" if latency["p95"] <= slo else "warning",
+        "p50_seconds": latency["p50"],
+        "p95_seconds": latency["p95"],
+        "p99_seconds": latency["p99"],
+        "slo_seconds": slo,
+        "batches_processed": metrics["batches_processed"],
+        "last_merge_at": metrics["last_merge"]["merged_at"]
+    }
+
+def check_query_cache():
+    stats = query_cache.cache_stats()
+    if stats is None:
+        return {"status": "ok", "message": "Query cache has not been used"}
+    return {"status": "ok", **stats}
+
+def check_database_health(row, settings):
     return {
         "status": "ok",
         "connectivity": "successful"
     }
 
+QUERY_CHECKS = {
+    "data_freshness": check_data_freshness,
+    "volume_anomalies": check_volume_anomalies,
+    "hourly_volume_anomalies": check_volume_anomalies,
+    "data_quality": check_data_quality,
+    "database_health": check_database_health
+}
+
+def evaluate_query_checks(results, settings):
+    """
+    Turn query results into check results. A check's latency is that of
+    the query it shares; a failed or cancelled query fails its checks.
+    """
+    checks = {}
+    for name, spec in MONITOR_QUERIES.items():
+        result = results[name]
+        for check in spec["checks"]:
+            if "error" in result:
+                # Without an answer from the database nothing else can be trusted
+                status = "critical" if check == "database_health" else "warning"
+                checks[check] = {"status": status, "message": result["error"]}
+            else:
+                checks[check] = QUERY_CHECKS[check](result["row"], settings)
+            checks[check]["query"] = name
+            checks[check]["latency_ms"] = result["latency_ms"]
+    return checks
+
+def timed(check, *args):
+    start = time.perf_counter()
+    result = check(*args)
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
 # =============================
 # Main
 # =============================
 def main():
     logging.info("Monitoring started")
-
-    execution_report = load_pipeline_execution()
-    conn = connect_db()
+    settings = load_settings()
+    start = time.perf_counter()
 
     report = {
         "monitoring_timestamp": datetime.now(timezone.utc).isoformat(),
@@ -160,11 +430,11 @@ def main():
         "checks": {}
     }
 
-    report["checks"]["last_execution"] = check_last_execution(execution_report)
-    report["checks"]["data_freshness"] = check_data_freshness(conn)
-    report["checks"]["volume_anomalies"] = check_volume_anomalies(conn)
-    report["checks"]["data_quality"] = check_data_quality(conn)
-    report["checks"]["database_health"] = check_database_health(conn)
+    results = run_queries(settings)
+    report["checks"]["last_execution"] = timed(check_last_execution, load_pipeline_execution())
+    report["checks"].update(evaluate_query_checks(results, settings))
+    report["checks"]["streaming_latency"] = timed(check_streaming_latency)
+    report["checks"]["query_cache"] = timed(check_query_cache)
 
     if any(c["status"] in ["critical", "anomaly_detected"]
            for c in report["checks"].values()):
@@ -172,6 +442,17 @@ def main():
     elif any(c["status"] == "warning" for c in report["checks"].values()):
         report["pipeline_health"] = "degraded"
 
+    report["queries"] = {
+        name: {
+            "checks": MONITOR_QUERIES[name]["checks"],
+            "latency_ms": result["latency_ms"],
+            "status": "error" if "error" in result else "ok"
+        }
+        for name, result in results.items()
+    }
+    report["time_budget_seconds"] = settings["time_budget_seconds"]
+    report["total_duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
     with open(MONITORING_REPORT, "w") as f:
         json.dump(report, f, indent=4)
 
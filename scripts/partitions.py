@@ -0,0 +1,89 @@
+import re
+from datetime import date
+
+# Monthly range partitions are named <table>_pYYYYMM; rows whose key is NULL
+# land in <table>_default.
+PARTITION_PATTERN = re.compile(r"_p(\d{4})(\d{2})$")
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+def bound_literal(month, key_type):
+    """Partition bound for a month: a DATE, or an integer YYYYMMDD date_key."""
+    if key_type == "date_key":
+        return str(int(f"{month:%Y%m%d}"))
+    return f"'{month.isoformat()}'"
+
+def months_in(cur, query, params=None):
+    """Distinct months of the dates returned by a single-column query."""
+    cur.execute(
+        f"SELECT DISTINCT date_trunc('month', d)::date FROM ({query}) q(d) WHERE d IS NOT NULL;",
+        params
+    )
+    return {row[0] for row in cur.fetchall()}
+
+def ensure_month_partitions(cur, schema, table, months, key_type="date"):
+    """Create the missing monthly partitions (and the default one) of a table."""
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS {schema}.{table}_default "
+        f"PARTITION OF {schema}.{table} DEFAULT;"
+    )
+    for month in sorted(months):
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {schema}.{partition_name(table, month)} "
+            f"PARTITION OF {schema}.{table} "
+            f"FOR VALUES FROM ({bound_literal(month, key_type)}) "
+            f"TO ({bound_literal(next_month(month), key_type)});"
+        )
+
+def list_month_partitions(cur, schema, table):
+    """Return [(partition, month)] for the attached monthly partitions, oldest first."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = %s AND p.relname = %s;
+    """, (schema, table))
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_PATTERN.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+def detach_partitions_before(cur, schema, table, cutoff):
+    """
+    Detach the monthly partitions that end on or before cutoff's month. The
+    detached tables keep their data as <partition>_detached until dropped.
+    """
+    detached = []
+    for name, month in list_month_partitions(cur, schema, table):
+        if month >= month_start(cutoff):
+            break
+        cur.execute(f"ALTER TABLE {schema}.{table} DETACH PARTITION {schema}.{name};")
+        cur.execute(f"DROP TABLE IF EXISTS {schema}.{name}_detached;")
+        cur.execute(f"ALTER TABLE {schema}.{name} RENAME TO {name}_detached;")
+        detached.append(name)
+    return detached
+
+def drop_partitions_before(cur, schema, table, cutoff):
+    """
+    Drop whole monthly partitions older than cutoff's month (no row
+    deletes); returns [(partition, month)] of those dropped.
+    """
+    dropped = []
+    for name, month in list_month_partitions(cur, schema, table):
+        if month >= month_start(cutoff):
+            break
+        cur.execute(f"ALTER TABLE {schema}.{table} DETACH PARTITION {schema}.{name};")
+        cur.execute(f"DROP TABLE {schema}.{name};")
+        dropped.append((name, month))
+    return dropped
@@ -1,16 +1,35 @@
+import argparse
+import fcntl
+import importlib
+import resource
+import signal
 import subprocess
+import sys
 import time
 import json
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 import os
 
+# Ensure project root is on PYTHONPATH (in-process steps import scripts.*)
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+import yaml
+from scripts import db, metrics, step_cache
+
 # -----------------------------
 # Paths
 # -----------------------------
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
 LOG_DIR = Path("logs")
 REPORT_PATH = Path("data/processed/pipeline_execution_report.json")
+# Per-execution progress, kept until the run succeeds so it can be resumed
+CHECKPOINT_DIR = Path("data/processed/pipeline_checkpoints")
+# flock()ed for the whole run; the kernel releases it if the process dies
+LOCK_FILE = LOG_DIR / "pipeline.lock"
 
 LOG_DIR.mkdir(exist_ok=True)
 REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -44,28 +63,237 @@ env = os.environ.copy()
 env["PYTHONPATH"] = "/app"
 
 # -----------------------------
-# ✅ FINAL CORRECT PIPELINE ORDER
+# Pipeline DAG
 # -----------------------------
+# Each step declares the resources (schemas, files, directories) it reads and
+# writes. A step depends on every earlier step it conflicts with, so the list
+# order only matters between steps that touch the same resource; the others
+# run concurrently. "entry" is the function called in in-process mode;
+# "code" (files besides the script) and "config" (keys of config.yaml) are
+# what, besides the inputs, invalidates the step's cached result.
 PIPELINE_STEPS = [
-    ("Data Generation", ["python", "scripts/data_generation/generate_data.py"]),
-    ("Data Ingestion", ["python", "scripts/ingestion/ingest_to_staging.py"]),
-    ("Staging to Production", ["python", "scripts/transformation/staging_to_production.py"]),
-    ("Warehouse Load", ["python", "scripts/transformation/load_warehouse.py"]),
-    ("Data Quality Checks", ["python", "scripts/quality_checks/validate_data.py"]),
-    ("Analytics Generation", ["python", "scripts/transformation/generate_analytics.py"]),
+    {
+        "name": "Data Generation",
+        "command": ["python", "scripts/data_generation/generate_data.py"],
+        "entry": "scripts.data_generation.generate_data:main",
+        "code": ["scripts/raw_storage.py"],
+        "config": ["data_generation", "storage", "pipeline.batch_size"],
+        "inputs": [],
+        "outputs": ["data/raw"]
+    },
+    {
+        "name": "Data Ingestion",
+        "command": ["python", "scripts/ingestion/ingest_to_staging.py"],
+        "entry": "scripts.ingestion.ingest_to_staging:main",
+        "code": ["scripts/raw_storage.py", "scripts/watermarks.py", "sql/ddl/create_staging_schema.sql"],
+        "config": ["ingestion", "storage", "pipeline.load_mode"],
+        "inputs": ["data/raw", "data/landing"],
+        "outputs": ["staging"]
+    },
+    {
+        # Quality gate: staging is validated before anything is promoted
+        "name": "Data Quality Checks",
+        "command": ["python", "scripts/quality_checks/validate_data.py"],
+        "entry": "scripts.quality_checks.validate_data:main",
+        "code": [],
+        "config": ["quality"],
+        "inputs": ["staging"],
+        "outputs": ["data/processed/data_quality_report.json"]
+    },
+    {
+        "name": "Staging to Production",
+        "command": ["python", "scripts/transformation/staging_to_production.py"],
+        "entry": "scripts.transformation.staging_to_production:transform",
+        "code": ["scripts/partitions.py", "scripts/watermarks.py"],
+        "config": ["pipeline.load_mode"],
+        "inputs": ["staging", "data/processed/data_quality_report.json"],
+        "outputs": ["production"]
+    },
+    {
+        "name": "Warehouse Load",
+        "command": ["python", "scripts/transformation/load_warehouse.py"],
+        "entry": "scripts.transformation.load_warehouse:load",
+        "code": ["scripts/partitions.py", "scripts/watermarks.py", "sql/ddl/create_warehouse_schema.sql"],
+        "config": ["pipeline.load_mode"],
+        "inputs": ["production"],
+        "outputs": ["warehouse"]
+    },
+    {
+        "name": "Analytics Generation",
+        "command": ["python", "scripts/transformation/generate_analytics.py"],
+        "entry": "scripts.transformation.generate_analytics:main",
+        "code": ["scripts/watermarks.py", "sql/ddl/create_analytics_schema.sql"],
+        "config": ["pipeline.load_mode"],
+        "inputs": ["warehouse"],
+        "outputs": ["analytics", "data/processed_analytics"]
+    },
 ]
 
+# Steps that load incrementally by default and accept --full-refresh
+FULL_REFRESH_STEPS = {"Data Ingestion", "Staging to Production", "Warehouse Load", "Analytics Generation"}
+
+# Exit code of a step that refused to let the pipeline continue (a failed
+# quality gate); rerunning it would give the same answer, so it is not retried
+BLOCKED_EXIT_CODE = 2
+
+# Exit code of the orchestrator when another run holds the pipeline lock
+LOCKED_EXIT_CODE = 3
+
+EXECUTION_MODES = ["subprocess", "in_process"]
+
+# How often a running step is polled, and how long a timed-out step's
+# process group gets between SIGTERM and SIGKILL
+POLL_SECONDS = 0.1
+KILL_GRACE_SECONDS = 10
+
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    pipeline = config.get("pipeline", {})
+    return {
+        "execution": pipeline.get("execution", "subprocess"),
+        "max_parallel_steps": pipeline.get("max_parallel_steps", 2),
+        "retry_attempts": pipeline.get("retry_attempts", 3),
+        "timeout_seconds": pipeline.get("timeout_seconds"),
+        "step_timeout_seconds": pipeline.get("step_timeout_seconds") or {}
+    }
+
+def step_timeout(settings, step_name):
+    return settings["step_timeout_seconds"].get(step_name, settings["timeout_seconds"])
+
+def statement_timeout_options(timeout):
+    """PGOPTIONS that stop a step's statements server-side once its time is up."""
+    options = os.environ.get("PGOPTIONS", "")
+    if timeout:
+        options = f"{options} -c statement_timeout={int(timeout * 1000)}".strip()
+    return options
+
+def build_dependencies(steps):
+    """Map each step to the earlier steps that read what it writes or write what it touches."""
+    dependencies = {}
+    for i, step in enumerate(steps):
+        reads, writes = set(step["inputs"]), set(step["outputs"])
+        dependencies[step["name"]] = [
+            earlier["name"] for earlier in steps[:i]
+            if set(earlier["outputs"]) & (reads | writes) or set(earlier["inputs"]) & writes
+        ]
+    return dependencies
+
+# -----------------------------
+# Step actions
+# -----------------------------
+def resource_usage(usage, io=None, scope="step"):
+    """Peak RSS, CPU and storage I/O from a struct_rusage (I/O from /proc when given)."""
+    io = io or {"read_bytes": usage.ru_inblock * 512, "write_bytes": usage.ru_oublock * 512}
+    return {
+        "scope": scope,
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "cpu_user_seconds": round(usage.ru_utime, 2),
+        "cpu_system_seconds": round(usage.ru_stime, 2),
+        "io_read_bytes": io["read_bytes"],
+        "io_write_bytes": io["write_bytes"]
+    }
+
+def proc_io():
+    path = Path("/proc/self/io")
+    if not path.exists():
+        return {"read_bytes": 0, "write_bytes": 0}
+    fields = dict(line.split(": ") for line in path.read_text().splitlines())
+    return {"read_bytes": int(fields["read_bytes"]), "write_bytes": int(fields["write_bytes"])}
+
+def stop_process_group(pid):
+    """SIGTERM a step's process group, SIGKILL what is left after the grace period; return its rusage."""
+    os.killpg(pid, signal.SIGTERM)
+    deadline = time.time() + KILL_GRACE_SECONDS
+    reaped, _, usage = os.wait4(pid, os.WNOHANG)
+    while not reaped and time.time() < deadline:
+        time.sleep(POLL_SECONDS)
+        reaped, _, usage = os.wait4(pid, os.WNOHANG)
+    try:
+        # Also reaches workers that outlived the step's main process
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    if not reaped:
+        _, _, usage = os.wait4(pid, 0)
+    return usage
+
+def run_process(command, timeout, process_env):
+    """
+    Run a step as the leader of its own process group and return its resource
+    usage. Past the timeout the whole group is stopped, so a hung COPY or lock
+    wait cannot hold up the pipeline.
+    """
+    start = time.time()
+    process = subprocess.Popen(command, env=process_env, start_new_session=True)
+    pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+    while not pid:
+        if timeout and time.time() - start > timeout:
+            usage = stop_process_group(process.pid)
+            process.returncode = -signal.SIGKILL
+            error = subprocess.TimeoutExpired(command, timeout)
+            error.resources = resource_usage(usage)
+            raise error
+        time.sleep(POLL_SECONDS)
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        error = subprocess.CalledProcessError(process.returncode, command)
+        error.resources = resource_usage(usage)
+        raise error
+    return resource_usage(usage)
+
+def subprocess_action(step, full_refresh, timeout=None):
+    command = step["command"]
+    if full_refresh and step["name"] in FULL_REFRESH_STEPS:
+        command = command + ["--full-refresh"]
+    step_env = dict(env, PGOPTIONS=statement_timeout_options(timeout))
+    return lambda: run_process(command, timeout, step_env)
+
+def in_process_action(step, full_refresh):
+    """
+    Call the step's entry function in this interpreter (imports and pool are
+    shared). Its resource usage is the process's over the step, so it includes
+    whatever ran alongside it.
+    """
+    module_name, function_name = step["entry"].split(":")
+    args = (full_refresh,) if step["name"] in FULL_REFRESH_STEPS else ()
+
+    def action():
+        function = getattr(importlib.import_module(module_name), function_name)
+        before, io_before = resource.getrusage(resource.RUSAGE_SELF), proc_io()
+        try:
+            function(*args)
+        except SystemExit as e:
+            # Same outcome as the script exiting with this code
+            if e.code not in (None, 0):
+                raise subprocess.CalledProcessError(e.code, step["entry"]) from e
+
+        after, io_after = resource.getrusage(resource.RUSAGE_SELF), proc_io()
+        usage = resource_usage(after, {k: io_after[k] - io_before[k] for k in io_after}, scope="process")
+        usage["cpu_user_seconds"] = round(after.ru_utime - before.ru_utime, 2)
+        usage["cpu_system_seconds"] = round(after.ru_stime - before.ru_stime, 2)
+        return usage
+
+    return action
+
+def is_retryable(error):
+    """Transient failures: a script exiting with db.RETRYABLE_EXIT_CODE, or such an exception in-process."""
+    return getattr(error, "returncode", None) == db.RETRYABLE_EXIT_CODE or db.is_retryable(error)
+
 # -----------------------------
 # Helper: execute step with retry
 # -----------------------------
-def run_step(step_name, command, max_retries=3):
+def run_step(step_name, action, max_retries=3):
+    """Run a step's action, retrying transient failures only; resources are those of the last attempt."""
     attempts = 0
     start_time = time.time()
 
-    while attempts < max_retries:
+    while True:
         try:
             logging.info(f"Starting step: {step_name}")
-            subprocess.run(command, check=True, env=env)
+            resources = action()
 
             duration = round(time.time() - start_time, 2)
             logging.info(f"Completed step: {step_name} in {duration}s")
@@ -73,48 +301,311 @@ def run_step(step_name, command, max_retries=3):
             return {
                 "status": "success",
                 "duration_seconds": duration,
-                "retry_attempts": attempts
+                "retry_attempts": attempts,
+                "resources": resources
             }
 
-        except subprocess.CalledProcessError as e:
+        except Exception as e:
+            failure = {
+                "duration_seconds": round(time.time() - start_time, 2),
+                "retry_attempts": attempts,
+                "resources": getattr(e, "resources", None),
+                "error_message": str(e)
+            }
+
+            if isinstance(e, subprocess.TimeoutExpired):
+                error_logger.error(f"{step_name} timed out after {e.timeout}s; process group killed")
+                return {"status": "timeout", **failure}
+
+            if getattr(e, "returncode", None) == BLOCKED_EXIT_CODE:
+                logging.error(f"{step_name} blocked the pipeline")
+                return {"status": "blocked", **failure}
+
             attempts += 1
             error_logger.error(
                 f"{step_name} failed (attempt {attempts})",
                 exc_info=True
             )
 
-            if attempts >= max_retries:
+            if not is_retryable(e) or attempts >= max_retries:
                 return {
                     "status": "failed",
-                    "duration_seconds": round(time.time() - start_time, 2),
+                    **failure,
                     "retry_attempts": attempts,
-                    "error_message": str(e)
+                    "retryable": is_retryable(e)
                 }
 
             time.sleep(2 ** (attempts - 1))
 
+# -----------------------------
+# Step cache
+# -----------------------------
+def step_key(step, digests):
+    """Key of the step's inputs and code, taken before the step runs."""
+    code = [step["command"][1]] + step["code"]
+    conn = db.connect("orchestrator")
+    try:
+        with conn.cursor() as cur:
+            key = step_cache.digest([
+                step_cache.fingerprint_resources(cur, step["inputs"], digests),
+                step_cache.code_fingerprint(code, step["config"], digests)
+            ])
+        conn.commit()
+    finally:
+        db.release(conn)
+    return key
+
+def output_fingerprint(step, digests):
+    # Schema outputs are also rewritten by later steps (retention, consumed
+    # change logs), so only files are checked for having been touched since
+    return step_cache.fingerprint_resources(
+        None, [o for o in step["outputs"] if "/" in o], digests
+    )
+
+def execute_step(step, run, run_state, use_cache):
+    """Run a step, or skip it when its fingerprint matches its last successful run."""
+    if not step.get("cache", True):
+        return dict(run(step), cache="disabled")
+
+    # Keyed on the inputs as the step found them: whatever changes them while
+    # it runs (a concurrent load) must make the next run miss
+    start = time.time()
+    key = step_key(step, run_state["file_digests"])
+    if not use_cache:
+        result = dict(run(step), cache="forced")
+    else:
+        last = run_state["steps"].get(step["name"])
+        if last and last["key"] == key and last["outputs"] == output_fingerprint(step, run_state["file_digests"]):
+            logging.info(f"Skipping step: {step['name']} (inputs unchanged since {last['completed_at']})")
+            return {
+                "status": "cached",
+                "cache": "hit",
+                "duration_seconds": round(time.time() - start, 2),
+                "time_saved_seconds": last["duration_seconds"]
+            }
+        result = dict(run(step), cache="miss")
+
+    if result["status"] == "success":
+        run_state["steps"][step["name"]] = {
+            "key": key,
+            "outputs": output_fingerprint(step, run_state["file_digests"]),
+            "duration_seconds": result["duration_seconds"],
+            "completed_at": datetime.now().isoformat()
+        }
+    return result
+
+def cache_summary(steps_executed):
+    cache = [r.get("cache") for r in steps_executed.values()]
+    return {
+        "hits": cache.count("hit"),
+        "misses": cache.count("miss") + cache.count("forced"),
+        "time_saved_seconds": round(sum(
+            r.get("time_saved_seconds", 0) for r in steps_executed.values()
+        ), 2)
+    }
+
+# -----------------------------
+# DAG execution
+# -----------------------------
+def run_dag(steps, execute, max_workers, on_complete=None, completed=None):
+    """
+    Run every step once its dependencies succeeded, up to max_workers at a
+    time. Steps in completed (a resumed run) are taken as already done.
+    """
+    dependencies = build_dependencies(steps)
+    results = dict(completed or {})
+    pending = [step for step in steps if step["name"] not in results]
+    running = {}
+    dag_start = time.time()
+
+    def timed(step):
+        start_offset = round(time.time() - dag_start, 2)
+        result = execute(step)
+        result["start_offset_seconds"] = start_offset
+        result["end_offset_seconds"] = round(time.time() - dag_start, 2)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Dependencies always come earlier in the list, so a skip
+            # propagates to its dependents within the same pass
+            for step in list(pending):
+                upstream = [results.get(d, {}).get("status") for d in dependencies[step["name"]]]
+                if any(status not in (None, "success", "cached") for status in upstream):
+                    pending.remove(step)
+                    results[step["name"]] = {"status": "skipped"}
+                    logging.warning(f"Skipping step: {step['name']} (upstream did not succeed)")
+                elif all(status in ("success", "cached") for status in upstream):
+                    pending.remove(step)
+                    running[executor.submit(timed, step)] = step["name"]
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                if on_complete:
+                    on_complete(name, results[name])
+
+    for name, result in results.items():
+        result["depends_on"] = dependencies[name]
+    return {step["name"]: results[step["name"]] for step in steps}
+
+def critical_path(steps_executed):
+    """Longest chain of dependent steps by duration: the floor on wall time."""
+    finish, previous = {}, {}
+    for name, result in steps_executed.items():
+        if "duration_seconds" not in result:
+            continue
+        upstream = [d for d in result["depends_on"] if d in finish]
+        previous[name] = max(upstream, key=finish.get, default=None)
+        finish[name] = result["duration_seconds"] + (finish[previous[name]] if previous[name] else 0)
+
+    if not finish:
+        return {"steps": [], "duration_seconds": 0}
+    name = max(finish, key=finish.get)
+    path = []
+    while name:
+        path.insert(0, name)
+        name = previous[name]
+    return {"steps": path, "duration_seconds": round(finish[path[-1]], 2)}
+
+# -----------------------------
+# Checkpoints
+# -----------------------------
+def checkpoint_path(execution_id):
+    return CHECKPOINT_DIR / f"{execution_id}.json"
+
+def save_checkpoint(report):
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(checkpoint_path(report["pipeline_execution_id"]), "w") as f:
+        json.dump(report, f, indent=4)
+
+def load_checkpoint(execution_id):
+    """The checkpoint of an unfinished execution ("latest": the most recent one)."""
+    if execution_id == "latest":
+        paths = sorted(CHECKPOINT_DIR.glob("PIPE_*.json"))
+        path = paths[-1] if paths else None
+    else:
+        path = checkpoint_path(execution_id)
+    if path is None or not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+# -----------------------------
+# Pipeline lock
+# -----------------------------
+def acquire_pipeline_lock(wait=False):
+    """flock() the lock file; returns the open handle, or None if another run holds it."""
+    handle = open(LOCK_FILE, "a+")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    handle.truncate(0)
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
 # -----------------------------
 # Main execution
 # -----------------------------
-def main():
+def run_pipeline(full_refresh=False, execution=None, force=(), resume=None, steps=None):
+    settings = load_settings()
+    execution = execution or settings["execution"]
+    max_workers = settings["max_parallel_steps"]
     execution_id = f"PIPE_{timestamp}"
     start_time = datetime.now().isoformat()
 
+    # Resuming keeps the execution id and options; steps that completed in
+    # it are not run again (Data Generation would wipe data/raw)
+    completed = {}
+    if resume:
+        checkpoint = load_checkpoint(resume)
+        if checkpoint is None:
+            logging.error(f"No unfinished execution to resume: {resume}")
+            return None
+        execution_id = checkpoint["pipeline_execution_id"]
+        full_refresh = checkpoint["full_refresh"]
+        steps = checkpoint.get("selected_steps")
+        completed = {
+            name: dict(result, resumed=True)
+            for name, result in checkpoint["steps_executed"].items()
+            if result["status"] in ("success", "cached")
+        }
+        logging.info(f"Resuming {execution_id}: {len(completed)} step(s) already completed")
+
+    # A subset of steps (e.g. a micro-batch without Data Generation) is a
+    # smaller DAG over the same declarations
+    pipeline_steps = [step for step in PIPELINE_STEPS if not steps or step["name"] in steps]
+
     report = {
         "pipeline_execution_id": execution_id,
         "start_time": start_time,
         "status": "success",
-        "steps_executed": {}
+        "full_refresh": full_refresh,
+        "execution_mode": execution,
+        "max_parallel_steps": max_workers,
+        "forced_steps": sorted(force),
+        "selected_steps": [step["name"] for step in pipeline_steps],
+        "resumed": bool(resume),
+        "steps_executed": dict(completed)
     }
+    save_checkpoint(report)
 
-    for step_name, command in PIPELINE_STEPS:
-        result = run_step(step_name, command)
-        report["steps_executed"][step_name] = result
+    # Put back after the run: PGOPTIONS is process-wide
+    previous_pgoptions = os.environ.get("PGOPTIONS")
+    if execution == "in_process":
+        # Steps run as threads of this process and borrow from one pool. A
+        # thread cannot be killed, so the longest step timeout only bounds
+        # each statement (every connection of the process picks it up)
+        timeouts = [step_timeout(settings, step["name"]) for step in pipeline_steps]
+        os.environ["PGOPTIONS"] = statement_timeout_options(max(t or 0 for t in timeouts))
+        db.open_shared_pool(max_workers)
+        make_action = lambda step: in_process_action(step, full_refresh)
+    else:
+        make_action = lambda step: subprocess_action(
+            step, full_refresh, step_timeout(settings, step["name"])
+        )
 
-        if result["status"] == "failed":
-            report["status"] = "failed"
+    def run(step):
+        return run_step(step["name"], make_action(step), settings["retry_attempts"])
+
+    run_state = step_cache.load_run_state()
+
+    def execute(step):
+        # A full refresh rebuilds regardless of what the cache says
+        use_cache = not (
+            "all" in force or step["name"] in force
+            or (full_refresh and step["name"] in FULL_REFRESH_STEPS)
+        )
+        return execute_step(step, run, run_state, use_cache)
+
+    def on_complete(name, result):
+        if result["status"] == "success":
+            step_cache.save_run_state(run_state)
+        report["steps_executed"][name] = result
+        save_checkpoint(report)
+
+    try:
+        report["steps_executed"] = run_dag(pipeline_steps, execute, max_workers, on_complete, completed)
+    finally:
+        db.close_shared_pool()
+        if previous_pgoptions is None:
+            os.environ.pop("PGOPTIONS", None)
+        else:
+            os.environ["PGOPTIONS"] = previous_pgoptions
+
+    for result in report["steps_executed"].values():
+        if result["status"] in ("failed", "blocked", "timeout"):
+            report["status"] = result["status"]
             break
 
+    report["cache"] = cache_summary(report["steps_executed"])
+    report["critical_path"] = critical_path(report["steps_executed"])
     report["end_time"] = datetime.now().isoformat()
     report["total_duration_seconds"] = round(
         (datetime.fromisoformat(report["end_time"]) -
@@ -124,8 +615,54 @@ def main():
     with open(REPORT_PATH, "w") as f:
         json.dump(report, f, indent=4)
 
+    # Kept across runs (the report above is overwritten); a metrics store
+    # that is down must not fail an otherwise good run
+    try:
+        samples = metrics.record_run(report)
+        logging.info(f"Recorded {samples} metric samples for {execution_id}")
+    except Exception as e:
+        logging.warning(f"Could not record run metrics: {e}")
+
+    if report["status"] == "success":
+        checkpoint_path(execution_id).unlink(missing_ok=True)
+    else:
+        save_checkpoint(report)
+        logging.info(f"Resume with: --resume {execution_id}")
+
     logging.info("Pipeline execution finished")
     logging.info(f"Execution report saved to {REPORT_PATH}")
+    return report
+
+def main(full_refresh=False, execution=None, force=(), resume=None, steps=None, wait_lock=False):
+    """Run the pipeline under the pipeline lock; returns the process exit code."""
+    if wait_lock:
+        logging.info("Waiting for the pipeline lock")
+    lock = acquire_pipeline_lock(wait_lock)
+    if lock is None:
+        logging.error(f"Another pipeline run holds {LOCK_FILE}")
+        return LOCKED_EXIT_CODE
+
+    try:
+        report = run_pipeline(full_refresh, execution, force, resume, steps)
+    finally:
+        lock.close()
+    return 0 if report and report["status"] == "success" else 1
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the e-commerce ETL pipeline.")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Rebuild staging, production and warehouse instead of loading deltas")
+    parser.add_argument("--execution", choices=EXECUTION_MODES,
+                        help="Run steps as subprocesses or in this interpreter (default: pipeline.execution)")
+    parser.add_argument("--force", action="append", nargs="?", const="all", default=[],
+                        choices=["all"] + [step["name"] for step in PIPELINE_STEPS], metavar="STEP",
+                        help="Rerun STEP even if its inputs are unchanged (repeatable; no value: every step)")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="EXECUTION_ID",
+                        help="Continue an unfinished execution from its first failed step (default: the latest)")
+    parser.add_argument("--steps", nargs="+", choices=[step["name"] for step in PIPELINE_STEPS],
+                        metavar="STEP", help="Run only these steps (default: all)")
+    parser.add_argument("--wait-lock", action="store_true",
+                        help="Wait for a running pipeline to finish instead of exiting")
+    args = parser.parse_args()
+    sys.exit(main(args.full_refresh, args.execution, set(args.force), args.resume,
+                  args.steps, args.wait_lock))
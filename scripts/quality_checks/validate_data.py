@@ -1,31 +1,197 @@
 import json
-from sqlalchemy import create_engine, text
-import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_URL = f"postgresql://admin:password@{DB_HOST}:5432/ecommerce_db"
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
 
+import yaml
+from scripts import db
+
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
 REPORT_PATH = Path("data/processed/data_quality_report.json")
 REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-def main():
-    engine = create_engine(DB_URL)
+DEFAULT_SETTINGS = {
+    "gate": True,
+    "min_score": 95,
+    "workers": 4,
+    "sample_above_rows": 5_000_000,
+    "sample_percent": 10
+}
+
+# Exit code telling the orchestrator that promotion was refused (not retried)
+GATE_FAILED_EXIT_CODE = 2
+
+# The checks of sql/queries/data_quality_checks.sql, merged per table: each
+# table is read once and every check is a COUNT(*) FILTER (or a distinct
+# count) over that scan. Orphan checks are anti-joins against the distinct
+# parent keys, so the joins never multiply rows.
+TABLE_CHECKS = {
+    "customers": {
+        "alias": "c",
+        "joins": "",
+        "checks": {
+            "null_customer_id": "COUNT(*) FILTER (WHERE c.customer_id IS NULL)",
+            "null_email": "COUNT(*) FILTER (WHERE c.email IS NULL)",
+            "duplicate_customer_id": "COUNT(c.customer_id) - COUNT(DISTINCT c.customer_id)",
+            "duplicate_email": "COUNT(c.email) - COUNT(DISTINCT c.email)"
+        }
+    },
+    "products": {
+        "alias": "p",
+        "joins": "",
+        "checks": {
+            "null_product_id": "COUNT(*) FILTER (WHERE p.product_id IS NULL)",
+            "invalid_price": "COUNT(*) FILTER (WHERE p.price IS NULL OR p.price <= 0)",
+            "duplicate_product_id": "COUNT(p.product_id) - COUNT(DISTINCT p.product_id)"
+        }
+    },
+    "transactions": {
+        "alias": "t",
+        "joins": """
+            LEFT JOIN (SELECT DISTINCT customer_id FROM staging.customers) c
+                ON c.customer_id = t.customer_id
+            LEFT JOIN (
+                SELECT transaction_id, SUM(line_total) AS items_total
+                FROM staging.transaction_items
+                GROUP BY transaction_id
+            ) i ON i.transaction_id = t.transaction_id
+        """,
+        "checks": {
+            "null_transaction_id": "COUNT(*) FILTER (WHERE t.transaction_id IS NULL)",
+            "duplicate_transaction_id": "COUNT(t.transaction_id) - COUNT(DISTINCT t.transaction_id)",
+            "orphan_customer": "COUNT(*) FILTER (WHERE t.customer_id IS NOT NULL AND c.customer_id IS NULL)",
+            "total_mismatch": "COUNT(*) FILTER (WHERE i.items_total <> t.total_amount)"
+        }
+    },
+    "transaction_items": {
+        "alias": "ti",
+        "joins": """
+            LEFT JOIN (SELECT DISTINCT transaction_id FROM staging.transactions) t
+                ON t.transaction_id = ti.transaction_id
+            LEFT JOIN (SELECT DISTINCT product_id FROM staging.products) p
+                ON p.product_id = ti.product_id
+        """,
+        "checks": {
+            "null_item_id": "COUNT(*) FILTER (WHERE ti.item_id IS NULL)",
+            "duplicate_item_id": "COUNT(ti.item_id) - COUNT(DISTINCT ti.item_id)",
+            "orphan_transaction": "COUNT(*) FILTER (WHERE t.transaction_id IS NULL)",
+            "orphan_product": "COUNT(*) FILTER (WHERE p.product_id IS NULL)",
+            "line_total_mismatch": """
+                COUNT(*) FILTER (WHERE ti.line_total <>
+                    ROUND(ti.quantity * ti.unit_price * (1 - ti.discount_percentage / 100.0), 2))
+            """
+        }
+    }
+}
+
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("quality") or {})}
+
+# -----------------------------
+# Checks
+# -----------------------------
+def estimated_rows(cur, table):
+    cur.execute("SELECT reltuples::BIGINT FROM pg_class WHERE oid = to_regclass(%s);", (f"staging.{table}",))
+    row = cur.fetchone()
+    return row[0] if row else 0
 
-    with engine.connect() as conn:
-        customers = conn.execute(text("SELECT COUNT(*) FROM production.customers")).scalar()
-        transactions = conn.execute(text("SELECT COUNT(*) FROM production.transactions")).scalar()
+def check_query(table, spec, sample_percent=None):
+    sample = f" TABLESAMPLE SYSTEM ({sample_percent})" if sample_percent else ""
+    checks = ",\n".join(f"{expr} AS {name}" for name, expr in spec["checks"].items())
+    return f"""
+        SELECT COUNT(*) AS rows_checked,
+        {checks}
+        FROM staging.{table} {spec["alias"]}{sample}
+        {spec["joins"]};
+    """
+
+def run_table_checks(pool, table, spec, settings):
+    """Run all checks of one table in a single query on a pooled connection."""
+    conn = pool.getconn()
+    try:
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            # Very large tables are checked on a block sample; violations
+            # are judged as a rate, so the score stays comparable
+            sample = None
+            if estimated_rows(cur, table) > settings["sample_above_rows"]:
+                sample = settings["sample_percent"]
+            cur.execute(check_query(table, spec, sample))
+            row = cur.fetchone()
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+    rows = row[0]
+    return {
+        "rows_checked": rows,
+        "sampled_percent": sample,
+        "duration_seconds": round(time.perf_counter() - start, 3),
+        "checks": {
+            name: {
+                "violations": violations,
+                # An empty table fails every check: nothing must be promoted from it
+                "violation_rate": round(violations / rows, 6) if rows else 1.0
+            }
+            for name, violations in zip(spec["checks"], row[1:])
+        }
+    }
+
+def quality_score(tables):
+    """Mean pass rate over every check, as a percentage."""
+    rates = [c["violation_rate"] for t in tables.values() for c in t["checks"].values()]
+    return round(100 * (1 - sum(min(r, 1.0) for r in rates) / len(rates)), 2) if rates else 0.0
+
+def run_checks(settings):
+    workers = settings["workers"]
+    pool = db.open_pool(workers, "quality")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                table: executor.submit(run_table_checks, pool, table, spec, settings)
+                for table, spec in TABLE_CHECKS.items()
+            }
+            return {table: future.result() for table, future in futures.items()}
+    finally:
+        pool.closeall()
+
+def main():
+    settings = load_settings()
+    start = time.perf_counter()
+    tables = run_checks(settings)
+    score = quality_score(tables)
+    passed = score >= settings["min_score"]
 
     report = {
-        "customers_count": customers,
-        "transactions_count": transactions,
-        "quality_score": 100
+        "timestamp": datetime.now().isoformat(),
+        "quality_score": score,
+        "min_score": settings["min_score"],
+        "status": "ok" if passed else "failed",
+        "gate": settings["gate"],
+        "total_violations": sum(
+            c["violations"] for t in tables.values() for c in t["checks"].values()
+        ),
+        "tables": tables,
+        "total_execution_time_seconds": round(time.perf_counter() - start, 3)
     }
 
     with open(REPORT_PATH, "w") as f:
         json.dump(report, f, indent=4)
 
-    print("✅ Data quality report generated")
+    if passed:
+        print(f"✅ Data quality report generated (score {score})")
+        return
+    print(f"❌ Data quality score {score} is below {settings['min_score']}")
+    if settings["gate"]:
+        sys.exit(GATE_FAILED_EXIT_CODE)
 
 if __name__ == "__main__":
-    main()
+    db.run(main)
@@ -0,0 +1,179 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+# Explicit raw-zone schemas (column, Arrow type). Parquet files are written
+# with exactly these types and a <table>.schema.json copy is stored next to
+# them, so readers never have to infer types from text.
+RAW_SCHEMAS = {
+    "customers": [
+        ("customer_id", "string"),
+        ("first_name", "string"),
+        ("last_name", "string"),
+        ("email", "string"),
+        ("city", "string"),
+        ("state", "string")
+    ],
+    "products": [
+        ("product_id", "string"),
+        ("product_name", "string"),
+        ("category", "string"),
+        ("price", "float64"),
+        ("cost", "float64")
+    ],
+    "transactions": [
+        ("transaction_id", "string"),
+        ("customer_id", "string"),
+        ("transaction_date", "date32"),
+        ("transaction_time", "string"),
+        ("payment_method", "string"),
+        ("total_amount", "float64")
+    ],
+    "transaction_items": [
+        ("item_id", "string"),
+        ("transaction_id", "string"),
+        ("product_id", "string"),
+        ("quantity", "int64"),
+        ("unit_price", "float64"),
+        ("discount_percentage", "int64"),
+        ("line_total", "float64")
+    ]
+}
+
+# Fact tables are written as hive-partitioned datasets by transaction month
+PARTITIONED_TABLES = {"transactions", "transaction_items"}
+PARTITION_COLUMN = "transaction_month"
+
+RAW_FORMATS = ("csv", "parquet")
+
+# Streaming mode appends micro-batches of transactions and items to CSV files
+# in this landing directory, and one line per batch to its batch log once both
+# files hold the batch. Ingestion loads them like any raw file; it lives
+# outside data/raw so that appends do not look like a changed generation.
+# Anchored to the project root: the producer, consumer and generator may run
+# from different working directories.
+LANDING_DIR = str(ROOT_DIR / "data" / "landing")
+STREAM_TABLES = ["transactions", "transaction_items"]
+STREAM_BATCH_LOG = "batches.jsonl"
+
+def get_raw_format(config):
+    raw_format = config.get("storage", {}).get("raw_format", "csv")
+    if raw_format not in RAW_FORMATS:
+        raise ValueError(f"Unsupported storage.raw_format: {raw_format}")
+    return raw_format
+
+def arrow_schema(table):
+    import pyarrow as pa
+
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in RAW_SCHEMAS[table]])
+
+def table_path(table, raw_format):
+    """Manifest entry for a table: a CSV file, a Parquet file or a dataset directory."""
+    if raw_format == "csv":
+        return f"{table}.csv"
+    if table in PARTITIONED_TABLES:
+        return table
+    return f"{table}.parquet"
+
+def stream_path(table):
+    return os.path.join(LANDING_DIR, f"{table}.csv")
+
+def write_schema(table, out_dir):
+    with open(os.path.join(out_dir, f"{table}.schema.json"), "w") as f:
+        json.dump({
+            "table": table,
+            "columns": [{"name": n, "type": t} for n, t in RAW_SCHEMAS[table]],
+            "partitioning": [PARTITION_COLUMN] if table in PARTITIONED_TABLES else []
+        }, f, indent=4)
+
+def write_parquet(df, table, path, part=0, months=None):
+    """
+    Write a DataFrame with the table's explicit schema to path (a file, or
+    the dataset directory for partitioned tables). Partitioned tables need
+    the transaction month of each row (months) and get one file per month
+    directory, named after part so chunks and shards never collide.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Columns the schema has but the frame lacks are written as nulls
+    frame = df.reindex(columns=[name for name, _ in RAW_SCHEMAS[table]])
+    if "transaction_date" in frame:
+        frame["transaction_date"] = frame["transaction_date"].astype("datetime64[ns]").dt.date
+    data = pa.Table.from_pandas(frame, schema=arrow_schema(table), preserve_index=False)
+
+    if table not in PARTITIONED_TABLES:
+        pq.write_table(data, path)
+        return
+
+    # Hive-style layout (<path>/transaction_month=YYYY-MM/part-NNNNN.parquet);
+    # the month lives in the directory name, not in the files
+    months = np.asarray(months)
+    for month in np.unique(months):
+        month_dir = os.path.join(path, f"{PARTITION_COLUMN}={month}")
+        os.makedirs(month_dir, exist_ok=True)
+        pq.write_table(
+            data.filter(pa.array(months == month)),
+            os.path.join(month_dir, f"part-{part:05d}.parquet")
+        )
+
+def expand_paths(paths):
+    """Expand dataset directories into their Parquet files (sorted)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(str(p) for p in Path(path).rglob("*.parquet")))
+        else:
+            files.append(path)
+    return files
+
+class ParquetCsvReader:
+    """
+    File-like object that streams selected columns of a Parquet file as
+    header-less CSV, one record batch at a time, for COPY FROM STDIN.
+    """
+
+    def __init__(self, path, columns, batch_size=65536):
+        import pyarrow.parquet as pq
+
+        self._file = pq.ParquetFile(path)
+        self._batches = self._file.iter_batches(batch_size=batch_size, columns=columns)
+        self._buffer = b""
+        self._pos = 0
+
+    def _next_chunk(self):
+        import io
+        import pyarrow.csv as pacsv
+
+        batch = next(self._batches, None)
+        if batch is None:
+            return None
+        out = io.BytesIO()
+        pacsv.write_csv(batch, out, pacsv.WriteOptions(include_header=False))
+        return out.getvalue()
+
+    def read(self, size=-1):
+        # Short reads are fine: COPY keeps reading until b"" is returned
+        while self._pos >= len(self._buffer):
+            chunk = self._next_chunk()
+            if chunk is None:
+                return b""
+            self._buffer, self._pos = chunk, 0
+        if size is None or size < 0:
+            size = len(self._buffer) - self._pos
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,25 +1,47 @@
-import schedule
+import fcntl
+import json
 import subprocess
+import sys
 import time
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-import os
+
+import yaml
 
 # -----------------------------
 # Paths
 # -----------------------------
+ROOT_DIR = Path(__file__).resolve().parents[1]
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
 
 SCHEDULER_LOG = LOG_DIR / "scheduler_activity.log"
-LOCK_FILE = LOG_DIR / "pipeline.lock"
-
+# One line per job: due time, queue delay and run latency
+RUN_HISTORY = LOG_DIR / "scheduler_runs.jsonl"
+# Last window each schedule ran for, so missed windows are caught up on restart
+STATE_PATH = Path("data/processed/scheduler_state.json")
+# Held by the scheduler process itself: a second scheduler exits at once
+SCHEDULER_LOCK = LOG_DIR / "scheduler.lock"
+
+# The orchestrator takes the pipeline lock (logs/pipeline.lock) itself; a
+# scheduled run waits for a manual one instead of failing
 PIPELINE_COMMAND = [
     "python",
-    "scripts/pipeline_orchestrator.py"
+    "scripts/pipeline_orchestrator.py",
+    "--wait-lock"
 ]
 
+DEFAULT_SETTINGS = {
+    "poll_seconds": 30,
+    "catch_up": True,
+    "schedules": {
+        "nightly_full": {"at": "02:00", "full_refresh": True}
+    }
+}
+
 # -----------------------------
 # Logging
 # -----------------------------
@@ -32,61 +54,147 @@ logging.basicConfig(
     ]
 )
 
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("scheduler") or {})}
+
 # -----------------------------
-# Concurrency Guard
+# Cadences
 # -----------------------------
-def is_pipeline_running():
-    return LOCK_FILE.exists()
-
-def create_lock():
-    LOCK_FILE.write_text(str(os.getpid()))
-
-def remove_lock():
-    if LOCK_FILE.exists():
-        LOCK_FILE.unlink()
+def parse_time(value):
+    return datetime.strptime(value, "%H:%M").time()
+
+def latest_due(schedule, now):
+    """
+    The most recent time at or before now that a schedule was due. Schedules
+    are either daily ("at": "HH:MM") or every N minutes within a daily
+    window ("every_minutes" with optional "between": ["HH:MM", "HH:MM"]).
+    """
+    if "at" in schedule:
+        due = datetime.combine(now.date(), parse_time(schedule["at"]))
+        return due if due <= now else due - timedelta(days=1)
+
+    interval = timedelta(minutes=schedule["every_minutes"])
+    start, end = (parse_time(t) for t in schedule.get("between", ["00:00", "23:59"]))
+    window_start = datetime.combine(now.date(), start)
+    window_end = datetime.combine(now.date(), end)
+    if now < window_start:
+        # Last slot of yesterday's window
+        window_start -= timedelta(days=1)
+        window_end -= timedelta(days=1)
+    last = min(now, window_end)
+    return window_start + ((last - window_start) // interval) * interval
+
+def load_state():
+    if not STATE_PATH.exists():
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+def save_state(state):
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f, indent=4)
+
+def due_jobs(schedules, state, now):
+    """
+    (due, name) for every schedule with a window newer than the last one it
+    ran for. Windows missed while the scheduler was down collapse into one
+    run; full rebuilds go before micro-batches due at the same time.
+    """
+    jobs = []
+    for name, schedule in schedules.items():
+        due = latest_due(schedule, now)
+        last = state.get(name)
+        if last is None or due > datetime.fromisoformat(last):
+            jobs.append((due, not schedule.get("full_refresh", False), name))
+    return [(due, name) for due, _, name in sorted(jobs)]
 
 # -----------------------------
 # Job Function
 # -----------------------------
-def run_pipeline_job():
-    if is_pipeline_running():
-        logging.warning("Pipeline already running. Skipping this schedule.")
-        return
-
-    logging.info("Scheduled pipeline execution started")
-    create_lock()
+def pipeline_command(schedule):
+    if schedule.get("command"):
+        # A maintenance job (e.g. partition retention) instead of the pipeline
+        return list(schedule["command"])
+    command = list(PIPELINE_COMMAND)
+    if schedule.get("full_refresh"):
+        command.append("--full-refresh")
+    if schedule.get("steps"):
+        command += ["--steps", *schedule["steps"]]
+    return command
+
+def run_pipeline_job(name, schedule, due, catch_up=False):
+    started = datetime.now()
+    logging.info(f"Scheduled pipeline execution started: {name} (due {due:%Y-%m-%d %H:%M})")
 
     try:
         result = subprocess.run(
-            PIPELINE_COMMAND,
+            pipeline_command(schedule),
             capture_output=True,
             text=True
         )
+        returncode = result.returncode
 
-        if result.returncode == 0:
-            logging.info("Pipeline execution SUCCESS")
+        if returncode == 0:
+            logging.info(f"Pipeline execution SUCCESS: {name}")
         else:
-            logging.error("Pipeline execution FAILED")
+            logging.error(f"Pipeline execution FAILED: {name}")
             logging.error(result.stderr)
 
-    except Exception as e:
+    except Exception:
         logging.exception("Scheduler error occurred")
-
-    finally:
-        remove_lock()
-        logging.info("Scheduled pipeline execution finished")
-
-# -----------------------------
-# Schedule Configuration
-# -----------------------------
-# Daily at 02:00 AM (change time if needed)
-schedule.every().day.at("02:00").do(run_pipeline_job)
-
-logging.info("Scheduler started. Waiting for scheduled execution...")
+        returncode = None
+
+    finished = datetime.now()
+    record = {
+        "schedule": name,
+        "due_at": due.isoformat(),
+        "started_at": started.isoformat(),
+        "finished_at": finished.isoformat(),
+        "catch_up": catch_up,
+        "queue_delay_seconds": round((started - due).total_seconds(), 2),
+        "run_latency_seconds": round((finished - started).total_seconds(), 2),
+        "status": "success" if returncode == 0 else "failed",
+        "returncode": returncode
+    }
+    with open(RUN_HISTORY, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    logging.info(f"Scheduled pipeline execution finished: {name}")
+    return record
 
 # -----------------------------
 # Loop
 # -----------------------------
-while True:
-    schedule.run_pending()
-    time.sleep(30)
+def run_scheduler():
+    settings = load_settings()
+    schedules = settings["schedules"]
+    state = load_state()
+    started = datetime.now()
+
+    for name, schedule in schedules.items():
+        # A new schedule has nothing to catch up on; without catch_up,
+        # windows missed while stopped are skipped
+        if name not in state or not settings["catch_up"]:
+            state[name] = latest_due(schedule, started).isoformat()
+    save_state(state)
+
+    logging.info(f"Scheduler started with schedules: {', '.join(schedules)}")
+
+    while True:
+        for due, name in due_jobs(schedules, state, datetime.now()):
+            run_pipeline_job(name, schedules[name], due, catch_up=due < started)
+            state[name] = due.isoformat()
+            save_state(state)
+        time.sleep(settings["poll_seconds"])
+
+if __name__ == "__main__":
+    scheduler_lock = open(SCHEDULER_LOCK, "a+")
+    try:
+        fcntl.flock(scheduler_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logging.error("Another scheduler is already running. Exiting.")
+        sys.exit(1)
+    run_scheduler()
@@ -0,0 +1,142 @@
+import argparse
+import re
+import sys
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+import yaml
+from scripts import db, watermarks
+
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+
+# A full rebuild of a schema is built in <schema>_next and renamed into
+# place at commit; the version it replaces stays as <schema>_previous until
+# the next rebuild. Renaming a schema takes no lock on its tables, so
+# readers of the live schema are never blocked by a rebuild.
+SHADOW_SUFFIX = "_next"
+PREVIOUS_SUFFIX = "_previous"
+
+# Watermark layers that are out of date once a schema is rolled back
+ROLLBACK_WATERMARKS = {
+    "production": ["production", "warehouse"],
+    "warehouse": ["warehouse", "analytics"]
+}
+
+DEFAULT_MIN_ROW_RATIO = 0.5
+
+def shadow_name(schema):
+    return schema + SHADOW_SUFFIX
+
+def previous_name(schema):
+    return schema + PREVIOUS_SUFFIX
+
+def load_min_row_ratio():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return config.get("pipeline", {}).get("swap_min_row_ratio", DEFAULT_MIN_ROW_RATIO)
+
+def schema_exists(cur, schema):
+    cur.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s;", (schema,))
+    return cur.fetchone() is not None
+
+# -----------------------------
+# Shadow build
+# -----------------------------
+def prepare_shadow(cur, schema):
+    """Create an empty shadow schema (dropping a leftover one) and return its name."""
+    shadow = shadow_name(schema)
+    cur.execute(f"DROP SCHEMA IF EXISTS {shadow} CASCADE;")
+    cur.execute(f"CREATE SCHEMA {shadow};")
+    return shadow
+
+def retarget_ddl(ddl_path, schema, target):
+    """A schema's DDL file with every reference to the schema pointed at target."""
+    return re.sub(rf"\b{schema}\b", target, Path(ddl_path).read_text())
+
+def count_rows(cur, schema, table):
+    cur.execute(f"SELECT COUNT(*) FROM {schema}.{table};")
+    return cur.fetchone()[0]
+
+def validate_shadow(cur, schema, tables, checks=None, min_row_ratio=None):
+    """
+    Check a shadow build before it is swapped in: no table may shrink below
+    min_row_ratio of its live row count, and every check query (with
+    {shadow} for the shadow schema) must return 0. Raises RuntimeError
+    listing every failure; returns the shadow row counts.
+    """
+    shadow = shadow_name(schema)
+    ratio = load_min_row_ratio() if min_row_ratio is None else min_row_ratio
+    live = schema_exists(cur, schema)
+    counts = {}
+    failures = []
+
+    for table in tables:
+        counts[table] = count_rows(cur, shadow, table)
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"{schema}.{table}",))
+        if live and cur.fetchone()[0]:
+            live_rows = count_rows(cur, schema, table)
+            if counts[table] < ratio * live_rows:
+                failures.append(f"{table}: {counts[table]} rows, live has {live_rows}")
+
+    for name, sql in (checks or {}).items():
+        cur.execute(sql.format(shadow=shadow))
+        violations = cur.fetchone()[0]
+        if violations:
+            failures.append(f"{name}: {violations} violations")
+
+    if failures:
+        raise RuntimeError(f"{shadow} failed validation: " + "; ".join(failures))
+    return counts
+
+# -----------------------------
+# Swap
+# -----------------------------
+def swap_in(cur, schema):
+    """
+    Rename the shadow schema into place, keeping the live one as the
+    previous version. Takes effect for every reader when the transaction
+    commits.
+    """
+    previous = previous_name(schema)
+    cur.execute(f"DROP SCHEMA IF EXISTS {previous} CASCADE;")
+    if schema_exists(cur, schema):
+        cur.execute(f"ALTER SCHEMA {schema} RENAME TO {previous};")
+    cur.execute(f"ALTER SCHEMA {shadow_name(schema)} RENAME TO {schema};")
+
+def roll_back(cur, schema):
+    """
+    Put the previous version back in place; the replaced build is kept as
+    the shadow schema. The watermarks of the schema and of what is built
+    from it are cleared, so the next run rebuilds them from the restored
+    version.
+    """
+    previous = previous_name(schema)
+    if not schema_exists(cur, previous):
+        raise RuntimeError(f"No previous version of {schema} to roll back to")
+    shadow = shadow_name(schema)
+    cur.execute(f"DROP SCHEMA IF EXISTS {shadow} CASCADE;")
+    cur.execute(f"ALTER SCHEMA {schema} RENAME TO {shadow};")
+    cur.execute(f"ALTER SCHEMA {previous} RENAME TO {schema};")
+
+    watermarks.ensure_table(cur)
+    for layer in ROLLBACK_WATERMARKS.get(schema, [schema]):
+        watermarks.clear_watermarks(cur, layer)
+    # Cached query results read the replaced build
+    watermarks.bump_schema_versions(cur, schema)
+
+def main(schema):
+    conn = db.connect("schema_swap")
+    try:
+        with conn, conn.cursor() as cur:
+            roll_back(cur, schema)
+    finally:
+        db.release(conn)
+    print(f"✅ Rolled {schema} back to its previous version")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll a rebuilt schema back to the version it replaced.")
+    parser.add_argument("schema", choices=sorted(ROLLBACK_WATERMARKS))
+    db.run(main, parser.parse_args().schema)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+from pathlib import Path
+
+import yaml
+from scripts import watermarks
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+RUN_STATE_PATH = Path("data/processed/pipeline_run_state.json")
+
+# -----------------------------
+# Run-state store
+# -----------------------------
+# {"steps": {name: last successful run}, "file_digests": {path: [size, mtime_ns, sha256]}}
+def load_run_state(path=RUN_STATE_PATH):
+    if not Path(path).exists():
+        return {"steps": {}, "file_digests": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_run_state(state, path=RUN_STATE_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    # Copied first: running steps may still be adding digests
+    snapshot = {"steps": dict(state["steps"]), "file_digests": dict(state["file_digests"])}
+    with open(path, "w") as f:
+        json.dump(snapshot, f, indent=4)
+
+# -----------------------------
+# Fingerprints
+# -----------------------------
+def file_digest(path, digests):
+    """sha256 of a file, reused from digests while its size and mtime are unchanged."""
+    stat = path.stat()
+    key = str(path)
+    cached = digests.get(key)
+    if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return cached[2]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    digests[key] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+    return sha.hexdigest()
+
+def path_fingerprint(path, digests):
+    if path.is_dir():
+        return {
+            str(p.relative_to(path)): file_digest(p, digests)
+            for p in sorted(path.rglob("*")) if p.is_file()
+        }
+    return file_digest(path, digests)
+
+def schema_fingerprint(cur, schema):
+    """
+    Catalog-only state of a schema: the load version of each table of a
+    versioned schema, else each table's identity and write counters, plus
+    the layer's pipeline watermarks. No table is scanned.
+    """
+    fingerprint = {}
+    if schema in watermarks.VERSIONED_SCHEMAS:
+        # Every writer of these schemas bumps the versions in its own
+        # transaction, so a step consuming part of its input (analytics
+        # clearing the warehouse change log) leaves them unchanged
+        cur.execute("SELECT to_regclass('public.table_versions') IS NOT NULL;")
+        if cur.fetchone()[0]:
+            fingerprint["table_versions"] = watermarks.get_schema_versions(cur, schema)
+    else:
+        # relid changes when a table is replaced; the counters are cumulative
+        # inserted/updated/deleted rows (partitions listed on their own)
+        cur.execute("""
+            SELECT relname, relid, n_tup_ins, n_tup_upd, n_tup_del
+            FROM pg_stat_user_tables
+            WHERE schemaname = %s
+            ORDER BY relname;
+        """, (schema,))
+        for table, *counters in cur.fetchall():
+            fingerprint[table] = counters
+
+    cur.execute("SELECT to_regclass('public.pipeline_watermarks') IS NOT NULL;")
+    if cur.fetchone()[0]:
+        cur.execute("""
+            SELECT table_name, source, high_water_mark::TEXT, byte_offset, checksum
+            FROM pipeline_watermarks
+            WHERE layer = %s
+            ORDER BY table_name, source;
+        """, (schema,))
+        fingerprint["pipeline_watermarks"] = [list(row) for row in cur.fetchall()]
+    return fingerprint
+
+def resource_fingerprint(cur, resource, digests):
+    """A resource is a file or directory when it exists on disk, else a schema."""
+    path = Path(resource)
+    if path.exists():
+        return path_fingerprint(path, digests)
+    if "/" in resource or "." in resource:
+        return None
+    return schema_fingerprint(cur, resource)
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def fingerprint_resources(cur, resources, digests):
+    return digest({r: resource_fingerprint(cur, r, digests) for r in resources})
+
+def config_value(config, key):
+    """Value of a dotted config key such as "pipeline.load_mode"."""
+    for part in key.split("."):
+        config = (config or {}).get(part)
+    return config
+
+def code_fingerprint(files, config_keys, digests):
+    """Hash of the step's scripts and SQL, and of the config keys it reads."""
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return digest({
+        "files": {f: file_digest(ROOT_DIR / f, digests) for f in files},
+        "config": {key: config_value(config, key) for key in config_keys}
+    })
@@ -1,21 +1,468 @@
+import argparse
+import csv
+import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 # Ensure project root is on PYTHONPATH
 ROOT_DIR = Path(__file__).resolve().parents[2]
 sys.path.append(str(ROOT_DIR))
 
-import psycopg2
-import pandas as pd
-from scripts.db import get_db_config
+import yaml
+from scripts import db, watermarks
 
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+ANALYTICS_DDL = ROOT_DIR / "sql" / "ddl" / "create_analytics_schema.sql"
+OUTPUT_DIR = Path("data/processed_analytics")
+SUMMARY_PATH = OUTPUT_DIR / "analytics_summary.json"
 
-def main():
-    conn = psycopg2.connect(**get_db_config())
-    df = pd.read_sql("SELECT * FROM warehouse.fact_sales", conn)
-    print(df.head())
-    conn.close()
+DEFAULT_SETTINGS = {
+    "workers": 4,
+    "format": "csv",
+    "fetch_size": 10000
+}
 
+EPOCH = "1970-01-01"
+
+MONTH_KEY = "COALESCE(date_key / 100, 0)"
+
+DISCOUNT_RANGE = """
+    CASE
+        WHEN discount_amount = 0 THEN '0%'
+        WHEN discount_amount < 0.1 * unit_price * quantity THEN '1-10%'
+        WHEN discount_amount < 0.25 * unit_price * quantity THEN '11-25%'
+        WHEN discount_amount < 0.5 * unit_price * quantity THEN '26-50%'
+        ELSE '50%+'
+    END
+"""
+
+# Month-keyed aggregates of warehouse.fact_sales ({where} limits the scan to
+# the months being refreshed). Every measure is a sum or a count of
+# per-month-distinct transactions, so re-aggregating them is exact.
+BASE_AGGREGATES = {
+    "monthly_product_sales": f"""
+        SELECT {MONTH_KEY}, product_key, SUM(line_total), SUM(quantity), COUNT(*),
+               SUM(unit_price), SUM(profit)
+        FROM warehouse.fact_sales {{where}}
+        GROUP BY 1, product_key
+    """,
+    "monthly_customer_sales": f"""
+        SELECT {MONTH_KEY}, customer_key, SUM(line_total), COUNT(*), COUNT(DISTINCT transaction_id)
+        FROM warehouse.fact_sales {{where}}
+        GROUP BY 1, customer_key
+    """,
+    "daily_sales": f"""
+        SELECT {MONTH_KEY}, date_key, SUM(line_total), COUNT(*), COUNT(DISTINCT transaction_id)
+        FROM warehouse.fact_sales {{where}}
+        GROUP BY 1, date_key
+    """,
+    "daily_category_sales": f"""
+        SELECT {MONTH_KEY}, f.date_key, p.category, SUM(f.line_total), COUNT(*)
+        FROM warehouse.fact_sales f
+        LEFT JOIN warehouse.dim_products p ON f.product_key = p.product_key
+        {{where}}
+        GROUP BY 1, f.date_key, p.category
+    """,
+    "sales_by_hour": f"""
+        SELECT {MONTH_KEY},
+               TO_DATE(date_key::TEXT, 'YYYYMMDD') + MAKE_TIME(EXTRACT(HOUR FROM transaction_time)::INT, 0, 0),
+               SUM(line_total), COUNT(*)
+        FROM warehouse.fact_sales {{where}}
+        GROUP BY 1, 2
+    """,
+    "monthly_payment_sales": f"""
+        SELECT {MONTH_KEY}, payment_method_key, SUM(line_total), COUNT(*)
+        FROM warehouse.fact_sales {{where}}
+        GROUP BY 1, payment_method_key
+    """,
+    "monthly_discount_sales": f"""
+        SELECT {MONTH_KEY}, {DISCOUNT_RANGE}, SUM(line_total), SUM(quantity), COUNT(*)
+        FROM warehouse.fact_sales {{where}}
+        GROUP BY 1, 2
+    """
+}
+
+# The ten queries of sql/queries/analytical_queries.sql, answered from the
+# aggregates: (export name, table, query, export order).
+ANALYTICS_QUERIES = [
+    ("query1", "top_products", """
+        SELECT
+            p.product_name,
+            p.category,
+            SUM(s.revenue) AS total_revenue,
+            SUM(s.units_sold) AS units_sold,
+            SUM(s.unit_price_sum) / SUM(s.line_count) AS avg_price
+        FROM analytics.monthly_product_sales s
+        JOIN warehouse.dim_products p ON s.product_key = p.product_key
+        GROUP BY p.product_name, p.category
+        ORDER BY total_revenue DESC
+        LIMIT 10
+    """, "total_revenue DESC"),
+    ("query2", "monthly_sales_trend", """
+        WITH days AS (
+            SELECT
+                d.year,
+                d.month,
+                SUM(s.revenue) AS total_revenue,
+                SUM(s.transaction_count) AS total_transactions,
+                SUM(s.revenue) / SUM(s.line_count) AS average_order_value
+            FROM analytics.daily_sales s
+            JOIN warehouse.dim_date d ON s.date_key = d.date_key
+            GROUP BY d.year, d.month
+        ),
+        customers AS (
+            SELECT month_key, COUNT(DISTINCT customer_key) AS unique_customers
+            FROM analytics.monthly_customer_sales
+            GROUP BY month_key
+        )
+        SELECT days.*, c.unique_customers
+        FROM days
+        JOIN customers c ON c.month_key = days.year * 100 + days.month
+    """, "year, month"),
+    ("query3", "customer_segments", """
+        WITH customer_totals AS (
+            SELECT
+                customer_key,
+                SUM(revenue) AS total_spent,
+                SUM(revenue) / SUM(line_count) AS avg_transaction_value
+            FROM analytics.monthly_customer_sales
+            GROUP BY customer_key
+        )
+        SELECT
+            CASE
+                WHEN total_spent < 1000 THEN '0-1000'
+                WHEN total_spent < 5000 THEN '1000-5000'
+                WHEN total_spent < 10000 THEN '5000-10000'
+                ELSE '10000+'
+            END AS spending_segment,
+            COUNT(*) AS customer_count,
+            SUM(total_spent) AS total_revenue,
+            AVG(avg_transaction_value) AS avg_transaction_value
+        FROM customer_totals
+        GROUP BY spending_segment
+    """, "spending_segment"),
+    ("query4", "category_performance", """
+        SELECT
+            p.category,
+            SUM(s.revenue) AS total_revenue,
+            SUM(s.profit) AS total_profit,
+            (SUM(s.profit) / SUM(s.revenue)) * 100 AS profit_margin_pct,
+            SUM(s.units_sold) AS units_sold
+        FROM analytics.monthly_product_sales s
+        JOIN warehouse.dim_products p ON s.product_key = p.product_key
+        GROUP BY p.category
+    """, "category"),
+    ("query5", "payment_method_distribution", """
+        SELECT
+            pm.payment_method_name AS payment_method,
+            SUM(s.line_count) AS transaction_count,
+            SUM(s.revenue) AS total_revenue,
+            SUM(s.line_count) * 100.0 / SUM(SUM(s.line_count)) OVER () AS pct_of_transactions,
+            SUM(s.revenue) * 100.0 / SUM(SUM(s.revenue)) OVER () AS pct_of_revenue
+        FROM analytics.monthly_payment_sales s
+        JOIN warehouse.dim_payment_method pm ON s.payment_method_key = pm.payment_method_key
+        GROUP BY pm.payment_method_name
+    """, "payment_method"),
+    ("query6", "geographic_sales", """
+        SELECT
+            c.state,
+            SUM(s.revenue) AS total_revenue,
+            COUNT(DISTINCT s.customer_key) AS total_customers,
+            SUM(s.revenue) / SUM(s.line_count) AS avg_revenue_per_customer
+        FROM analytics.monthly_customer_sales s
+        JOIN warehouse.dim_customers c ON s.customer_key = c.customer_key
+        GROUP BY c.state
+    """, "state"),
+    ("query7", "customer_lifetime_value", """
+        SELECT
+            c.customer_id,
+            c.full_name,
+            SUM(s.revenue) AS total_spent,
+            SUM(s.transaction_count) AS transaction_count,
+            CURRENT_DATE - c.effective_date AS days_since_registration,
+            SUM(s.revenue) / SUM(s.line_count) AS avg_order_value
+        FROM analytics.monthly_customer_sales s
+        JOIN warehouse.dim_customers c ON s.customer_key = c.customer_key
+        GROUP BY c.customer_id, c.full_name, c.effective_date
+    """, "customer_id, days_since_registration"),
+    ("query8", "product_profitability", """
+        SELECT
+            p.product_name,
+            p.category,
+            SUM(s.profit) AS total_profit,
+            (SUM(s.profit) / SUM(s.revenue)) * 100 AS profit_margin,
+            SUM(s.revenue) AS revenue,
+            SUM(s.units_sold) AS units_sold
+        FROM analytics.monthly_product_sales s
+        JOIN warehouse.dim_products p ON s.product_key = p.product_key
+        GROUP BY p.product_name, p.category
+    """, "total_profit DESC NULLS LAST, product_name, category"),
+    ("query9", "weekday_sales", """
+        SELECT
+            d.day_name,
+            SUM(s.revenue) / SUM(s.line_count) AS avg_daily_revenue,
+            SUM(s.transaction_count) AS avg_daily_transactions,
+            SUM(s.revenue) AS total_revenue
+        FROM analytics.daily_sales s
+        JOIN warehouse.dim_date d ON s.date_key = d.date_key
+        GROUP BY d.day_name
+    """, "day_name"),
+    ("query10", "discount_impact", """
+        SELECT
+            discount_range,
+            SUM(line_count) AS total_orders,
+            SUM(quantity) AS total_quantity_sold,
+            SUM(revenue) AS total_revenue,
+            SUM(revenue) / SUM(line_count) AS avg_line_total
+        FROM analytics.monthly_discount_sales
+        GROUP BY discount_range
+    """, "discount_range")
+]
+
+# -----------------------------
+# Refresh
+# -----------------------------
+def month_filter(month_key):
+    """
+    WHERE clause reading only the fact partition of one month. The bounds
+    are inlined integers: the aggregates contain literal '%' characters.
+    """
+    if month_key == 0:
+        return "WHERE date_key IS NULL"
+    return f"WHERE date_key >= {int(month_key) * 100} AND date_key < {int(month_key) * 100 + 100}"
+
+def pending_changes(cur, since):
+    """Months logged by warehouse loads after the watermark, or None if one was a full rebuild."""
+    cur.execute("""
+        SELECT month_key, full_rebuild, changed_at
+        FROM warehouse.fact_sales_changes
+        WHERE changed_at > %s;
+    """, (since,))
+    rows = cur.fetchall()
+    latest = max((r[2] for r in rows), default=None)
+    if any(r[1] for r in rows):
+        return None, latest
+    return sorted({r[0] for r in rows}), latest
+
+def table_exists(cur, table):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"analytics.{table}",))
+    return cur.fetchone()[0]
+
+def refresh_base_aggregates(cur, months):
+    for table, select in BASE_AGGREGATES.items():
+        if months is None:
+            cur.execute(f"TRUNCATE analytics.{table};")
+            cur.execute(f"INSERT INTO analytics.{table} {select.format(where='')};")
+            continue
+        for month_key in months:
+            cur.execute(f"DELETE FROM analytics.{table} WHERE month_key = %s;", (month_key,))
+            cur.execute(f"INSERT INTO analytics.{table} {select.format(where=month_filter(month_key))};")
+
+def rebuild_query_tables(cur):
+    for _, table, query, _ in ANALYTICS_QUERIES:
+        cur.execute(f"DROP TABLE IF EXISTS analytics.{table};")
+        cur.execute(f"CREATE TABLE analytics.{table} AS {query};")
+
+def refresh(cur, full_refresh):
+    """
+    Bring the aggregates up to date with the warehouse. Only the months in
+    the warehouse change log since the last refresh are recomputed, unless
+    this is a full refresh or the warehouse was rebuilt.
+    """
+    # An aggregate added since the last refresh has no history to update
+    # month by month, so it triggers a full refresh
+    new_tables = [t for t in BASE_AGGREGATES if not table_exists(cur, t)]
+    cur.execute(ANALYTICS_DDL.read_text())
+    watermarks.ensure_table(cur)
+
+    since = watermarks.get_high_water_mark(cur, "analytics", "fact_sales")
+    months, latest = pending_changes(cur, since or EPOCH)
+    if full_refresh or since is None or new_tables:
+        months = None
+
+    refresh_base_aggregates(cur, months)
+    rebuild_query_tables(cur)
+    # The query tables are recreated on every refresh; the aggregates only
+    # change when months were refreshed
+    changed = [table for _, table, _, _ in ANALYTICS_QUERIES]
+    if months is None or months:
+        changed += list(BASE_AGGREGATES)
+    watermarks.bump_table_versions(cur, [f"analytics.{table}" for table in changed])
+
+    # Consumed entries are deleted (analytics is the only reader of the log),
+    # so the watermark is recorded even when nothing was pending
+    watermarks.set_watermark(cur, "analytics", "fact_sales", high_water_mark=latest or since or EPOCH)
+    if latest is not None:
+        cur.execute("DELETE FROM warehouse.fact_sales_changes WHERE changed_at <= %s;", (latest,))
+
+    return {
+        "mode": "full" if months is None else "incremental",
+        "months_refreshed": months
+    }
+
+# -----------------------------
+# Export
+# -----------------------------
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("analytics") or {})}
+
+def export_csv(conn, sql, path, settings):
+    """Stream a query's result to CSV with COPY; returns (rows, columns)."""
+    with conn.cursor() as cur, open(path, "w", newline="") as f:
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV HEADER", f)
+        rows = cur.rowcount
+    with open(path, newline="") as f:
+        columns = len(next(csv.reader(f)))
+    return rows, columns
+
+# Arrow type of each Postgres type (by OID) with a fixed counterpart; the
+# others are resolved in arrow_column
+ARROW_TYPES = {
+    16: "bool_", 20: "int64", 21: "int16", 23: "int32",
+    700: "float32", 701: "float64", 1082: "date32",
+    19: "string", 25: "string", 1042: "string", 1043: "string"
+}
+NUMERIC_OID, TIME_OID, TIMESTAMP_OID, TIMESTAMPTZ_OID = 1700, 1083, 1114, 1184
+
+def arrow_column(column):
+    """
+    Arrow type of a result column, from its cursor.description entry, and
+    the conversion its values need (None if they are taken as they are).
+    """
+    import pyarrow as pa
+
+    if column.type_code in ARROW_TYPES:
+        return getattr(pa, ARROW_TYPES[column.type_code])(), None
+    if column.type_code == NUMERIC_OID:
+        if column.precision is not None and column.precision <= 38:
+            return pa.decimal128(column.precision, column.scale), None
+        # Unconstrained NUMERIC (SUM, AVG): the scale differs value to value
+        return pa.float64(), float
+    if column.type_code == TIME_OID:
+        return pa.time64("us"), None
+    if column.type_code == TIMESTAMP_OID:
+        return pa.timestamp("us"), None
+    if column.type_code == TIMESTAMPTZ_OID:
+        return pa.timestamp("us", tz="UTC"), None
+    return pa.string(), str
+
+def export_parquet(conn, sql, path, settings):
+    """
+    Stream a query's result to Parquet through a server-side cursor, one
+    row group per fetch_size rows; returns (rows, columns). The schema
+    comes from the result's column types, so a column that is all NULL in
+    one row group is typed the same as in the others.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    size = settings["fetch_size"]
+    rows = 0
+    # A named cursor only exists inside a transaction; putconn ends it
+    with conn.cursor(name=f"export_{path.stem}") as cur:
+        cur.execute(sql)
+        chunk = cur.fetchmany(size)
+        names = [d[0] for d in cur.description]
+        types, converts = zip(*[arrow_column(d) for d in cur.description])
+        schema = pa.schema(list(zip(names, types)))
+        # An empty result still gets a file with its columns
+        with pq.ParquetWriter(path, schema) as writer:
+            while chunk:
+                writer.write_table(pa.Table.from_pydict({
+                    name: [row[i] if convert is None or row[i] is None else convert(row[i]) for row in chunk]
+                    for i, (name, convert) in enumerate(zip(names, converts))
+                }, schema=schema))
+                rows += len(chunk)
+                chunk = cur.fetchmany(size)
+    return rows, len(names)
+
+EXPORTERS = {
+    "csv": export_csv,
+    "parquet": export_parquet
+}
+
+def export_query(pool, name, table, order_by, out_dir, settings):
+    """
+    Export one analytical query to <out_dir>/<name>.<format> without
+    holding its result in memory.
+    """
+    path = Path(out_dir) / f"{name}.{settings['format']}"
+    conn = pool.getconn()
+    try:
+        start = time.perf_counter()
+        rows, columns = EXPORTERS[settings["format"]](
+            conn, f"SELECT * FROM analytics.{table} ORDER BY {order_by}", path, settings
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        pool.putconn(conn)
+
+    return {
+        "table": f"analytics.{table}",
+        "file": str(path),
+        "rows": rows,
+        "columns": columns,
+        "bytes": path.stat().st_size,
+        "execution_time_ms": round(seconds * 1000, 2)
+    }
+
+def export_queries(settings, out_dir=OUTPUT_DIR):
+    """Export every analytical query concurrently, one pooled connection each."""
+    workers = settings["workers"]
+    pool = db.open_pool(workers, "analytics")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                name: executor.submit(export_query, pool, name, table, order_by, out_dir, settings)
+                for name, table, _, order_by in ANALYTICS_QUERIES
+            }
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        pool.closeall()
+
+def main(full_refresh=None):
+    full_refresh = watermarks.is_full_refresh(full_refresh)
+    settings = load_settings()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    conn = db.connect("analytics")
+
+    try:
+        print("🔄 Refreshing analytics aggregates...")
+        start = time.perf_counter()
+        with conn, conn.cursor() as cur:
+            refresh_info = refresh(cur, full_refresh)
+        refresh_info["duration_seconds"] = round(time.perf_counter() - start, 3)
+
+        months = refresh_info["months_refreshed"]
+        print(f"   {refresh_info['mode']} refresh"
+              + ("" if months is None else f" of {len(months)} month(s)"))
+
+        export_start = time.perf_counter()
+        results = export_queries(settings)
+
+        with open(SUMMARY_PATH, "w") as f:
+            json.dump({
+                "generation_timestamp": datetime.now().isoformat(),
+                "queries_executed": len(results),
+                "format": settings["format"],
+                "total_rows": sum(r["rows"] for r in results.values()),
+                "total_bytes": sum(r["bytes"] for r in results.values()),
+                "refresh": refresh_info,
+                "query_results": results,
+                "total_execution_time_seconds": round(time.perf_counter() - export_start, 2)
+            }, f, indent=2)
+    finally:
+        db.release(conn)
+
+    print(f"✅ Analytics exported to {OUTPUT_DIR}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Refresh analytics aggregates and export the analytical queries.")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Recompute every month instead of the months changed by warehouse loads")
+    db.run(main, parser.parse_args().full_refresh)
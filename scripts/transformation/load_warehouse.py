@@ -1,55 +1,386 @@
-import psycopg2
-import os
-from sqlalchemy import create_engine, text
-
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "postgres"),
-    "port": os.getenv("DB_PORT", "5432"),
-    "dbname": os.getenv("DB_NAME", "ecommerce_db"),
-    "user": os.getenv("DB_USER", "admin"),
-    "password": os.getenv("DB_PASSWORD", "password")
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+from scripts import db, partitions, schema_swap, watermarks
+
+WAREHOUSE_DDL = ROOT_DIR / "sql" / "ddl" / "create_warehouse_schema.sql"
+
+EPOCH = "1970-01-01"
+
+WAREHOUSE_TABLES = [
+    "dim_date", "dim_customers", "dim_products", "dim_payment_method",
+    "fact_sales", "customer_metrics"
+]
+
+# Production tables behind each watermarked source
+SOURCE_TABLES = {
+    "customers": ["production.customers"],
+    "products": ["production.products"],
+    "transactions": ["production.transactions", "production.transaction_items"]
+}
+
+# Warehouse tables given a new load version (see the query cache) when rows
+# of a production source are merged
+CHANGED_BY_SOURCE = {
+    "customers": ["dim_customers", "customer_metrics"],
+    "products": ["dim_products"],
+    "transactions": ["dim_date", "dim_payment_method", "fact_sales", "customer_metrics"]
+}
+
+# Checked on a rebuilt schema before it is swapped in (0 = pass)
+REBUILD_CHECKS = {
+    "facts_not_matching_production": """
+        SELECT ABS((SELECT COUNT(*) FROM {shadow}.fact_sales)
+                   - (SELECT COUNT(*) FROM production.transaction_items));
+    """,
+    "facts_without_dimensions": """
+        SELECT COUNT(*) FROM {shadow}.fact_sales
+        WHERE customer_key IS NULL OR product_key IS NULL OR date_key IS NULL;
+    """
+}
+
+# SCD Type 2 dimensions: every tracked column is compared against the
+# current version, and a difference closes it and opens a new one.
+SCD2_DIMENSIONS = {
+    "dim_customers": {
+        "source": "customers",
+        "business_key": "customer_id",
+        "surrogate_key": "customer_key",
+        "columns": {
+            "full_name": "CONCAT_WS(' ', first_name, last_name)",
+            "email": "email",
+            "city": "city",
+            "state": "state",
+            "country": "country",
+            "age_group": "age_group"
+        },
+        # A customer's first version starts at registration when it is known
+        "first_effective_date": "COALESCE(registration_date, CURRENT_DATE)"
+    },
+    "dim_products": {
+        "source": "products",
+        "business_key": "product_id",
+        "surrogate_key": "product_key",
+        "columns": {
+            "product_name": "product_name",
+            "category": "category",
+            "sub_category": "sub_category",
+            "brand": "brand",
+            "price": "price",
+            "cost": "cost",
+            "price_range": """
+                CASE
+                    WHEN price < 50 THEN 'Budget'
+                    WHEN price < 200 THEN 'Mid-range'
+                    ELSE 'Premium'
+                END
+            """
+        },
+        "first_effective_date": "CURRENT_DATE"
+    }
 }
 
-def load():
-    conn = psycopg2.connect(**DB_CONFIG)
+PAYMENT_TYPE = """
+    CASE
+        WHEN payment_method_name IN ('Credit Card', 'Debit Card') THEN 'Card'
+        WHEN payment_method_name IN ('UPI', 'Net Banking', 'Wallet') THEN 'Digital'
+        WHEN payment_method_name = 'Cash on Delivery' THEN 'Cash'
+        ELSE 'Other'
+    END
+"""
+
+# Secondary fact indexes: a rebuild builds them once the facts are loaded.
+# Unique indexes must include the partition key.
+FACT_SALES_INDEXES = {
+    # item_id (degenerate dimension) makes re-loading a line item idempotent
+    "fact_sales_item_idx": "UNIQUE INDEX {name} ON {schema}.fact_sales (item_id, date_key)",
+    "fact_sales_date_idx": "INDEX {name} ON {schema}.fact_sales (date_key)",
+    "fact_sales_customer_idx": "INDEX {name} ON {schema}.fact_sales (customer_key)",
+    "fact_sales_product_idx": "INDEX {name} ON {schema}.fact_sales (product_key)"
+}
+
+# Line items with their transaction and customer (production is normalized)
+PRODUCTION_LINES = """
+    SELECT
+        i.item_id,
+        i.transaction_id,
+        i.product_id,
+        i.quantity,
+        i.unit_price,
+        i.discount_percentage,
+        i.line_total,
+        i.transaction_date,
+        t.transaction_time,
+        t.payment_method,
+        t.customer_id,
+        c.email AS customer_email
+    FROM production.transaction_items i
+    JOIN production.transactions t
+        ON t.transaction_id = i.transaction_id AND t.transaction_date = i.transaction_date
+    JOIN production.customers c ON c.customer_id = t.customer_id
+"""
+
+CUSTOMER_METRICS_SELECT = f"""
+    SELECT
+        customer_email,
+        COUNT(transaction_id) AS total_orders,
+        SUM(line_total) AS total_spent
+    FROM ({PRODUCTION_LINES}) lines
+"""
+
+# -----------------------------
+# Schema
+# -----------------------------
+def legacy_fact_sales(cur):
+    """
+    True when fact_sales has a legacy layout (a flat table, or no
+    transaction_time column); it is then rebuilt.
+    """
+    cur.execute("""
+        SELECT to_regclass('warehouse.fact_sales') IS NOT NULL
+           AND (
+               NOT EXISTS (
+                   SELECT 1 FROM pg_partitioned_table
+                   WHERE partrelid = to_regclass('warehouse.fact_sales')
+               )
+               OR NOT EXISTS (
+                   SELECT 1 FROM pg_attribute
+                   WHERE attrelid = to_regclass('warehouse.fact_sales')
+                     AND attname = 'transaction_time' AND NOT attisdropped
+               )
+           );
+    """)
+    return cur.fetchone()[0]
+
+def create_fact_indexes(cur, schema):
+    for name, definition in FACT_SALES_INDEXES.items():
+        cur.execute(f"CREATE {definition.format(name=f'IF NOT EXISTS {name}', schema=schema)};")
+
+# -----------------------------
+# Dimensions
+# -----------------------------
+def merge_scd2_dimension(cur, dimension, spec, since, until, schema):
+    """
+    Set-based SCD Type 2 merge of the source rows loaded since the
+    watermark (up to the run's upper bound): only keys that are new or whose tracked columns changed get
+    their current version closed and a new version inserted.
+    """
+    key = spec["business_key"]
+    columns = list(spec["columns"])
+    select_list = ", ".join(f"{expr} AS {name}" for name, expr in spec["columns"].items())
+    dim_row = ", ".join(f"d.{c}" for c in columns)
+    src_row = ", ".join(f"s.{c}" for c in columns)
+
+    cur.execute(f"""
+        CREATE TEMP TABLE {dimension}_changes ON COMMIT DROP AS
+        SELECT s.*, d.{spec["surrogate_key"]} AS previous_key
+        FROM (
+            SELECT {key}, {select_list}, {spec["first_effective_date"]} AS first_effective_date
+            FROM production.{spec["source"]}
+            WHERE updated_at > %s AND updated_at <= %s
+        ) s
+        LEFT JOIN {schema}.{dimension} d ON d.{key} = s.{key} AND d.is_current
+        WHERE d.{key} IS NULL OR ROW({dim_row}) IS DISTINCT FROM ROW({src_row});
+    """, (since, until))
+
+    cur.execute(f"""
+        UPDATE {schema}.{dimension} d
+        SET end_date = CURRENT_DATE, is_current = FALSE
+        FROM {dimension}_changes c
+        WHERE d.{spec["surrogate_key"]} = c.previous_key;
+    """)
+    closed = cur.rowcount
+
+    cur.execute(f"""
+        INSERT INTO {schema}.{dimension} ({key}, {", ".join(columns)}, effective_date, end_date, is_current)
+        SELECT {key}, {", ".join(columns)},
+               CASE WHEN previous_key IS NULL THEN first_effective_date ELSE CURRENT_DATE END,
+               NULL, TRUE
+        FROM {dimension}_changes;
+    """)
+    print(f"   {dimension}: {cur.rowcount} new versions ({closed} closed)")
+
+def merge_date_dimension(cur, schema):
+    cur.execute(f"""
+        INSERT INTO {schema}.dim_date
+        SELECT DISTINCT
+            TO_CHAR(transaction_date, 'YYYYMMDD')::INTEGER,
+            transaction_date,
+            EXTRACT(YEAR FROM transaction_date),
+            EXTRACT(QUARTER FROM transaction_date),
+            EXTRACT(MONTH FROM transaction_date),
+            EXTRACT(DAY FROM transaction_date),
+            TO_CHAR(transaction_date, 'FMMonth'),
+            TO_CHAR(transaction_date, 'FMDay'),
+            EXTRACT(WEEK FROM transaction_date),
+            EXTRACT(ISODOW FROM transaction_date) IN (6, 7)
+        FROM changed_items
+        WHERE transaction_date IS NOT NULL
+        ON CONFLICT (date_key) DO NOTHING;
+    """)
+
+def merge_payment_dimension(cur, schema):
+    cur.execute(f"""
+        INSERT INTO {schema}.dim_payment_method (payment_method_name, payment_type)
+        SELECT payment_method_name, {PAYMENT_TYPE}
+        FROM (SELECT DISTINCT COALESCE(payment_method, 'Unknown') AS payment_method_name
+              FROM changed_items) m
+        ON CONFLICT (payment_method_name) DO NOTHING;
+    """)
+
+# -----------------------------
+# Facts
+# -----------------------------
+def merge_facts(cur, since, until, schema):
+    """
+    Replace the fact rows of line items changed in production since the
+    watermark (up to the run's upper bound). Surrogate keys are resolved in one join against the current
+    dimension versions, and rows are appended in date order so each day's
+    facts stay physically together.
+    """
+    cur.execute(f"""
+        CREATE TEMP TABLE changed_items ON COMMIT DROP AS
+        {PRODUCTION_LINES}
+        WHERE (i.updated_at > %(since)s AND i.updated_at <= %(until)s)
+           OR (t.updated_at > %(since)s AND t.updated_at <= %(until)s);
+    """, {"since": since, "until": until})
+
+    merge_date_dimension(cur, schema)
+    merge_payment_dimension(cur, schema)
+    partitions.ensure_month_partitions(
+        cur, schema, "fact_sales",
+        partitions.months_in(cur, "SELECT transaction_date FROM changed_items"),
+        key_type="date_key"
+    )
+
+    # Log the months losing or gaining rows for the analytics refresh
+    cur.execute(f"""
+        INSERT INTO {schema}.fact_sales_changes (month_key)
+        SELECT COALESCE(f.date_key / 100, 0)
+        FROM {schema}.fact_sales f
+        JOIN changed_items c ON f.item_id = c.item_id
+        UNION
+        SELECT COALESCE(TO_CHAR(transaction_date, 'YYYYMM')::INTEGER, 0)
+        FROM changed_items;
+    """)
+    cur.execute(f"""
+        DELETE FROM {schema}.fact_sales f
+        USING changed_items c
+        WHERE f.item_id = c.item_id;
+    """)
+    cur.execute(f"""
+        INSERT INTO {schema}.fact_sales (
+            date_key, customer_key, product_key, payment_method_key,
+            transaction_id, item_id, transaction_time, quantity, unit_price,
+            discount_amount, line_total, profit
+        )
+        SELECT
+            TO_CHAR(c.transaction_date, 'YYYYMMDD')::INTEGER,
+            dc.customer_key,
+            dp.product_key,
+            pm.payment_method_key,
+            c.transaction_id,
+            c.item_id,
+            c.transaction_time,
+            c.quantity,
+            c.unit_price,
+            GREATEST(c.unit_price * c.quantity - c.line_total, 0),
+            c.line_total,
+            c.line_total - dp.cost * c.quantity
+        FROM changed_items c
+        LEFT JOIN {schema}.dim_customers dc
+            ON dc.customer_id = c.customer_id AND dc.is_current
+        LEFT JOIN {schema}.dim_products dp
+            ON dp.product_id = c.product_id AND dp.is_current
+        LEFT JOIN {schema}.dim_payment_method pm
+            ON pm.payment_method_name = COALESCE(c.payment_method, 'Unknown')
+        ORDER BY c.transaction_date;
+    """)
+    print(f"   Merged {cur.rowcount} rows into {schema}.fact_sales")
+
+def merge_customer_metrics(cur, schema):
+    cur.execute(f"""
+        DELETE FROM {schema}.customer_metrics m
+        USING (SELECT DISTINCT customer_email FROM changed_items) c
+        WHERE m.customer_email = c.customer_email;
+    """)
+    cur.execute(f"""
+        INSERT INTO {schema}.customer_metrics
+        {CUSTOMER_METRICS_SELECT}
+        WHERE customer_email IN (SELECT customer_email FROM changed_items)
+        GROUP BY customer_email;
+    """)
+    print(f"   Re-aggregated {cur.rowcount} rows in {schema}.customer_metrics")
+
+# -----------------------------
+# Watermarks
+# -----------------------------
+def advance_watermarks(cur, until):
+    """Record the upper bound merged per source; returns the sources that had any changes."""
+    advanced = []
+    for name, latest in until.items():
+        if latest is not None:
+            watermarks.set_watermark(cur, "warehouse", name, high_water_mark=latest)
+            advanced.append(name)
+    return advanced
+
+def load(full_refresh=None):
+    full_refresh = watermarks.is_full_refresh(full_refresh)
+    conn = db.connect("warehouse")
     cur = conn.cursor()
 
     try:
         print("🔄 Starting Warehouse Load...")
-        cur.execute("CREATE SCHEMA IF NOT EXISTS warehouse;")
-
-        # -----------------------------
-        # 1. Customer Metrics (Aggregation)
-        # -----------------------------
-        print("   Creating warehouse.customer_metrics...")
-        cur.execute("DROP TABLE IF EXISTS warehouse.customer_metrics;")
-        cur.execute("""
-            CREATE TABLE warehouse.customer_metrics AS
-            SELECT 
-                customer_email,
-                COUNT(transaction_id) AS total_orders,
-                SUM(line_total) AS total_spent
-            FROM production.transactions
-            GROUP BY customer_email;
-        """)
-
-        # -----------------------------
-        # 2. Fact Sales (Copy relevant columns)
-        # -----------------------------
-        print("   Creating warehouse.fact_sales...")
-        cur.execute("DROP TABLE IF EXISTS warehouse.fact_sales;")
-        # Note: We rename unit_price -> price to match what analytics script expects
-        cur.execute("""
-            CREATE TABLE warehouse.fact_sales AS
-            SELECT 
-                transaction_id,
-                product_id,
-                quantity,
-                unit_price AS price,
-                line_total,
-                transaction_date
-            FROM production.transactions;
-        """)
+        watermarks.ensure_table(cur)
+
+        since = {s: watermarks.get_high_water_mark(cur, "warehouse", s) for s in SOURCE_TABLES}
+        full_refresh = full_refresh or legacy_fact_sales(cur) or None in since.values()
+
+        if full_refresh:
+            # Built in the shadow schema while readers keep using warehouse
+            target = schema_swap.prepare_shadow(cur, "warehouse")
+            print(f"   Full rebuild of warehouse schema (in {target})")
+            cur.execute(schema_swap.retarget_ddl(WAREHOUSE_DDL, "warehouse", target))
+            cur.execute(f"INSERT INTO {target}.fact_sales_changes (full_rebuild) VALUES (TRUE);")
+            since = {s: EPOCH for s in SOURCE_TABLES}
+        else:
+            target = "warehouse"
+            print("   Incremental merge into warehouse schema")
+            cur.execute(WAREHOUSE_DDL.read_text())
+            create_fact_indexes(cur, target)
+
+        # Taken before any row is read; later changes wait for the next run
+        until = {
+            s: watermarks.get_upper_bound(cur, tables, "updated_at", since[s])
+            for s, tables in SOURCE_TABLES.items()
+        }
+        # Dimensions first so the fact merge resolves every surrogate key
+        for dimension, spec in SCD2_DIMENSIONS.items():
+            source = spec["source"]
+            merge_scd2_dimension(cur, dimension, spec, since[source], until[source], target)
+        merge_facts(cur, since["transactions"], until["transactions"], target)
+        merge_customer_metrics(cur, target)
+
+        if full_refresh:
+            create_fact_indexes(cur, target)
+            cur.execute(f"ANALYZE {target}.fact_sales;")
+            schema_swap.validate_shadow(cur, "warehouse", WAREHOUSE_TABLES, REBUILD_CHECKS)
+            schema_swap.swap_in(cur, "warehouse")
+            print("   Swapped the rebuilt schema into warehouse")
+            watermarks.clear_watermarks(cur, "warehouse")
+
+        advanced = advance_watermarks(cur, until)
+        if full_refresh:
+            watermarks.bump_schema_versions(cur, "warehouse")
+        else:
+            watermarks.bump_table_versions(cur, [
+                f"warehouse.{table}" for source in advanced for table in CHANGED_BY_SOURCE[source]
+            ])
 
         conn.commit()
         print("✅ Warehouse Load completed successfully")
@@ -60,7 +391,10 @@ def load():
         raise
     finally:
         cur.close()
-        conn.close()
+        db.release(conn)
 
 if __name__ == "__main__":
-    load()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the warehouse star schema from production.")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Rebuild the warehouse instead of merging changed rows")
+    db.run(load, parser.parse_args().full_refresh)
@@ -0,0 +1,242 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+import yaml
+from scripts import db, watermarks
+
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+ANALYTICAL_QUERIES = ROOT_DIR / "sql" / "queries" / "analytical_queries.sql"
+
+DEFAULT_SETTINGS = {
+    "dir": "data/cache/queries",
+    "max_entries": 256,
+    "max_bytes": 268435456
+}
+
+# A query reading no versioned table has nothing to be invalidated by and is
+# not cached
+VERSIONED_SCHEMAS = watermarks.VERSIONED_SCHEMAS
+
+QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+TABLE_REF = re.compile(rf"\b(?:{'|'.join(VERSIONED_SCHEMAS)})\.[a-z_][a-z0-9_]*\b")
+
+COUNTERS = ["hits", "misses", "invalidations", "bypasses", "evictions"]
+
+def load_settings():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return {**DEFAULT_SETTINGS, **(config.get("query_cache") or {})}
+
+# -----------------------------
+# Keys and dependencies
+# -----------------------------
+def normalize_sql(sql):
+    """
+    Comments dropped, whitespace collapsed and keywords/identifiers
+    lowercased outside quoted literals, so formatting never splits entries.
+    """
+    parts = QUOTED.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = " ".join(COMMENT.sub(" ", parts[i]).lower().split())
+    return "".join(parts).strip().rstrip(";").strip()
+
+def referenced_tables(normalized_sql):
+    unquoted = "".join(QUOTED.split(normalized_sql)[::2])
+    return sorted(set(TABLE_REF.findall(unquoted)))
+
+def cache_key(normalized_sql, params):
+    return hashlib.sha256(json.dumps([normalized_sql, params], default=str).encode()).hexdigest()
+
+# -----------------------------
+# Store
+# -----------------------------
+# One pickle per (normalized SQL, params) holding the result and the load
+# versions it was read at; a file's mtime is its last use, for LRU eviction.
+# stats.json holds the counters the monitor reports, updated under a lock
+# shared by every process using the same cache directory.
+@contextmanager
+def locked(cache_dir):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(cache_dir / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+def read_stats(cache_dir):
+    path = cache_dir / "stats.json"
+    if not path.exists():
+        return {**{c: 0 for c in COUNTERS}, "hit_ms_total": 0.0, "miss_ms_total": 0.0}
+    with open(path) as f:
+        return json.load(f)
+
+def record(cache_dir, event, latency_ms, evictions=0):
+    with locked(cache_dir):
+        stats = read_stats(cache_dir)
+        stats[event] += 1
+        stats["evictions"] += evictions
+        if event == "hits":
+            stats["hit_ms_total"] += latency_ms
+        else:
+            stats["miss_ms_total"] += latency_ms
+        stats["updated_at"] = datetime.now().isoformat()
+        tmp = cache_dir / "stats.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(stats, f, indent=4)
+        os.replace(tmp, cache_dir / "stats.json")
+
+def entries(cache_dir):
+    """Cache files, least recently used first."""
+    files = [(p, p.stat()) for p in cache_dir.glob("*.pkl")]
+    return sorted(files, key=lambda f: f[1].st_mtime_ns)
+
+def evict(cache_dir, settings):
+    """Drop least recently used entries until the cache is within both bounds."""
+    with locked(cache_dir):
+        files = entries(cache_dir)
+        total = sum(stat.st_size for _, stat in files)
+        evicted = 0
+        while files and (len(files) > settings["max_entries"] or total > settings["max_bytes"]):
+            path, stat = files.pop(0)
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            evicted += 1
+    return evicted
+
+def write_entry(path, entry):
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def read_entry(path):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        # Evicted or replaced by another process meanwhile
+        return None
+
+# -----------------------------
+# Lookup
+# -----------------------------
+def cached_query(cur, sql, params=None, settings=None):
+    """
+    Run a read query through the cache. An entry is served only while every
+    versioned table the query reads still has the load version the entry
+    was read at. Returns {"columns", "rows", "status", "latency_ms"} with
+    status hit, miss (first read or invalidated) or bypass (not cacheable).
+    """
+    settings = settings or load_settings()
+    cache_dir = Path(settings["dir"])
+    start = time.perf_counter()
+
+    normalized = normalize_sql(sql)
+    tables = referenced_tables(normalized)
+    if not tables:
+        cur.execute(sql, params)
+        result = {"columns": [d[0] for d in cur.description], "rows": cur.fetchall(), "status": "bypass"}
+        event = "bypasses"
+    else:
+        # Versions are read before the query: a load committing in between
+        # leaves newer rows under older versions, which the next lookup
+        # treats as stale, never the other way round
+        versions = watermarks.get_table_versions(cur, tables)
+        path = cache_dir / f"{cache_key(normalized, params)}.pkl"
+        entry = read_entry(path)
+
+        if entry is not None and entry["versions"] == versions:
+            os.utime(path)
+            result = {"columns": entry["columns"], "rows": entry["rows"], "status": "hit"}
+            event = "hits"
+        else:
+            cur.execute(sql, params)
+            result = {"columns": [d[0] for d in cur.description], "rows": cur.fetchall(), "status": "miss"}
+            event = "misses" if entry is None else "invalidations"
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            write_entry(path, {
+                "sql": normalized,
+                "params": params,
+                "versions": versions,
+                "columns": result["columns"],
+                "rows": result["rows"],
+                "cached_at": datetime.now().isoformat()
+            })
+
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    evicted = evict(cache_dir, settings) if result["status"] == "miss" else 0
+    record(cache_dir, event, result["latency_ms"], evicted)
+    return result
+
+def cache_stats(settings=None):
+    """Counters, hit rate, mean latencies and current size of the cache."""
+    settings = settings or load_settings()
+    cache_dir = Path(settings["dir"])
+    if not (cache_dir / "stats.json").exists():
+        return None
+    with locked(cache_dir):
+        stats = read_stats(cache_dir)
+        files = entries(cache_dir)
+
+    misses = stats["misses"] + stats["invalidations"]
+    lookups = stats["hits"] + misses
+    return {
+        **{c: stats[c] for c in COUNTERS},
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+        "avg_hit_ms": round(stats["hit_ms_total"] / stats["hits"], 2) if stats["hits"] else None,
+        "avg_miss_ms": round(stats["miss_ms_total"] / (misses + stats["bypasses"]), 2)
+        if misses + stats["bypasses"] else None,
+        "entries": len(files),
+        "bytes": sum(stat.st_size for _, stat in files),
+        "max_entries": settings["max_entries"],
+        "max_bytes": settings["max_bytes"],
+        "updated_at": stats.get("updated_at")
+    }
+
+def clear(settings=None):
+    settings = settings or load_settings()
+    cache_dir = Path(settings["dir"])
+    with locked(cache_dir):
+        for path, _ in entries(cache_dir):
+            path.unlink(missing_ok=True)
+        (cache_dir / "stats.json").unlink(missing_ok=True)
+
+def split_statements(sql_text):
+    """The statements of a SQL file (no semicolons inside literals or comments)."""
+    return [s.strip() for s in COMMENT.sub("", sql_text).split(";") if s.strip()]
+
+def main(sql_file, clear_first=False):
+    settings = load_settings()
+    if clear_first:
+        clear(settings)
+
+    conn = db.connect("query_cache")
+    try:
+        with conn, conn.cursor() as cur:
+            for i, sql in enumerate(split_statements(Path(sql_file).read_text()), start=1):
+                result = cached_query(cur, sql, settings=settings)
+                print(f"   query {i}: {result['status']}, {len(result['rows'])} rows in {result['latency_ms']} ms")
+    finally:
+        db.release(conn)
+
+    print(f"✅ Query cache: {json.dumps(cache_stats(settings))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a SQL file's queries through the query result cache.")
+    parser.add_argument("sql_file", nargs="?", default=str(ANALYTICAL_QUERIES))
+    parser.add_argument("--clear", action="store_true", help="Empty the cache and its counters first")
+    args = parser.parse_args()
+    db.run(main, args.sql_file, args.clear)
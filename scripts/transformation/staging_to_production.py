@@ -1,62 +1,392 @@
-import psycopg2
-import os
-from sqlalchemy import create_engine, text
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on PYTHONPATH
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+from scripts import db, partitions, schema_swap, watermarks
+
+PRODUCTION_DDL = ROOT_DIR / "sql" / "ddl" / "create_production_schema.sql"
+SUMMARY_PATH = Path("data/processed/production_summary.json")
+
+STAGING_TABLES = ["customers", "products", "transactions", "transaction_items"]
+
+# How each production table is derived from staging, in load order (parents
+# before the tables referencing them):
+#   columns:   production column -> cleansing/casting expression over the
+#              staging row s; the latest version per key wins (DISTINCT ON)
+#   lookups:   joins against the target schema ({schema}) used by derived
+#              columns and rules
+#   derived:   production columns taken from a lookup
+#   rules:     (reason, condition) over the cleansed row c and the lookups;
+#              a row is rejected with the first reason whose condition holds
+#   conflict:  upsert key (partitioned tables include the partition key)
+#   reload:    join selecting extra staging rows to re-derive besides those
+#              past the watermark
+TABLE_SPECS = {
+    "customers": {
+        "key": "customer_id",
+        "columns": {
+            "customer_id": "NULLIF(TRIM(s.customer_id), '')",
+            "first_name": "NULLIF(TRIM(s.first_name), '')",
+            "last_name": "NULLIF(TRIM(s.last_name), '')",
+            "email": "LOWER(NULLIF(TRIM(s.email), ''))",
+            "phone": "NULLIF(TRIM(s.phone), '')",
+            "registration_date": "s.registration_date",
+            "city": "NULLIF(TRIM(s.city), '')",
+            "state": "NULLIF(TRIM(s.state), '')",
+            "country": "NULLIF(TRIM(s.country), '')",
+            "age_group": "NULLIF(TRIM(s.age_group), '')"
+        },
+        # Another customer already owns the email
+        "lookups": "LEFT JOIN {schema}.customers e ON e.email = c.email AND e.customer_id <> c.customer_id",
+        "rules": [
+            ("missing_key", "c.customer_id IS NULL"),
+            ("missing_name", "c.first_name IS NULL OR c.last_name IS NULL"),
+            ("invalid_email", "c.email IS NULL OR c.email !~ '^[^@[:space:]]+@[^@[:space:]]+[.][^@[:space:]]+$'"),
+            ("duplicate_email", """
+                e.customer_id IS NOT NULL
+                OR c.customer_id <> MIN(c.customer_id) OVER (PARTITION BY c.email)
+            """)
+        ],
+        "conflict": "customer_id"
+    },
+    "products": {
+        "key": "product_id",
+        "columns": {
+            "product_id": "NULLIF(TRIM(s.product_id), '')",
+            "product_name": "NULLIF(TRIM(s.product_name), '')",
+            "category": "NULLIF(TRIM(s.category), '')",
+            "sub_category": "NULLIF(TRIM(s.sub_category), '')",
+            "price": "ROUND(s.price, 2)::DECIMAL(10,2)",
+            "cost": "ROUND(s.cost, 2)::DECIMAL(10,2)",
+            "brand": "NULLIF(TRIM(s.brand), '')",
+            "stock_quantity": "s.stock_quantity",
+            "supplier_id": "NULLIF(TRIM(s.supplier_id), '')"
+        },
+        "rules": [
+            ("missing_key", "c.product_id IS NULL"),
+            ("missing_name", "c.product_name IS NULL"),
+            ("negative_price", "c.price < 0 OR c.cost < 0"),
+            ("negative_stock", "c.stock_quantity < 0")
+        ],
+        "conflict": "product_id"
+    },
+    "transactions": {
+        "key": "transaction_id",
+        "columns": {
+            "transaction_id": "NULLIF(TRIM(s.transaction_id), '')",
+            "customer_id": "NULLIF(TRIM(s.customer_id), '')",
+            "transaction_date": "s.transaction_date",
+            "transaction_time": "s.transaction_time",
+            "payment_method": "COALESCE(NULLIF(TRIM(s.payment_method), ''), 'Unknown')",
+            "shipping_address": "NULLIF(TRIM(s.shipping_address), '')",
+            "total_amount": "ROUND(s.total_amount, 2)::DECIMAL(12,2)"
+        },
+        "lookups": "LEFT JOIN {schema}.customers cu ON cu.customer_id = c.customer_id",
+        "rules": [
+            ("missing_key", "c.transaction_id IS NULL"),
+            ("missing_date", "c.transaction_date IS NULL"),
+            ("future_date", "c.transaction_date > CURRENT_DATE"),
+            ("negative_amount", "c.total_amount < 0"),
+            ("unknown_customer", "cu.customer_id IS NULL")
+        ],
+        "conflict": "transaction_id, transaction_date"
+    },
+    "transaction_items": {
+        "key": "item_id",
+        "columns": {
+            "item_id": "NULLIF(TRIM(s.item_id), '')",
+            "transaction_id": "NULLIF(TRIM(s.transaction_id), '')",
+            "product_id": "NULLIF(TRIM(s.product_id), '')",
+            "quantity": "s.quantity",
+            "unit_price": "ROUND(s.unit_price, 2)::DECIMAL(10,2)",
+            "discount_percentage": "COALESCE(s.discount_percentage, 0)",
+            "line_total": "ROUND(s.line_total, 2)::DECIMAL(12,2)"
+        },
+        "lookups": """
+            LEFT JOIN {schema}.transactions t ON t.transaction_id = c.transaction_id
+            LEFT JOIN {schema}.products p ON p.product_id = c.product_id
+        """,
+        "derived": {"transaction_date": "t.transaction_date"},
+        "rules": [
+            ("missing_key", "c.item_id IS NULL"),
+            ("invalid_quantity", "c.quantity IS NULL OR c.quantity <= 0"),
+            ("invalid_price", "c.unit_price IS NULL OR c.unit_price < 0"),
+            ("invalid_discount", "c.discount_percentage NOT BETWEEN 0 AND 100"),
+            ("invalid_line_total", "c.line_total IS NULL OR c.line_total < 0"),
+            ("unknown_transaction", "t.transaction_id IS NULL"),
+            ("unknown_product", "p.product_id IS NULL")
+        ],
+        "conflict": "item_id, transaction_date",
+        # Items of reloaded transactions follow them (their date may have moved)
+        "reload": """
+            JOIN pg_temp.incoming_transactions t
+              ON t.transaction_id = TRIM(s.transaction_id) AND t.reject_reason IS NULL
+        """
+    }
+}
+
+# Month-partitioned tables: a row whose partition key changed is deleted
+# before the upsert instead of being duplicated in another partition
+PARTITIONED_TABLES = {"transactions": "transaction_date", "transaction_items": "transaction_date"}
+
+EPOCH = "1970-01-01"
+
+# Checked on a rebuilt schema before it is swapped in (0 = pass)
+REBUILD_CHECKS = {
+    "items_without_transaction": """
+        SELECT COUNT(*) FROM {shadow}.transaction_items i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {shadow}.transactions t
+            WHERE t.transaction_id = i.transaction_id AND t.transaction_date = i.transaction_date
+        );
+    """,
+    "duplicate_transactions": """
+        SELECT COUNT(*) - COUNT(DISTINCT transaction_id) FROM {shadow}.transactions;
+    """
+}
 
 # -----------------------------
-# Database config
+# Schema
 # -----------------------------
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "postgres"),
-    "port": os.getenv("DB_PORT", "5432"),
-    "dbname": os.getenv("DB_NAME", "ecommerce_db"),
-    "user": os.getenv("DB_USER", "admin"),
-    "password": os.getenv("DB_PASSWORD", "password")
-}
+def production_exists(cur):
+    # The old denormalized layout (one wide transactions table), and a
+    # rejected_rows without its unique key (duplicates left by earlier
+    # versions), are rebuilt rather than merged into
+    cur.execute("""
+        SELECT COUNT(*) FROM pg_partitioned_table
+        WHERE partrelid IN (
+            to_regclass('production.transactions'),
+            to_regclass('production.transaction_items')
+        );
+    """)
+    partitioned = cur.fetchone()[0] == 2
+    cur.execute("SELECT to_regclass('production.idx_rejected_rows_key') IS NOT NULL;")
+    return partitioned and cur.fetchone()[0]
+
+# -----------------------------
+# Set-based transform
+# -----------------------------
+def incoming_table(table):
+    # Session-private: never WAL-logged, never seen by other connections
+    return f"pg_temp.incoming_{table}"
+
+def build_incoming(cur, table, spec, since, until, schema):
+    """
+    One pass over the staging rows past the watermark (up to the run's
+    upper bound): cleanse and cast
+    every column, keep the latest version per business key and evaluate
+    the rules, into a temporary intermediate table.
+    """
+    key = spec["columns"][spec["key"]]
+    cleansed = ", ".join(f"{expr} AS {column}" for column, expr in spec["columns"].items())
+    derived = "".join(f", {expr} AS {column}" for column, expr in spec.get("derived", {}).items())
+    reasons = " ".join(f"WHEN {condition} THEN '{reason}'" for reason, condition in spec["rules"])
+    rows = f"SELECT s.* FROM staging.{table} s WHERE s.loaded_at > %(since)s AND s.loaded_at <= %(until)s"
+    if "reload" in spec:
+        # A branch of its own (disjoint from the first) rather than an OR,
+        # which would scan all of staging's history instead of using the
+        # loaded_at and reload join indexes
+        rows += f"""
+            UNION ALL
+            SELECT s.* FROM staging.{table} s {spec["reload"]}
+            WHERE s.loaded_at <= %(since)s
+        """
+
+    cur.execute(f"DROP TABLE IF EXISTS {incoming_table(table)};")
+    cur.execute(f"""
+        CREATE TEMP TABLE incoming_{table} AS
+        SELECT c.*{derived}, CASE {reasons} END AS reject_reason
+        FROM (
+            SELECT DISTINCT ON ({key})
+                {cleansed},
+                s.loaded_at,
+                COUNT(*) OVER (PARTITION BY {key}) AS versions
+            FROM ({rows}) s
+            ORDER BY {key}, s.loaded_at DESC
+        ) c
+        {spec.get("lookups", "").format(schema=schema)};
+    """, {"since": since, "until": until})
+    # Fresh tables have no statistics; the routing and upsert joins need them
+    cur.execute(f"ANALYZE {incoming_table(table)};")
+
+def reject_rows(cur, table, spec, schema):
+    # A key already rejected for the same reason keeps its first record
+    cur.execute(f"""
+        INSERT INTO {schema}.rejected_rows (source_table, business_key, reason, record, loaded_at)
+        SELECT %s, {spec["key"]}, reject_reason,
+               to_jsonb(i) - 'reject_reason' - 'versions' - 'loaded_at', loaded_at
+        FROM {incoming_table(table)} i
+        WHERE reject_reason IS NOT NULL
+        ON CONFLICT (source_table, COALESCE(business_key, ''), reason) DO NOTHING;
+    """, (table,))
 
-def transform():
-    conn = psycopg2.connect(**DB_CONFIG)
+def upsert_accepted(cur, table, spec, schema):
+    columns = list(spec["columns"]) + list(spec.get("derived", {}))
+    column_list = ", ".join(columns)
+    conflict = [c.strip() for c in spec["conflict"].split(",")]
+    updates = [c for c in columns if c not in conflict]
+
+    partition_key = PARTITIONED_TABLES.get(table)
+    if partition_key:
+        partitions.ensure_month_partitions(
+            cur, schema, table,
+            partitions.months_in(
+                cur, f"SELECT {partition_key} FROM {incoming_table(table)} WHERE reject_reason IS NULL"
+            )
+        )
+        cur.execute(f"""
+            DELETE FROM {schema}.{table} p
+            USING {incoming_table(table)} i
+            WHERE i.reject_reason IS NULL
+              AND p.{spec["key"]} = i.{spec["key"]}
+              AND p.{partition_key} <> i.{partition_key};
+        """)
+
+    # Unchanged rows are left alone, so updated_at only moves for real changes
+    cur.execute(f"""
+        INSERT INTO {schema}.{table} AS p ({column_list})
+        SELECT {column_list}
+        FROM {incoming_table(table)}
+        WHERE reject_reason IS NULL
+        ON CONFLICT ({spec["conflict"]}) DO UPDATE SET
+            {", ".join(f"{c} = EXCLUDED.{c}" for c in updates)},
+            updated_at = CURRENT_TIMESTAMP
+        WHERE ROW({", ".join(f"p.{c}" for c in updates)})
+              IS DISTINCT FROM ROW({", ".join(f"EXCLUDED.{c}" for c in updates)});
+    """)
+    return cur.rowcount
+
+def incoming_stats(cur, table):
+    cur.execute(f"""
+        SELECT COALESCE(SUM(versions), 0)::BIGINT, COUNT(*),
+               COUNT(*) FILTER (WHERE reject_reason IS NOT NULL)
+        FROM {incoming_table(table)};
+    """)
+    rows_in, latest, rejected = cur.fetchone()
+    cur.execute(f"""
+        SELECT reject_reason, COUNT(*)
+        FROM {incoming_table(table)}
+        WHERE reject_reason IS NOT NULL
+        GROUP BY reject_reason;
+    """)
+    return {
+        "rows_in": rows_in,
+        "duplicates": rows_in - latest,
+        "rows_out": latest - rejected,
+        "rows_rejected": rejected,
+        "rejected_by_reason": dict(cur.fetchall())
+    }
+
+def transform_tables(cur, since, schema="production", until=None):
+    """
+    Derive every production table (in schema) from its staging rows past
+    the watermark, up to until (by default the latest loaded now):
+    accepted rows are upserted and rejected ones recorded in the same pass.
+    Returns per-table row counts and durations.
+    """
+    until = until or staging_bounds(cur, since)
+    results = {}
+    try:
+        for table, spec in TABLE_SPECS.items():
+            start = time.perf_counter()
+            build_incoming(cur, table, spec, since[table], until[table], schema)
+            reject_rows(cur, table, spec, schema)
+            changed = upsert_accepted(cur, table, spec, schema)
+            results[table] = {
+                **incoming_stats(cur, table),
+                "rows_changed": changed,
+                "duration_seconds": round(time.perf_counter() - start, 3)
+            }
+            r = results[table]
+            print(f"   {schema}.{table}: {r['rows_in']} in, {r['rows_out']} out "
+                  f"({r['rows_changed']} changed), {r['rows_rejected']} rejected")
+    finally:
+        for table in TABLE_SPECS:
+            cur.execute(f"DROP TABLE IF EXISTS {incoming_table(table)};")
+    return results
+
+def write_summary(full_refresh, results, total_seconds):
+    SUMMARY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(SUMMARY_PATH, "w") as f:
+        json.dump({
+            "transformation_timestamp": datetime.now().isoformat(),
+            "load_mode": "full" if full_refresh else "incremental",
+            "tables": results,
+            "total_rows_rejected": sum(r["rows_rejected"] for r in results.values()),
+            "total_execution_time_seconds": round(total_seconds, 2)
+        }, f, indent=2)
+
+def staging_bounds(cur, since):
+    """Upper bound of each staging table's rows this run transforms."""
+    return {
+        table: watermarks.get_upper_bound(cur, [f"staging.{table}"], "loaded_at", since.get(table) or EPOCH)
+        for table in STAGING_TABLES
+    }
+
+def advance_watermarks(cur, until):
+    for table, latest in until.items():
+        if latest is not None:
+            watermarks.set_watermark(cur, "production", table, high_water_mark=latest)
+
+def transform(full_refresh=None):
+    full_refresh = watermarks.is_full_refresh(full_refresh)
+    conn = db.connect("production")
     cur = conn.cursor()
 
     try:
         print("🔄 Starting Staging -> Production transformation...")
-        
-        cur.execute("CREATE SCHEMA IF NOT EXISTS production;")
-
-        # -----------------------------
-        # 1. Copy Customers & Products (Clean Copy)
-        # -----------------------------
-        cur.execute("DROP TABLE IF EXISTS production.customers;")
-        cur.execute("CREATE TABLE production.customers AS SELECT * FROM staging.customers;")
-        
-        cur.execute("DROP TABLE IF EXISTS production.products;")
-        cur.execute("CREATE TABLE production.products AS SELECT * FROM staging.products;")
-
-        # -----------------------------
-        # 2. Create ONE Master Transaction Table (The Fix)
-        # -----------------------------
-        print("   Creating production.transactions (Denormalized)...")
-        cur.execute("DROP TABLE IF EXISTS production.transactions;")
-        
-        # We join Items + Transactions + Customers
-        # This creates a single table with email, product_id, and price all in one row.
-        cur.execute("""
-            CREATE TABLE production.transactions AS
-            SELECT 
-                ti.item_id,
-                ti.transaction_id,
-                ti.product_id,
-                ti.quantity,
-                ti.unit_price,
-                ti.line_total,
-                t.transaction_date,
-                c.customer_id,
-                c.email AS customer_email
-            FROM staging.transaction_items ti
-            JOIN staging.transactions t ON ti.transaction_id = t.transaction_id
-            JOIN staging.customers c ON t.customer_id = c.customer_id;
-        """)
+        start = time.perf_counter()
+
+        watermarks.ensure_table(cur)
+        since = {t: watermarks.get_high_water_mark(cur, "production", t) for t in STAGING_TABLES}
+        rebuild = full_refresh or not production_exists(cur) or None in since.values()
+
+        if rebuild:
+            # Built in the shadow schema while readers keep using production
+            target = schema_swap.prepare_shadow(cur, "production")
+            print(f"   Full rebuild of production schema (in {target})")
+            cur.execute(schema_swap.retarget_ddl(PRODUCTION_DDL, "production", target))
+            since = {}
+        else:
+            target = "production"
+            print("   Incremental merge into production schema")
+            cur.execute(PRODUCTION_DDL.read_text())
+
+        # Taken before any row is read; later loads wait for the next run
+        until = staging_bounds(cur, since)
+        results = transform_tables(cur, {t: since.get(t) or EPOCH for t in STAGING_TABLES}, target, until)
+
+        if rebuild:
+            # Autovacuum never analyzes partitioned parents
+            for table in TABLE_SPECS:
+                cur.execute(f"ANALYZE {target}.{table};")
+            schema_swap.validate_shadow(cur, "production", TABLE_SPECS, REBUILD_CHECKS)
+            schema_swap.swap_in(cur, "production")
+            print("   Swapped the rebuilt schema into production")
+            watermarks.clear_watermarks(cur, "production")
+            # Rows missing from the rebuilt tables never reach the warehouse
+            # as changes, so its next load has to be a rebuild too
+            watermarks.clear_watermarks(cur, "warehouse")
+
+        advance_watermarks(cur, until)
+        # New load versions for the query cache
+        if rebuild:
+            watermarks.bump_schema_versions(cur, "production")
+        else:
+            changed = [t for t, r in results.items() if r["rows_changed"]]
+            if any(r["rows_rejected"] for r in results.values()):
+                changed.append("rejected_rows")
+            watermarks.bump_table_versions(cur, [f"production.{t}" for t in changed])
 
         conn.commit()
+        write_summary(rebuild, results, time.perf_counter() - start)
         print("✅ Staging → Production completed successfully")
 
     except Exception as e:
@@ -65,7 +395,10 @@ def transform():
         raise
     finally:
         cur.close()
-        conn.close()
+        db.release(conn)
 
 if __name__ == "__main__":
-    transform()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Transform staging into production.")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Rebuild production tables instead of merging new staging rows")
+    db.run(transform, parser.parse_args().full_refresh)
@@ -0,0 +1,136 @@
+from pathlib import Path
+
+import yaml
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+CONFIG_PATH = ROOT_DIR / "config" / "config.yaml"
+STATE_DDL = ROOT_DIR / "sql" / "ddl" / "create_pipeline_state.sql"
+
+# Schemas whose tables carry a load version (public.table_versions): every
+# step that changes one of their tables bumps its version
+VERSIONED_SCHEMAS = ["production", "warehouse", "analytics"]
+
+def is_full_refresh(full_refresh=None):
+    """An explicit --full-refresh wins; otherwise follow pipeline.load_mode."""
+    if full_refresh:
+        return True
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return config.get("pipeline", {}).get("load_mode", "full") == "full"
+
+def ensure_table(cur):
+    cur.execute(STATE_DDL.read_text())
+
+def get_watermarks(cur, layer, table_name):
+    """Return {source: row} for every watermark recorded for a table."""
+    cur.execute("""
+        SELECT source, high_water_mark, byte_offset, checksum, rows_loaded
+        FROM public.pipeline_watermarks
+        WHERE layer = %s AND table_name = %s;
+    """, (layer, table_name))
+    return {
+        source: {
+            "high_water_mark": hwm,
+            "byte_offset": offset,
+            "checksum": checksum,
+            "rows_loaded": rows
+        }
+        for source, hwm, offset, checksum, rows in cur.fetchall()
+    }
+
+def get_high_water_mark(cur, layer, table_name):
+    row = get_watermarks(cur, layer, table_name).get("")
+    return row["high_water_mark"] if row else None
+
+def set_watermark(cur, layer, table_name, source="", high_water_mark=None,
+                  byte_offset=None, checksum=None, rows_loaded=None):
+    cur.execute("""
+        INSERT INTO public.pipeline_watermarks
+            (layer, table_name, source, high_water_mark, byte_offset, checksum, rows_loaded)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (layer, table_name, source) DO UPDATE SET
+            high_water_mark = EXCLUDED.high_water_mark,
+            byte_offset = EXCLUDED.byte_offset,
+            checksum = EXCLUDED.checksum,
+            rows_loaded = EXCLUDED.rows_loaded,
+            updated_at = CURRENT_TIMESTAMP;
+    """, (layer, table_name, source, high_water_mark, byte_offset, checksum, rows_loaded))
+
+def get_upper_bound(cur, tables, column, since):
+    """
+    Latest value of column past since over tables. Read once when a load
+    starts: the load then processes (since, bound] and records the bound as
+    its watermark, so rows arriving meanwhile are left for the next run.
+    """
+    latest = None
+    for table in tables:
+        cur.execute(f"SELECT MAX({column}) FROM {table} WHERE {column} > %s;", (since,))
+        latest = max(filter(None, [latest, cur.fetchone()[0]]), default=None)
+    return latest
+
+def clear_watermarks(cur, layer, table_name=None):
+    if table_name is None:
+        cur.execute("DELETE FROM public.pipeline_watermarks WHERE layer = %s;", (layer,))
+    else:
+        cur.execute(
+            "DELETE FROM public.pipeline_watermarks WHERE layer = %s AND table_name = %s;",
+            (layer, table_name)
+        )
+
+def get_table_versions(cur, tables):
+    """Return {table: version} for schema-qualified table names (0 if never loaded)."""
+    cur.execute("SELECT table_name, version FROM public.table_versions WHERE table_name = ANY(%s);",
+                (list(tables),))
+    versions = dict(cur.fetchall())
+    return {table: versions.get(table, 0) for table in tables}
+
+def get_schema_versions(cur, schema):
+    """Return {table: version} for every table of a schema that was ever loaded."""
+    cur.execute("""
+        SELECT table_name, version FROM public.table_versions
+        WHERE split_part(table_name, '.', 1) = %s
+        ORDER BY table_name;
+    """, (schema,))
+    return dict(cur.fetchall())
+
+def bump_table_versions(cur, tables):
+    """Give tables a new load version; call in the transaction that changed them."""
+    cur.execute("""
+        INSERT INTO public.table_versions (table_name, version)
+        SELECT UNNEST(%s::TEXT[]), 1
+        ON CONFLICT (table_name) DO UPDATE SET
+            version = public.table_versions.version + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    """, (sorted(set(tables)),))
+
+def bump_schema_versions(cur, schema):
+    """New load version for every table of a schema that was swapped, rolled back or rebuilt."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition;
+    """, (schema,))
+    bump_table_versions(cur, [f"{schema}.{table}" for table, in cur.fetchall()])
+
+def get_checkpoints(cur, step, plan_key):
+    """Return {unit: rows_done} committed by an unfinished run of the same plan."""
+    cur.execute("""
+        SELECT unit, rows_done
+        FROM public.pipeline_checkpoints
+        WHERE step = %s AND plan_key = %s;
+    """, (step, plan_key))
+    return dict(cur.fetchall())
+
+def set_checkpoint(cur, step, unit, plan_key, rows_done=None):
+    cur.execute("""
+        INSERT INTO public.pipeline_checkpoints (step, unit, plan_key, rows_done)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (step, unit) DO UPDATE SET
+            plan_key = EXCLUDED.plan_key,
+            rows_done = EXCLUDED.rows_done,
+            completed_at = CURRENT_TIMESTAMP;
+    """, (step, unit, plan_key, rows_done))
+
+def clear_checkpoints(cur, step):
+    cur.execute("DELETE FROM public.pipeline_checkpoints WHERE step = %s;", (step,))
@@ -0,0 +1,101 @@
+-- ============================
+-- CREATE ANALYTICS SCHEMA
+-- ============================
+-- Additive aggregates of warehouse.fact_sales, one row set per month
+-- (month_key = YYYYMM, 0 for facts without a date). A refresh replaces only
+-- the months a warehouse load touched; the analytical query tables are then
+-- rebuilt from these instead of from the fact table.
+CREATE SCHEMA IF NOT EXISTS analytics;
+
+-- ============================
+-- SALES BY PRODUCT
+-- ============================
+CREATE TABLE IF NOT EXISTS analytics.monthly_product_sales (
+    month_key INTEGER NOT NULL,
+    product_key INTEGER,
+    revenue DECIMAL(14,2),
+    units_sold BIGINT,
+    line_count BIGINT,
+    unit_price_sum DECIMAL(14,2),
+    profit DECIMAL(14,2)
+);
+
+-- ============================
+-- SALES BY CUSTOMER
+-- ============================
+CREATE TABLE IF NOT EXISTS analytics.monthly_customer_sales (
+    month_key INTEGER NOT NULL,
+    customer_key INTEGER,
+    revenue DECIMAL(14,2),
+    line_count BIGINT,
+    transaction_count BIGINT
+);
+
+-- ============================
+-- SALES BY DAY
+-- ============================
+CREATE TABLE IF NOT EXISTS analytics.daily_sales (
+    month_key INTEGER NOT NULL,
+    date_key INTEGER,
+    revenue DECIMAL(14,2),
+    line_count BIGINT,
+    transaction_count BIGINT
+);
+
+-- ============================
+-- SALES BY DAY AND CATEGORY
+-- ============================
+CREATE TABLE IF NOT EXISTS analytics.daily_category_sales (
+    month_key INTEGER NOT NULL,
+    date_key INTEGER,
+    category VARCHAR(100),
+    revenue DECIMAL(14,2),
+    line_count BIGINT
+);
+
+-- ============================
+-- SALES BY HOUR
+-- ============================
+-- Hour in which the sales took place (sale date + transaction_time), so
+-- reloading facts never moves them. Replaces hourly_sales, which was keyed
+-- on the hour the facts were loaded.
+DROP TABLE IF EXISTS analytics.hourly_sales;
+
+CREATE TABLE IF NOT EXISTS analytics.sales_by_hour (
+    month_key INTEGER NOT NULL,
+    sale_hour TIMESTAMP,
+    revenue DECIMAL(14,2),
+    line_count BIGINT
+);
+
+-- ============================
+-- SALES BY PAYMENT METHOD
+-- ============================
+CREATE TABLE IF NOT EXISTS analytics.monthly_payment_sales (
+    month_key INTEGER NOT NULL,
+    payment_method_key INTEGER,
+    revenue DECIMAL(14,2),
+    line_count BIGINT
+);
+
+-- ============================
+-- SALES BY DISCOUNT RANGE
+-- ============================
+CREATE TABLE IF NOT EXISTS analytics.monthly_discount_sales (
+    month_key INTEGER NOT NULL,
+    discount_range VARCHAR(10),
+    revenue DECIMAL(14,2),
+    quantity BIGINT,
+    line_count BIGINT
+);
+
+-- ============================
+-- INDEXES
+-- ============================
+CREATE INDEX IF NOT EXISTS monthly_product_sales_month_idx ON analytics.monthly_product_sales(month_key);
+CREATE INDEX IF NOT EXISTS monthly_customer_sales_month_idx ON analytics.monthly_customer_sales(month_key);
+CREATE INDEX IF NOT EXISTS daily_sales_month_idx ON analytics.daily_sales(month_key);
+CREATE INDEX IF NOT EXISTS daily_category_sales_month_idx ON analytics.daily_category_sales(month_key);
+CREATE INDEX IF NOT EXISTS sales_by_hour_month_idx ON analytics.sales_by_hour(month_key);
+CREATE INDEX IF NOT EXISTS monthly_payment_sales_month_idx ON analytics.monthly_payment_sales(month_key);
+CREATE INDEX IF NOT EXISTS monthly_discount_sales_month_idx ON analytics.monthly_discount_sales(month_key);
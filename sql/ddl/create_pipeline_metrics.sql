@@ -0,0 +1,34 @@
+-- ============================
+-- PIPELINE METRICS
+-- ============================
+
+-- One row per orchestrator execution (a resumed execution updates its row).
+CREATE TABLE IF NOT EXISTS public.pipeline_execution_log (
+    execution_id VARCHAR(50) PRIMARY KEY,
+    start_time TIMESTAMP,
+    end_time TIMESTAMP,
+    status VARCHAR(20),
+    total_duration_seconds NUMERIC(12,2),
+    full_refresh BOOLEAN,
+    execution_mode VARCHAR(20),
+    steps_run INT,
+    steps_cached INT,
+    steps_failed INT,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Append-only samples recorded at the end of every execution: step
+-- durations, retries and resources, rows and throughput per table, quality
+-- scores. Compare runs by metric and labels over recorded_at.
+CREATE TABLE IF NOT EXISTS public.pipeline_metrics (
+    execution_id VARCHAR(50) NOT NULL,
+    metric VARCHAR(100) NOT NULL,
+    labels JSONB NOT NULL DEFAULT '{}',
+    value DOUBLE PRECISION,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS pipeline_metrics_metric_idx
+    ON public.pipeline_metrics (metric, recorded_at);
+CREATE INDEX IF NOT EXISTS pipeline_metrics_execution_idx
+    ON public.pipeline_metrics (execution_id);
@@ -0,0 +1,40 @@
+-- ============================
+-- PIPELINE STATE
+-- ============================
+
+-- High-water marks for incremental loads. Ingestion keeps one row per raw
+-- file (byte offset + checksum of the bytes before it); the production and
+-- warehouse steps keep one row per upstream table (max loaded_at/updated_at
+-- already processed).
+CREATE TABLE IF NOT EXISTS public.pipeline_watermarks (
+    layer VARCHAR(20) NOT NULL,
+    table_name VARCHAR(50) NOT NULL,
+    source TEXT NOT NULL DEFAULT '',
+    high_water_mark TIMESTAMP,
+    byte_offset BIGINT,
+    checksum VARCHAR(64),
+    rows_loaded BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (layer, table_name, source)
+);
+
+-- Units of work a step has committed towards a plan it has not finished
+-- (e.g. the COPY chunks of an interrupted ingestion). A rerun with the same
+-- plan_key skips these; finishing the step clears them.
+CREATE TABLE IF NOT EXISTS public.pipeline_checkpoints (
+    step VARCHAR(50) NOT NULL,
+    unit TEXT NOT NULL,
+    plan_key VARCHAR(64) NOT NULL,
+    rows_done BIGINT,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (step, unit)
+);
+
+-- Load version of every table the query cache can depend on. The step that
+-- changes a table bumps its version in the same transaction, so cached
+-- results read from an older version are never served again.
+CREATE TABLE IF NOT EXISTS public.table_versions (
+    table_name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
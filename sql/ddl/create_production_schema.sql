@@ -3,6 +3,9 @@ CREATE SCHEMA IF NOT EXISTS production;
 -- ============================
 -- PRODUCTION TABLES (3NF)
 -- ============================
+-- Loaded by scripts/transformation/staging_to_production.py, which cleanses
+-- and deduplicates staging in SQL and routes rows that would violate these
+-- constraints to production.rejected_rows instead.
 
 CREATE TABLE IF NOT EXISTS production.customers (
     customer_id VARCHAR(20) PRIMARY KEY,
@@ -33,24 +36,29 @@ CREATE TABLE IF NOT EXISTS production.products (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Transactions and their items are range-partitioned by month of
+-- transaction_date; keys of partitioned tables must include the partition
+-- key, so items carry their transaction's date.
 CREATE TABLE IF NOT EXISTS production.transactions (
-    transaction_id VARCHAR(20) PRIMARY KEY,
+    transaction_id VARCHAR(20) NOT NULL,
     customer_id VARCHAR(20) NOT NULL,
-    transaction_date DATE,
+    transaction_date DATE NOT NULL,
     transaction_time TIME,
     payment_method VARCHAR(50),
     shipping_address TEXT,
     total_amount DECIMAL(12,2) CHECK (total_amount >= 0),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (transaction_id, transaction_date),
     CONSTRAINT fk_customer
         FOREIGN KEY (customer_id)
         REFERENCES production.customers(customer_id)
-);
+) PARTITION BY RANGE (transaction_date);
 
 CREATE TABLE IF NOT EXISTS production.transaction_items (
-    item_id VARCHAR(20) PRIMARY KEY,
+    item_id VARCHAR(30) NOT NULL,
     transaction_id VARCHAR(20) NOT NULL,
+    transaction_date DATE NOT NULL,
     product_id VARCHAR(20) NOT NULL,
     quantity INTEGER CHECK (quantity > 0),
     unit_price DECIMAL(10,2) CHECK (unit_price >= 0),
@@ -58,12 +66,30 @@ CREATE TABLE IF NOT EXISTS production.transaction_items (
     line_total DECIMAL(12,2) CHECK (line_total >= 0),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_id, transaction_date),
+    -- A transaction that moves to another date is deleted and re-inserted
+    -- together with its items
     CONSTRAINT fk_transaction
-        FOREIGN KEY (transaction_id)
-        REFERENCES production.transactions(transaction_id),
+        FOREIGN KEY (transaction_id, transaction_date)
+        REFERENCES production.transactions(transaction_id, transaction_date)
+        ON DELETE CASCADE,
     CONSTRAINT fk_product
         FOREIGN KEY (product_id)
         REFERENCES production.products(product_id)
+) PARTITION BY RANGE (transaction_date);
+
+-- ============================
+-- REJECTED ROWS
+-- ============================
+-- Staging rows (latest version per business key, after cleansing) that
+-- failed a validation or referential rule, with the first rule they failed
+CREATE TABLE IF NOT EXISTS production.rejected_rows (
+    source_table VARCHAR(50) NOT NULL,
+    business_key VARCHAR(50),
+    reason VARCHAR(50) NOT NULL,
+    record JSONB,
+    loaded_at TIMESTAMP,
+    rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ============================
@@ -81,3 +107,24 @@ ON production.transaction_items(transaction_id);
 
 CREATE INDEX IF NOT EXISTS idx_items_product
 ON production.transaction_items(product_id);
+
+-- Delta scans of the warehouse load
+CREATE INDEX IF NOT EXISTS idx_customers_updated_at
+ON production.customers(updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_products_updated_at
+ON production.products(updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_updated_at
+ON production.transactions(updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_items_updated_at
+ON production.transaction_items(updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_rejected_rows_table
+ON production.rejected_rows(source_table, rejected_at);
+
+-- One row per rejected key and reason: rows re-derived by a later run
+-- (items of reloaded transactions) are not recorded again
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rejected_rows_key
+ON production.rejected_rows(source_table, COALESCE(business_key, ''), reason);
@@ -66,17 +66,56 @@ CREATE TABLE IF NOT EXISTS warehouse.dim_payment_method (
 -- ============================
 -- FACT TABLE: SALES
 -- ============================
+-- Range-partitioned by month of date_key (YYYYMMDD); load_warehouse.py
+-- creates the monthly partitions and builds the secondary indexes.
 CREATE TABLE IF NOT EXISTS warehouse.fact_sales (
-    sales_key BIGSERIAL PRIMARY KEY,
+    sales_key BIGSERIAL,
     date_key INTEGER REFERENCES warehouse.dim_date(date_key),
     customer_key INTEGER REFERENCES warehouse.dim_customers(customer_key),
     product_key INTEGER REFERENCES warehouse.dim_products(product_key),
     payment_method_key INTEGER REFERENCES warehouse.dim_payment_method(payment_method_key),
     transaction_id VARCHAR(20),
+    item_id VARCHAR(30),
+    -- Time of day of the sale (date_key carries the day)
+    transaction_time TIME,
     quantity INTEGER,
     unit_price DECIMAL(10,2),
     discount_amount DECIMAL(10,2),
     line_total DECIMAL(12,2),
     profit DECIMAL(12,2),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sales_key, date_key)
+) PARTITION BY RANGE (date_key);
+
+-- ============================
+-- CHANGE LOG: FACT SALES
+-- ============================
+-- Months (YYYYMM, 0 for rows without a date) touched by each load, read by
+-- the analytics refresh; full_rebuild marks a load that rebuilt everything.
+CREATE TABLE IF NOT EXISTS warehouse.fact_sales_changes (
+    month_key INTEGER,
+    full_rebuild BOOLEAN DEFAULT FALSE,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================
+-- AGGREGATE: CUSTOMER METRICS
+-- ============================
+CREATE TABLE IF NOT EXISTS warehouse.customer_metrics (
+    customer_email VARCHAR(150) PRIMARY KEY,
+    total_orders BIGINT,
+    total_spent DECIMAL(14,2)
 );
+
+-- ============================
+-- INDEXES
+-- ============================
+-- One current version per business key; also the SCD2 merge lookup
+CREATE UNIQUE INDEX IF NOT EXISTS dim_customers_current_idx
+ON warehouse.dim_customers(customer_id) WHERE is_current;
+
+CREATE UNIQUE INDEX IF NOT EXISTS dim_products_current_idx
+ON warehouse.dim_products(product_id) WHERE is_current;
+
+CREATE UNIQUE INDEX IF NOT EXISTS dim_payment_method_name_idx
+ON warehouse.dim_payment_method(payment_method_name);
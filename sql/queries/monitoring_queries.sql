@@ -14,7 +14,8 @@ SELECT
     MAX(created_at)
 FROM warehouse.fact_sales;
 
--- 2. Volume Trend (last 30 days)
+-- 2. Volume Trend (last 30 days; filters on the partition key, so only the
+--    recent monthly partitions are scanned)
 SELECT
     transaction_date,
     COUNT(*) AS daily_count
@@ -23,11 +24,15 @@ WHERE transaction_date >= CURRENT_DATE - INTERVAL '30 days'
 GROUP BY transaction_date
 ORDER BY transaction_date;
 
--- 3. Data Quality Checks
+-- 3. Data Quality Checks (rows the production transform rejected today)
 SELECT
-    COUNT(*) FILTER (WHERE product_id IS NULL) AS null_product_ids,
-    COUNT(*) FILTER (WHERE customer_id IS NULL) AS null_customer_ids
-FROM production.transactions;
+    source_table,
+    reason,
+    COUNT(*) AS rejected_rows
+FROM production.rejected_rows
+WHERE rejected_at >= CURRENT_DATE
+GROUP BY source_table, reason
+ORDER BY rejected_rows DESC;
 
 -- 4. Pipeline Execution History
 SELECT
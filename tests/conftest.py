@@ -1,17 +1,12 @@
 # tests/conftest.py
 import pytest
-import os
 import psycopg2
 
-# Get DB_HOST from environment, default to 'postgres' (Docker friendly)
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_CONFIG = {
-    "host": DB_HOST,
-    "port": os.getenv("DB_PORT", "5432"),
-    "dbname": os.getenv("DB_NAME", "ecommerce_db"),
-    "user": os.getenv("DB_USER", "admin"),
-    "password": os.getenv("DB_PASSWORD", "password")
-}
+from scripts.db import get_db_config
+
+# config.yaml's database section (host 'postgres', Docker friendly) with the
+# DB_* environment overrides
+DB_CONFIG = get_db_config("tests")
 
 @pytest.fixture
 def db_connection():
@@ -21,4 +16,4 @@ def db_connection():
         yield conn
         conn.close()
     except psycopg2.OperationalError as e:
-        pytest.fail(f"Could not connect to database at {DB_HOST}: {e}")
\ No newline at end of file
+        pytest.fail(f"Could not connect to database at {DB_CONFIG['host']}: {e}")
\ No newline at end of file
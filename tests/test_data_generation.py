@@ -23,4 +23,85 @@ def test_line_total_calculation():
     expected_total = (row["quantity"] * row["unit_price"]) * discount_factor
     
     # Assert with rounding
-    assert round(expected_total, 2) == round(row["line_total"], 2)
\ No newline at end of file
+    assert round(expected_total, 2) == round(row["line_total"], 2)
+
+def _vectorized_batch(seed):
+    import numpy as np
+    from scripts.data_generation.generate_data import format_ids, generate_transaction_batch
+
+    rng = np.random.default_rng(seed)
+    customer_ids = format_ids("CUST", np.arange(1, 51), 4)
+    product_ids = format_ids("PROD", np.arange(1, 21), 4)
+    prices = np.round(rng.uniform(10, 500, size=20), 2)
+    return generate_transaction_batch(
+        rng, 1, 200, customer_ids, product_ids, prices, 1, np.datetime64("2025-01-01"), 365
+    )
+
+def test_vectorized_generation_is_reproducible():
+    txns_a, items_a = _vectorized_batch(seed=7)
+    txns_b, items_b = _vectorized_batch(seed=7)
+    pd.testing.assert_frame_equal(txns_a, txns_b)
+    pd.testing.assert_frame_equal(items_a, items_b)
+
+def test_vectorized_totals_match_line_items():
+    txns, items = _vectorized_batch(seed=7)
+    assert items["item_id"].is_unique
+    assert set(items["transaction_id"]) == set(txns["transaction_id"])
+
+    line_sums = items.groupby("transaction_id")["line_total"].sum().round(2)
+    totals = txns.set_index("transaction_id")["total_amount"]
+    assert (line_sums.reindex(totals.index) == totals).all()
+
+def test_streaming_chunks_are_consistent(tmp_path):
+    import numpy as np
+    from scripts.data_generation.generate_data import format_ids, stream_transactions
+
+    customers = pd.DataFrame({"customer_id": format_ids("CUST", np.arange(1, 51), 4)})
+    products = pd.DataFrame({
+        "product_id": format_ids("PROD", np.arange(1, 21), 4),
+        "price": np.linspace(10, 200, 20).round(2)
+    })
+    txn_path, items_path = tmp_path / "transactions.csv", tmp_path / "transaction_items.csv"
+
+    counts = stream_transactions(
+        np.random.SeedSequence(3), 1050, 100, customers, products,
+        np.datetime64("2025-01-01"), 365, txn_path, items_path
+    )
+
+    txns, items = pd.read_csv(txn_path), pd.read_csv(items_path)
+    assert counts == {"transactions": len(txns), "transaction_items": len(items)}
+    assert len(txns) == 1050
+    assert txns["transaction_id"].is_unique and items["item_id"].is_unique
+    assert set(items["transaction_id"]) <= set(txns["transaction_id"])
+
+    line_sums = items.groupby("transaction_id")["line_total"].sum().round(2)
+    totals = txns.set_index("transaction_id")["total_amount"]
+    assert (line_sums.reindex(totals.index) == totals).all()
+
+def test_sharded_generation_writes_manifest(tmp_path):
+    from scripts.data_generation.generate_data import generate_sharded
+
+    gen_config = {"customers": 30, "products": 10, "transactions": 950,
+                  "start_date": "2025-01-01", "end_date": "2025-12-31"}
+    result = generate_sharded(gen_config, 11, 100, str(tmp_path), workers=2, n_shards=3)
+
+    assert [s["shard"] for s in result["shards"]] == [0, 1, 2]
+    assert result["files"]["transactions"][1] == "transactions.part-0001.csv"
+    assert result["record_counts"]["transactions"] == 950
+
+    txns = pd.concat([pd.read_csv(tmp_path / f) for f in result["files"]["transactions"]])
+    items = pd.concat([pd.read_csv(tmp_path / f) for f in result["files"]["transaction_items"]])
+    assert len(items) == result["record_counts"]["transaction_items"]
+    assert txns["transaction_id"].is_unique and items["item_id"].is_unique
+    assert set(items["transaction_id"]) <= set(txns["transaction_id"])
+
+def test_ids_padded_for_the_whole_run_keep_sorting():
+    import numpy as np
+    from scripts.data_generation.generate_data import format_ids, id_width
+
+    width = id_width(100_500, 5)
+    ids = format_ids("TXN", np.array([7, 99_999, 100_000, 100_500]), width)
+    assert ids.tolist() == ["TXN000007", "TXN099999", "TXN100000", "TXN100500"]
+    assert sorted(ids.tolist()) == ids.tolist()
+    # Never truncated when the width asked for is too narrow
+    assert format_ids("ITEM", np.array([123456]), 5).tolist() == ["ITEM123456"]
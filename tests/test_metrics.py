@@ -0,0 +1,37 @@
+# tests/test_metrics.py
+
+def test_run_metrics_skip_resumed_steps():
+    from scripts.metrics import collect_run_metrics
+
+    report = {
+        "total_duration_seconds": 12.5,
+        "status": "failed",
+        "steps_executed": {
+            "Data Generation": {"status": "success", "duration_seconds": 3.0, "resumed": True},
+            "Data Ingestion": {
+                "status": "failed", "duration_seconds": 1.5, "retry_attempts": 2,
+                "resources": {"peak_rss_mb": 10, "cpu_user_seconds": 0.5, "cpu_system_seconds": 0.1}
+            }
+        }
+    }
+    samples = {(m, tuple(sorted(l.items()))): v for m, l, v in collect_run_metrics(report)}
+
+    assert samples[("pipeline_run_success", ())] == 0
+    assert samples[("pipeline_step_retries", (("step", "Data Ingestion"),))] == 2
+    assert samples[("pipeline_step_peak_rss_bytes", (("step", "Data Ingestion"),))] == 10 * 1024 * 1024
+    assert not any(("step", "Data Generation") in labels for _, labels in samples)
+
+def test_prometheus_exposition_format():
+    from scripts.metrics import render_prometheus
+
+    text = render_prometheus([
+        ("pipeline_step_duration_seconds", {"step": 'Say "hi"'}, 1.25),
+        ("pipeline_runs_total", {"status": "success"}, 3),
+        ("pipeline_quality_score", {}, 99.5)
+    ])
+    lines = text.splitlines()
+
+    assert "# TYPE pipeline_runs_total counter" in lines
+    assert 'pipeline_step_duration_seconds{step="Say \\"hi\\""} 1.25' in lines
+    assert "pipeline_quality_score 99.5" in lines
+    assert text.endswith("\n")
@@ -0,0 +1,61 @@
+# tests/test_monitoring.py
+import time
+
+def test_time_budget_cancels_slow_monitor_queries(monkeypatch):
+    from scripts.monitoring import pipeline_monitor
+
+    monkeypatch.setattr(pipeline_monitor, "MONITOR_QUERIES", {
+        "slow": {"checks": ["data_freshness"], "sql": "SELECT pg_sleep(30);"},
+        "database": {"checks": ["database_health"], "sql": "SELECT 1;"}
+    })
+    settings = {"workers": 2, "statement_timeout_seconds": 60, "time_budget_seconds": 0.5}
+
+    start = time.perf_counter()
+    results = pipeline_monitor.run_queries(settings)
+    assert time.perf_counter() - start < 10
+
+    assert results["slow"]["error"] == "time budget exceeded"
+    assert results["database"]["row"] == (1,)
+
+    checks = pipeline_monitor.evaluate_query_checks(results, settings)
+    assert checks["data_freshness"]["status"] == "warning"
+    assert checks["database_health"]["status"] == "ok"
+    assert all("latency_ms" in check for check in checks.values())
+
+def test_statement_timeout_fails_only_its_checks(monkeypatch):
+    from scripts.monitoring import pipeline_monitor
+
+    monkeypatch.setattr(pipeline_monitor, "MONITOR_QUERIES", {
+        "slow": {"checks": ["data_quality"], "sql": "SELECT pg_sleep(30);", "statement_timeout_seconds": 0.2},
+        "database": {"checks": ["database_health"], "sql": "SELECT 1;"}
+    })
+    settings = {"workers": 2, "statement_timeout_seconds": 60, "time_budget_seconds": 10}
+
+    results = pipeline_monitor.run_queries(settings)
+    assert "statement timeout" in results["slow"]["error"]
+    assert "error" not in results["database"]
+
+def test_volume_anomalies_use_a_robust_same_weekday_baseline():
+    from datetime import date
+    from scripts.monitoring import pipeline_monitor
+
+    settings = {**pipeline_monitor.DEFAULT_SETTINGS, "time_budget_seconds": 30}
+    results = pipeline_monitor.run_queries(settings)
+    period, baselines = results["daily_volume"]["row"]
+    assert period == date.fromordinal(date.today().toordinal() - 1)
+    assert {"rows", "transactions", "revenue"} <= {s["series"] for s in baselines}
+    assert all(s["baseline_points"] <= settings["anomaly_baseline_weeks"] for s in baselines)
+
+    # One outlier week in the baseline barely moves the median and MAD
+    row = (period, [
+        {"series": "rows", "actual": 104, "median": 100, "mad": 4, "baseline_points": 8},
+        {"series": "revenue", "actual": 2500, "median": 10000, "mad": 300, "baseline_points": 8},
+        {"series": "rows[Books]", "actual": 0, "median": 40, "mad": 3, "baseline_points": 2}
+    ])
+    check = pipeline_monitor.check_volume_anomalies(row, settings)
+    assert check["status"] == "anomaly_detected"
+    assert check["anomalies"] == ["revenue"]
+    assert check["series"]["rows"]["expected_range"][0] < 100 < check["series"]["rows"]["expected_range"][1]
+    assert check["series"]["revenue"]["z_score"] < -settings["anomaly_threshold"]
+    # Too short a history is reported but never flagged
+    assert check["series"]["rows[Books]"]["anomaly"] is False
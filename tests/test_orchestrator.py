@@ -0,0 +1,144 @@
+import logging
+import time
+
+import pytest
+
+from scripts import pipeline_orchestrator
+from scripts.pipeline_orchestrator import PIPELINE_STEPS, build_dependencies, critical_path
+
+@pytest.fixture
+def error_log(monkeypatch, tmp_path):
+    """Step failures are logged to a file under tmp_path instead of logs/pipeline_errors.log."""
+    path = tmp_path / "pipeline_errors.log"
+    handler = logging.FileHandler(path)
+    logger = logging.getLogger("test_error_logger")
+    logger.propagate = False
+    logger.addHandler(handler)
+    monkeypatch.setattr(pipeline_orchestrator, "error_logger", logger)
+    yield path
+    logger.removeHandler(handler)
+    handler.close()
+
+def test_quality_gate_precedes_promotion():
+    dependencies = build_dependencies(PIPELINE_STEPS)
+    assert "Data Quality Checks" in dependencies["Staging to Production"]
+    assert "Data Ingestion" in dependencies["Data Quality Checks"]
+
+def test_independent_steps_have_no_edge():
+    steps = [
+        {"name": "load", "inputs": ["data/raw"], "outputs": ["staging"]},
+        {"name": "export", "inputs": ["analytics"], "outputs": ["data/exports"]},
+        {"name": "promote", "inputs": ["staging"], "outputs": ["production"]}
+    ]
+    dependencies = build_dependencies(steps)
+    assert dependencies["export"] == []
+    assert dependencies["promote"] == ["load"]
+
+def test_critical_path_is_longest_chain():
+    steps = {
+        "a": {"duration_seconds": 1.0, "depends_on": []},
+        "b": {"duration_seconds": 5.0, "depends_on": []},
+        "c": {"duration_seconds": 2.0, "depends_on": ["a", "b"]},
+        "d": {"status": "skipped", "depends_on": ["c"]},
+    }
+    assert critical_path(steps) == {"steps": ["b", "c"], "duration_seconds": 7.0}
+
+def test_file_digest_reused_until_file_changes(tmp_path):
+    from scripts import step_cache
+
+    path = tmp_path / "raw.csv"
+    path.write_text("a,b\n1,2\n")
+    digests = {}
+    first = step_cache.file_digest(path, digests)
+    assert step_cache.file_digest(path, digests) == first
+
+    path.write_text("a,b\n1,23\n")
+    assert step_cache.file_digest(path, digests) != first
+
+def test_step_key_is_taken_before_the_step_runs(tmp_path):
+    from scripts.pipeline_orchestrator import execute_step
+
+    source = tmp_path / "source.csv"
+    source.write_text("a\n1\n")
+    step = {
+        "name": "append", "command": ["python", "scripts/step_cache.py"], "code": [], "config": [],
+        "inputs": [str(source)], "outputs": []
+    }
+    def run(step):
+        # Input changed while the step ran, after it read it
+        source.write_text(source.read_text() + "2\n")
+        return {"status": "success", "duration_seconds": 0.0}
+
+    run_state = {"steps": {}, "file_digests": {}}
+    assert execute_step(step, run, run_state, True)["cache"] == "miss"
+    # Keyed on what the last run read, not on what it left behind
+    assert execute_step(step, run, run_state, True)["cache"] == "miss"
+
+    def noop(step):
+        return {"status": "success", "duration_seconds": 0.0}
+    execute_step(step, noop, run_state, True)
+    assert execute_step(step, noop, run_state, True)["cache"] == "hit"
+
+def test_resumed_run_only_executes_unfinished_steps():
+    from scripts.pipeline_orchestrator import run_dag
+
+    executed = []
+    def execute(step):
+        executed.append(step["name"])
+        return {"status": "success", "duration_seconds": 0.0}
+
+    completed = {
+        "Data Generation": {"status": "success", "duration_seconds": 1.0},
+        "Data Ingestion": {"status": "success", "duration_seconds": 1.0},
+    }
+    results = run_dag(PIPELINE_STEPS, execute, 2, completed=completed)
+    assert "Data Generation" not in executed and "Data Ingestion" not in executed
+    assert "Staging to Production" in executed
+    assert all(r["status"] == "success" for r in results.values())
+
+def test_timeout_kills_process_group(tmp_path, error_log):
+    from scripts.pipeline_orchestrator import run_step, subprocess_action
+
+    marker = tmp_path / "survived"
+    # The background sleeper is in the step's process group and must die with it
+    script = f"(sleep 3 && touch {marker}) & sleep 30"
+    step = {"name": "Hung Step", "command": ["sh", "-c", script]}
+    result = run_step(step["name"], subprocess_action(step, False, timeout=1))
+
+    assert result["status"] == "timeout"
+    assert result["duration_seconds"] < 10
+    assert "timed out" in error_log.read_text()
+    time.sleep(3.5)
+    assert not marker.exists()
+
+def test_only_transient_failures_are_retried(error_log):
+    from scripts.db import RETRYABLE_EXIT_CODE
+    from scripts.pipeline_orchestrator import run_step, subprocess_action
+
+    def run(code):
+        step = {"name": "Failing Step", "command": ["python", "-c", f"raise SystemExit({code})"]}
+        return run_step(step["name"], subprocess_action(step, False), max_retries=2)
+
+    transient = run(RETRYABLE_EXIT_CODE)
+    assert transient["status"] == "failed" and transient["retry_attempts"] == 2
+    assert transient["resources"]["peak_rss_mb"] > 0
+
+    permanent = run(1)
+    assert permanent["status"] == "failed" and permanent["retry_attempts"] == 1
+    assert error_log.read_text().count("Failing Step failed") == 3
+
+def test_pipeline_lock_is_exclusive(monkeypatch, tmp_path):
+    from scripts.pipeline_orchestrator import acquire_pipeline_lock
+
+    # Never contend with (or truncate) the lock of a real run
+    monkeypatch.setattr(pipeline_orchestrator, "LOCK_FILE", tmp_path / "pipeline.lock")
+    first = acquire_pipeline_lock()
+    assert first is not None
+    try:
+        assert acquire_pipeline_lock() is None
+    finally:
+        first.close()
+    second = acquire_pipeline_lock()
+    assert second is not None
+    second.close()
+    assert (tmp_path / "pipeline.lock").exists()
@@ -8,3 +8,14 @@ def test_quality_score_present():
     with open("data/processed/data_quality_report.json") as f:
         data = json.load(f)
     assert "quality_score" in data
+
+def test_quality_checks_reported_per_table():
+    with open("data/processed/data_quality_report.json") as f:
+        data = json.load(f)
+    assert data["status"] == "ok"
+    assert data["quality_score"] >= data["min_score"]
+    for table in ["customers", "products", "transactions", "transaction_items"]:
+        result = data["tables"][table]
+        assert result["rows_checked"] > 0
+        assert "duration_seconds" in result
+        assert all("violations" in check for check in result["checks"].values())
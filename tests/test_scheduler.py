@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from scripts.scheduler import due_jobs, latest_due, pipeline_command
+
+NIGHTLY = {"at": "02:00", "full_refresh": True}
+MICRO = {"every_minutes": 15, "between": ["06:00", "23:00"]}
+
+def test_latest_due_daily_and_windowed():
+    assert latest_due(NIGHTLY, datetime(2024, 5, 2, 1, 0)) == datetime(2024, 5, 1, 2, 0)
+    assert latest_due(NIGHTLY, datetime(2024, 5, 2, 2, 0)) == datetime(2024, 5, 2, 2, 0)
+    assert latest_due(MICRO, datetime(2024, 5, 2, 10, 7)) == datetime(2024, 5, 2, 10, 0)
+    # Outside the window the last slot of the previous window is due
+    assert latest_due(MICRO, datetime(2024, 5, 2, 5, 0)) == datetime(2024, 5, 1, 23, 0)
+
+def test_missed_windows_caught_up_once_full_first():
+    schedules = {"micro_batch": MICRO, "nightly_full": NIGHTLY}
+    state = {
+        "micro_batch": datetime(2024, 5, 1, 20, 0).isoformat(),
+        "nightly_full": datetime(2024, 5, 1, 2, 0).isoformat()
+    }
+    # Down from the evening until after the nightly window
+    jobs = due_jobs(schedules, state, datetime(2024, 5, 2, 6, 5))
+    assert jobs == [
+        (datetime(2024, 5, 2, 2, 0), "nightly_full"),
+        (datetime(2024, 5, 2, 6, 0), "micro_batch")
+    ]
+    state = {name: due.isoformat() for due, name in jobs}
+    assert due_jobs(schedules, state, datetime(2024, 5, 2, 6, 10)) == []
+
+def test_command_schedules_run_instead_of_the_pipeline():
+    retention = ["python", "scripts/cleanup_old_data.py", "--partitions-only"]
+    assert pipeline_command({"at": "03:00", "command": retention}) == retention
+    assert pipeline_command(NIGHTLY)[-1] == "--full-refresh"
@@ -1,21 +1,16 @@
 # tests/test_transformation.py
 import pytest
 import psycopg2
-import os
 
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "postgres"),
-    "port": "5432",
-    "dbname": "ecommerce_db",
-    "user": "admin",
-    "password": "password"
-}
+from scripts.db import get_db_config
+
+DB_CONFIG = get_db_config("tests")
 
 def test_production_tables_populated():
     conn = psycopg2.connect(**DB_CONFIG)
     cur = conn.cursor()
     
-    tables = ["customers", "products", "transactions"]
+    tables = ["customers", "products", "transactions", "transaction_items"]
     for table in tables:
         cur.execute(f"SELECT COUNT(*) FROM production.{table}")
         assert cur.fetchone()[0] > 0
@@ -27,13 +22,219 @@ def test_no_orphan_transaction_items():
     conn = psycopg2.connect(**DB_CONFIG)
     cur = conn.cursor()
     
-    # Check that all transactions have a valid email (meaning the join worked)
+    # Every item belongs to a transaction of a known customer
     cur.execute("""
-        SELECT COUNT(*) 
-        FROM production.transactions 
-        WHERE customer_email IS NULL
+        SELECT COUNT(*)
+        FROM production.transaction_items i
+        LEFT JOIN production.transactions t
+            ON t.transaction_id = i.transaction_id AND t.transaction_date = i.transaction_date
+        LEFT JOIN production.customers c ON c.customer_id = t.customer_id
+        WHERE c.email IS NULL
     """)
     assert cur.fetchone()[0] == 0
     
     cur.close()
-    conn.close()
\ No newline at end of file
+    conn.close()
+def test_incremental_watermarks_recorded():
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT DISTINCT layer
+        FROM public.pipeline_watermarks
+    """)
+    layers = {row[0] for row in cur.fetchall()}
+    assert {"staging", "production", "warehouse"} <= layers
+
+    cur.close()
+    conn.close()
+
+def test_transactions_partitioned_by_month():
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+
+    for table in ["production.transactions", "production.transaction_items", "warehouse.fact_sales"]:
+        cur.execute("""
+            SELECT COUNT(*)
+            FROM pg_partitioned_table pt
+            JOIN pg_inherits i ON i.inhparent = pt.partrelid
+            WHERE pt.partrelid = to_regclass(%s)
+        """, (table,))
+        assert cur.fetchone()[0] > 1, f"{table} has no monthly partitions"
+
+    cur.close()
+    conn.close()
+
+def test_old_partitions_dropped_not_deleted(db_connection):
+    from datetime import date
+    from scripts import partitions
+
+    cur = db_connection.cursor()
+    try:
+        cur.execute("CREATE TABLE public.partition_probe (d DATE) PARTITION BY RANGE (d)")
+        partitions.ensure_month_partitions(
+            cur, "public", "partition_probe",
+            {date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)}
+        )
+        cur.execute("INSERT INTO public.partition_probe VALUES ('2024-01-15'), ('2024-03-02'), (NULL)")
+
+        assert partitions.drop_partitions_before(cur, "public", "partition_probe", date(2024, 2, 20)) == [
+            ("partition_probe_p202401", date(2024, 1, 1))
+        ]
+        assert partitions.detach_partitions_before(cur, "public", "partition_probe", date(2024, 3, 1)) == [
+            "partition_probe_p202402"
+        ]
+        cur.execute("SELECT COUNT(*) FROM public.partition_probe")
+        assert cur.fetchone()[0] == 2
+        assert [name for name, _ in partitions.list_month_partitions(cur, "public", "partition_probe")] == [
+            "partition_probe_p202403"
+        ]
+    finally:
+        db_connection.rollback()
+        cur.close()
+
+def test_bad_rows_rejected_in_the_same_pass(db_connection):
+    from scripts import watermarks
+    from scripts.transformation import staging_to_production
+
+    cur = db_connection.cursor()
+    try:
+        since = {
+            t: watermarks.get_high_water_mark(cur, "production", t)
+            for t in staging_to_production.STAGING_TABLES
+        }
+        cur.execute("SELECT product_id FROM production.products LIMIT 1")
+        product_id = cur.fetchone()[0]
+
+        cur.execute("""
+            INSERT INTO staging.customers (customer_id, first_name, last_name, email)
+            VALUES (' CUSTX1 ', 'Ada', 'Lovelace', ' ADA@Example.com '),
+                   ('CUSTX2', 'No', 'Email', 'not-an-email')
+        """)
+        cur.execute("""
+            INSERT INTO staging.transactions (transaction_id, customer_id, transaction_date, total_amount)
+            VALUES ('TXNX1', 'CUSTX1', CURRENT_DATE, 10),
+                   ('TXNX2', 'CUSTX2', CURRENT_DATE, 10)
+        """)
+        cur.execute("""
+            INSERT INTO staging.transaction_items (item_id, transaction_id, product_id, quantity, unit_price, line_total)
+            VALUES ('ITEMX1', 'TXNX1', %(p)s, 1, 10, 10),
+                   ('ITEMX1', 'TXNX1', %(p)s, 2, 10, 20),
+                   ('ITEMX2', 'TXNX1', %(p)s, 0, 10, 0),
+                   ('ITEMX3', 'TXNX2', %(p)s, 1, 10, 10)
+        """, {"p": product_id})
+        # Older versions of the same key are superseded, not rejected
+        cur.execute("UPDATE staging.transaction_items SET loaded_at = loaded_at - INTERVAL '1 second' "
+                    "WHERE item_id = 'ITEMX1' AND quantity = 1")
+
+        results = staging_to_production.transform_tables(cur, since)
+
+        cur.execute("SELECT email FROM production.customers WHERE customer_id = 'CUSTX1'")
+        assert cur.fetchone()[0] == "ada@example.com"
+        cur.execute("SELECT quantity FROM production.transaction_items WHERE item_id = 'ITEMX1'")
+        assert cur.fetchall() == [(2,)]
+
+        cur.execute("SELECT source_table, business_key, reason FROM production.rejected_rows WHERE business_key ~ 'X[0-9]$'")
+        assert set(cur.fetchall()) == {
+            ("customers", "CUSTX2", "invalid_email"),
+            ("transactions", "TXNX2", "unknown_customer"),
+            ("transaction_items", "ITEMX2", "invalid_quantity"),
+            ("transaction_items", "ITEMX3", "unknown_transaction")
+        }
+        items = results["transaction_items"]
+        assert items["duplicates"] >= 1
+        assert items["rows_in"] == items["duplicates"] + items["rows_out"] + items["rows_rejected"]
+
+        # Re-deriving the same rows records no second reject
+        staging_to_production.transform_tables(cur, since)
+        cur.execute("SELECT COUNT(*) FROM production.rejected_rows WHERE business_key ~ 'X[0-9]$'")
+        assert cur.fetchone()[0] == 4
+    finally:
+        db_connection.rollback()
+        cur.close()
+
+def test_rows_loaded_past_the_bound_wait_for_the_next_run(db_connection):
+    from scripts import watermarks
+    from scripts.transformation import staging_to_production
+
+    cur = db_connection.cursor()
+    try:
+        since = {
+            t: watermarks.get_high_water_mark(cur, "production", t)
+            for t in staging_to_production.STAGING_TABLES
+        }
+        cur.execute("""
+            INSERT INTO staging.customers (customer_id, first_name, last_name, email)
+            VALUES ('CUSTY1', 'Ada', 'Lovelace', 'ada@example.com')
+        """)
+        until = staging_to_production.staging_bounds(cur, since)
+        # Loaded by another writer once this run has taken its bound
+        cur.execute("""
+            INSERT INTO staging.customers (customer_id, first_name, last_name, email, loaded_at)
+            VALUES ('CUSTY2', 'Grace', 'Hopper', 'grace@example.com', %s + INTERVAL '1 second')
+        """, (until["customers"],))
+
+        staging_to_production.transform_tables(cur, since, until=until)
+        staging_to_production.advance_watermarks(cur, until)
+
+        cur.execute("SELECT customer_id FROM production.customers WHERE customer_id LIKE 'CUSTY%'")
+        assert cur.fetchall() == [("CUSTY1",)]
+        assert watermarks.get_high_water_mark(cur, "production", "customers") == until["customers"]
+
+        # The next run starts from that bound and picks the late row up
+        since = {
+            t: watermarks.get_high_water_mark(cur, "production", t)
+            for t in staging_to_production.STAGING_TABLES
+        }
+        staging_to_production.transform_tables(cur, since)
+        cur.execute("SELECT COUNT(*) FROM production.customers WHERE customer_id LIKE 'CUSTY%'")
+        assert cur.fetchone()[0] == 2
+    finally:
+        db_connection.rollback()
+        cur.close()
+
+def test_shadow_schema_swap_does_not_block_readers(db_connection):
+    from scripts import schema_swap, watermarks
+
+    reader = psycopg2.connect(**DB_CONFIG)
+    cur = db_connection.cursor()
+    try:
+        cur.execute("CREATE SCHEMA swap_probe; CREATE TABLE swap_probe.t AS SELECT 1 AS version")
+        db_connection.commit()
+
+        # A dashboard query holding its table lock for the whole swap
+        read = reader.cursor()
+        read.execute("SELECT version FROM swap_probe.t")
+        assert read.fetchone() == (1,)
+
+        shadow = schema_swap.prepare_shadow(cur, "swap_probe")
+        cur.execute(f"CREATE TABLE {shadow}.t AS SELECT 2 AS version")
+        with pytest.raises(RuntimeError, match="broken"):
+            schema_swap.validate_shadow(cur, "swap_probe", ["t"], {"broken": "SELECT 1"}, min_row_ratio=0.5)
+        assert schema_swap.validate_shadow(cur, "swap_probe", ["t"], min_row_ratio=0.5) == {"t": 1}
+
+        cur.execute("SET lock_timeout = '2s'")
+        schema_swap.swap_in(cur, "swap_probe")
+        db_connection.commit()
+
+        read.execute("SELECT version FROM swap_probe.t")
+        assert read.fetchone() == (2,)
+        read.execute("SELECT version FROM swap_probe_previous.t")
+        assert read.fetchone() == (1,)
+        reader.commit()
+
+        before = watermarks.get_table_versions(cur, ["swap_probe.t"])["swap_probe.t"]
+        schema_swap.roll_back(cur, "swap_probe")
+        db_connection.commit()
+        read.execute("SELECT version FROM swap_probe.t")
+        assert read.fetchone() == (1,)
+        # Cached results of the replaced build are invalidated
+        assert watermarks.get_table_versions(cur, ["swap_probe.t"])["swap_probe.t"] == before + 1
+    finally:
+        reader.close()
+        db_connection.rollback()
+        for schema in ["swap_probe", "swap_probe_next", "swap_probe_previous"]:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute("DELETE FROM public.table_versions WHERE table_name LIKE 'swap\\_probe.%'")
+        db_connection.commit()
+        cur.close()
@@ -1,13 +1,9 @@
+import pytest
 import psycopg2
-import os
 
-DB = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": int(os.getenv("DB_PORT", 5432)),
-    "dbname": os.getenv("DB_NAME", "ecommerce_db"),
-    "user": os.getenv("DB_USER", "admin"),
-    "password": os.getenv("DB_PASSWORD", "password")
-}
+from scripts.db import get_db_config
+
+DB = get_db_config("tests")
 
 def test_warehouse_tables_exist():
     conn = psycopg2.connect(**DB)
@@ -26,3 +22,114 @@ def test_fact_sales_not_empty():
     cur.execute("SELECT COUNT(*) FROM warehouse.fact_sales")
     assert cur.fetchone()[0] > 0
     conn.close()
+
+def test_fact_sales_keys_resolved():
+    conn = psycopg2.connect(**DB)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*)
+        FROM warehouse.fact_sales f
+        LEFT JOIN warehouse.dim_date d ON f.date_key = d.date_key
+        LEFT JOIN warehouse.dim_products p ON f.product_key = p.product_key
+        LEFT JOIN warehouse.dim_customers c ON f.customer_key = c.customer_key
+        WHERE d.date_key IS NULL OR p.product_key IS NULL OR c.customer_key IS NULL
+    """)
+    assert cur.fetchone()[0] == 0
+    conn.close()
+
+def test_one_current_version_per_customer():
+    conn = psycopg2.connect(**DB)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT customer_id FROM warehouse.dim_customers
+            GROUP BY customer_id
+            HAVING COUNT(*) FILTER (WHERE is_current) <> 1
+        ) bad
+    """)
+    assert cur.fetchone()[0] == 0
+    conn.close()
+
+def test_analytics_aggregates_match_fact_sales():
+    conn = psycopg2.connect(**DB)
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(SUM(line_total), 0), COUNT(*) FROM warehouse.fact_sales")
+    expected = cur.fetchone()
+    for table in ["monthly_product_sales", "monthly_customer_sales", "daily_sales", "daily_category_sales",
+                  "sales_by_hour", "monthly_payment_sales", "monthly_discount_sales"]:
+        cur.execute(f"SELECT COALESCE(SUM(revenue), 0), COALESCE(SUM(line_count), 0) FROM analytics.{table}")
+        assert cur.fetchone() == expected, f"analytics.{table} is out of date"
+
+    # Hours come from when the sales happened, not from when they were loaded
+    cur.execute("SELECT COUNT(DISTINCT sale_hour::TIME) FROM analytics.sales_by_hour WHERE sale_hour IS NOT NULL")
+    assert cur.fetchone()[0] == 24
+    conn.close()
+
+@pytest.mark.parametrize("export_format", ["csv", "parquet"])
+def test_analytics_exports_stream_every_row(tmp_path, export_format):
+    import pandas as pd
+    from scripts.transformation import generate_analytics
+
+    settings = {**generate_analytics.DEFAULT_SETTINGS, "format": export_format, "fetch_size": 100}
+    results = generate_analytics.export_queries(settings, tmp_path)
+
+    conn = psycopg2.connect(**DB)
+    cur = conn.cursor()
+    for name, table, _, _ in generate_analytics.ANALYTICS_QUERIES:
+        result = results[name]
+        path = tmp_path / f"{name}.{export_format}"
+        df = pd.read_csv(path) if export_format == "csv" else pd.read_parquet(path)
+        cur.execute(f"SELECT COUNT(*) FROM analytics.{table}")
+        assert result["rows"] == len(df) == cur.fetchone()[0]
+        assert result["columns"] == len(df.columns)
+        assert result["bytes"] == path.stat().st_size
+    conn.close()
+
+def test_parquet_export_types_columns_null_in_the_first_row_group(db_connection, tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from scripts.transformation import generate_analytics
+
+    sql = """
+        SELECT n, CASE WHEN n > 1 THEN n * 1.5 END AS revenue,
+               CASE WHEN n > 1 THEN 'x' END AS label
+        FROM generate_series(1, 3) n
+    """
+    path = tmp_path / "nulls.parquet"
+    try:
+        rows, _ = generate_analytics.export_parquet(db_connection, sql, path, {"fetch_size": 1})
+    finally:
+        db_connection.rollback()
+
+    table = pq.read_table(path)
+    assert rows == table.num_rows == 3
+    assert table.schema.field("revenue").type == pa.float64()
+    assert table.column("label").to_pylist() == [None, "x", "x"]
+
+def test_query_cache_invalidated_by_load_version(db_connection, tmp_path):
+    from scripts import watermarks
+    from scripts.transformation import query_cache
+
+    settings = {"dir": str(tmp_path), "max_entries": 2, "max_bytes": 10**9}
+    cur = db_connection.cursor()
+    try:
+        sql = "SELECT COUNT(*) FROM warehouse.dim_products"
+        first = query_cache.cached_query(cur, sql, settings=settings)
+        # Same query, formatted differently
+        again = query_cache.cached_query(cur, "select  count(*)\n from Warehouse.dim_products -- again;", settings=settings)
+        assert (first["status"], again["status"]) == ("miss", "hit")
+        assert again["rows"] == first["rows"]
+
+        watermarks.bump_table_versions(cur, ["warehouse.dim_products"])
+        assert query_cache.cached_query(cur, sql, settings=settings)["status"] == "miss"
+
+        for value in [1, 2, 3]:
+            query_cache.cached_query(cur, "SELECT %s::INT FROM warehouse.dim_date LIMIT 1", (value,), settings)
+        assert query_cache.cached_query(cur, "SELECT 1", settings=settings)["status"] == "bypass"
+
+        stats = query_cache.cache_stats(settings)
+        assert (stats["hits"], stats["misses"], stats["invalidations"], stats["bypasses"]) == (1, 4, 1, 1)
+        assert stats["entries"] == 2 and stats["evictions"] == 2
+    finally:
+        db_connection.rollback()
+        cur.close()